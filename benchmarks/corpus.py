@@ -0,0 +1,86 @@
+"""
+Gera um corpus sintético a partir das fotos de exemplo, redimensionando,
+recomprimindo e duplicando cada uma, para medir o pipeline em escala.
+Como todas as imagens vêm das mesmas poucas fotos, a deduplicação da busca trata
+quase todas como duplicatas; benchmarks.pipeline a deixa desligada por padrão.
+Uso: python -m benchmarks.corpus --size 1000 --output-dir /tmp/corpus-1k
+"""
+import argparse
+import json
+import os
+import shutil
+import cv2
+import numpy as np
+
+SAMPLE_DIR = os.path.join(os.path.dirname(
+    os.path.dirname(os.path.realpath(__file__))), 'fotos_entrada')
+
+# Arquivos por subpasta do corpus, para não criar diretórios enormes.
+FILES_PER_DIR = 1000
+
+CORPUS_MANIFEST = 'corpus.json'
+
+
+def sample_files(input_dir=SAMPLE_DIR):
+    return sorted(os.path.join(input_dir, file) for file in os.listdir(input_dir)
+                  if file.lower().endswith(('.jpg', '.jpeg', '.png')))
+
+
+def generate(output_dir, size, input_dir=SAMPLE_DIR, duplicate_rate=0.1, min_scale=0.5, seed=0):
+    """
+    Cria size imagens em output_dir. Cada uma é uma cópia exata (duplicate_rate das vezes)
+    ou uma versão redimensionada (escala entre min_scale e 1) e recomprimida (qualidade
+    JPEG entre 60 e 95) de uma foto de exemplo. O mesmo seed gera o mesmo corpus.
+    Grava em corpus.json a origem e a variação de cada arquivo.
+    """
+    rng = np.random.default_rng(seed)
+    sources = sample_files(input_dir)
+    images = {}
+    entries = []
+    for i in range(size):
+        source = sources[i % len(sources)]
+        folder = os.path.join(output_dir, f'{i // FILES_PER_DIR:04d}')
+        os.makedirs(folder, exist_ok=True)
+        name = f'{i:06d}_{os.path.splitext(os.path.basename(source))[0]}.jpg'
+        path = os.path.join(folder, name)
+
+        if i >= len(sources) and rng.random() < duplicate_rate:
+            shutil.copyfile(source, path)
+            entry = {'variant': 'copy'}
+        else:
+            if source not in images:
+                images[source] = cv2.imread(source)
+            scale = float(rng.uniform(min_scale, 1.0)) if i >= len(sources) else 1.0
+            quality = int(rng.integers(60, 96))
+            img = images[source]
+            if scale < 1.0:
+                img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            cv2.imwrite(path, img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            entry = {'variant': 'reencoded', 'scale': round(scale, 3), 'quality': quality}
+        entries.append(dict(entry, file=os.path.relpath(path, output_dir),
+                            source=os.path.basename(source)))
+
+    with open(os.path.join(output_dir, CORPUS_MANIFEST), 'w') as f:
+        json.dump({'size': size, 'seed': seed, 'duplicate_rate': duplicate_rate,
+                   'min_scale': min_scale, 'sources': len(sources), 'files': entries}, f, indent=1)
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=1000, help='número de imagens (ex.: 1000, 10000, 100000)')
+    parser.add_argument('--output-dir', required=True)
+    parser.add_argument('--input-dir', default=SAMPLE_DIR)
+    parser.add_argument('--duplicate-rate', type=float, default=0.1)
+    parser.add_argument('--min-scale', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    entries = generate(args.output_dir, args.size, args.input_dir, args.duplicate_rate,
+                       args.min_scale, args.seed)
+    copies = sum(entry['variant'] == 'copy' for entry in entries)
+    print(f'{len(entries)} imagens em {args.output_dir} ({copies} cópias exatas)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Compara a detecção em resolução total com a detecção em resolução reduzida
+nas fotos de exemplo. Uso: python -m benchmarks.detection --min-face-size 80
+"""
+import argparse
+import os
+import time
+import dlib
+from face_detection import detect_faces, detection_scale
+
+SAMPLE_DIR = os.path.join(os.path.dirname(
+    os.path.dirname(os.path.realpath(__file__))), 'fotos_entrada')
+
+
+def overlap(a, b):
+    """Interseção sobre união de dois dlib.rectangle."""
+    intersection = a.intersect(b).area()
+    return intersection / float(a.area() + b.area() - intersection)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--input-dir', default=SAMPLE_DIR)
+    parser.add_argument('--min-face-size', type=int, nargs='+', default=[60, 80, 120])
+    parser.add_argument('--upsample', type=int, default=1)
+    args = parser.parse_args()
+
+    detector = dlib.get_frontal_face_detector()
+    files = sorted(os.path.join(args.input_dir, file) for file in os.listdir(args.input_dir)
+                   if file.lower().endswith(('.jpg', '.jpeg', '.png')))
+    images = [dlib.load_rgb_image(file) for file in files]
+
+    start = time.perf_counter()
+    reference = [detector(img, args.upsample) for img in images]
+    reference_time = time.perf_counter() - start
+    reference_faces = sum(len(dets) for dets in reference)
+    print(f'{"min_face_size":>13} {"escala":>7} {"rostos":>7} {"encontrados":>12} {"tempo":>8} {"ganho":>6}')
+    print(f'{"total":>13} {1.0:>7.2f} {reference_faces:>7} {"100.0%":>12} {reference_time:>7.2f}s {1.0:>5.1f}x')
+
+    for min_face_size in args.min_face_size:
+        start = time.perf_counter()
+        found = [detect_faces(detector, img, min_face_size, args.upsample) for img in images]
+        elapsed = time.perf_counter() - start
+
+        # Um rosto da resolução total conta como encontrado se algum retângulo reduzido o cobre.
+        recovered = sum(any(overlap(ref, det) >= 0.5 for det in dets)
+                        for refs, dets in zip(reference, found) for ref in refs)
+        scale = sum(detection_scale(img.shape, min_face_size, args.upsample) for img in images) / len(images)
+        rate = 100.0 * recovered / reference_faces if reference_faces else 100.0
+        print(f'{min_face_size:>13} {scale:>7.2f} {sum(len(d) for d in found):>7} {rate:>11.1f}% '
+              f'{elapsed:>7.2f}s {reference_time / elapsed:>5.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""
+Mede o pipeline de busca e de separação: imagens/s, latência por estágio
+(percentis), pico de memória (RSS) e escala com o número de processos.
+Os resultados vão para um arquivo JSON que pode ser comparado entre versões.
+A deduplicação fica desligada por padrão: o corpus sintético é feito de cópias
+redimensionadas das mesmas fotos e, com ela, a medição seria quase só de hashes
+(--dedup a liga, e cada execução informa quantas imagens foram de fato processadas).
+
+Uso, a partir da raiz do repositório:
+    python -m benchmarks.corpus --size 1000 --output-dir /tmp/corpus-1k
+    python -m benchmarks.pipeline --corpus /tmp/corpus-1k --workers 1 2 4 --output resultados.json
+    python -m benchmarks.pipeline --corpus /tmp/corpus-1k --baseline anterior.json --output resultados.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing import cpu_count
+import numpy as np
+from face_detection import detect_faces
+from face_embedding import FaceEmbedder
+from face_engine import FaceEngine
+from image_loader import load_image
+from search_pipeline import scan_images
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+SAMPLE_DIR = os.path.join(REPOSITORY_DIR, 'fotos_entrada')
+PERSONS_DIR = os.path.join(REPOSITORY_DIR, 'PERSONS')
+
+PERCENTILES = (50, 90, 99)
+
+
+def peak_rss_mb(who):
+    """Pico de memória residente, em MB, do processo (self) ou dos filhos já encerrados (children)."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == 'self' else resource.RUSAGE_CHILDREN)
+    # ru_maxrss vem em KB no Linux e em bytes no macOS.
+    return usage.ru_maxrss / (1 << 20 if sys.platform == 'darwin' else 1 << 10)
+
+
+def percentiles(values):
+    values = np.asarray(values, dtype=np.float64) * 1000
+    if not len(values):
+        return {}
+    return dict({f'p{p}': round(float(np.percentile(values, p)), 3) for p in PERCENTILES},
+                mean=round(float(values.mean()), 3), count=len(values))
+
+
+def measure_stages(engine, files, persons_dir, threshold, min_face_size):
+    """Latência por imagem de cada estágio, em um único processo, em milissegundos."""
+    gallery = engine.enroll(persons_dir, report=lambda message: None)
+    embedder = FaceEmbedder(engine.facerec, engine.sp)
+    times = {stage: [] for stage in ('decode', 'detect', 'landmarks', 'embed', 'match')}
+    for file_path in files:
+        start = time.perf_counter()
+        img, scale = load_image(file_path, min_face_size=min_face_size)
+        decoded = time.perf_counter()
+        rects = detect_faces(engine.detector, img, min_face_size * scale)
+        detected = time.perf_counter()
+        chips = embedder.extract_chips(img, rects)
+        aligned = time.perf_counter()
+        descriptors = embedder.embed_chips(chips)
+        embedded = time.perf_counter()
+        gallery.match(descriptors, threshold)
+        matched = time.perf_counter()
+        for stage, elapsed in zip(times, (decoded - start, detected - decoded, aligned - detected,
+                                          embedded - aligned, matched - embedded)):
+            times[stage].append(elapsed)
+    return {stage: percentiles(values) for stage, values in times.items()}
+
+
+def run_single(args):
+    """Executa uma única medição (modo e número de processos) e imprime o resultado em JSON."""
+    work_dir = tempfile.mkdtemp(prefix='benchmark-')
+    try:
+        engine = FaceEngine(os.path.join(work_dir, 'face-data.db'), args.single_workers)
+        start = time.perf_counter()
+        engine.get_pool().map(abs, range(engine.workers))
+        warmup = time.perf_counter() - start
+
+        output_dir = os.path.join(work_dir, 'saida')
+        quiet = lambda message: None
+        if args.single == 'search':
+            summary = engine.search(args.persons_dir, args.corpus, output_dir, args.threshold,
+                                    args.min_face_size, args.batch_size, incremental=False,
+                                    dedup=args.dedup, output_mode=args.output_mode, report=quiet)
+            images = summary['scanned']
+            embedded = summary['embedded']
+        else:
+            summary = engine.separate(args.corpus, output_dir, batch=args.batch,
+                                      min_face_size=args.min_face_size, batch_size=args.batch_size,
+                                      report=quiet)
+            images = summary['images']
+            embedded = images - summary['prefiltered']
+        elapsed = summary['elapsed']
+        parent_rss = peak_rss_mb('self')
+        engine.close()
+        print(json.dumps({'mode': args.single, 'workers': engine.workers, 'images': images,
+                          'embedded': embedded, 'seconds': round(elapsed, 3),
+                          'images_per_second': round(images / elapsed, 3),
+                          'embedded_per_second': round(embedded / elapsed, 3),
+                          'warmup_seconds': round(warmup, 3), 'peak_rss_mb': parent_rss,
+                          'peak_worker_rss_mb': peak_rss_mb('children'), 'summary': summary}))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def run_isolated(args, mode, workers):
+    """Roda uma medição em um processo novo, para que pico de memória e caches não se misturem."""
+    command = [sys.executable, '-m', 'benchmarks.pipeline', '--single', mode,
+               '--single-workers', str(workers), '--corpus', args.corpus,
+               '--persons-dir', args.persons_dir, '--threshold', str(args.threshold),
+               '--min-face-size', str(args.min_face_size), '--batch-size', str(args.batch_size),
+               '--output-mode', args.output_mode]
+    if args.dedup:
+        command.append('--dedup')
+    if args.batch:
+        command.append('--batch')
+    output = subprocess.run(command, cwd=os.getcwd(), check=True, stdout=subprocess.PIPE,
+                            text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def git_version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=REPOSITORY_DIR,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Compara imagens/s com uma execução anterior; retorna as regressões acima da tolerância."""
+    previous = {(run['mode'], run['workers']): run for run in baseline['runs']}
+    regressions = []
+    for run in results['runs']:
+        old = previous.get((run['mode'], run['workers']))
+        if old is None:
+            continue
+        ratio = run['images_per_second'] / old['images_per_second']
+        print(f'{run["mode"]:>8} {run["workers"]:>3} processo(s): {old["images_per_second"]:.2f} -> '
+              f'{run["images_per_second"]:.2f} imagens/s ({ratio:.2f}x)')
+        if ratio < 1 - tolerance:
+            regressions.append((run['mode'], run['workers'], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=SAMPLE_DIR, help='diretório de imagens (ver benchmarks.corpus)')
+    parser.add_argument('--persons-dir', default=PERSONS_DIR)
+    parser.add_argument('--modes', nargs='+', choices=('search', 'separate'), default=['search', 'separate'])
+    parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, cpu_count()}))
+    parser.add_argument('--threshold', type=float, default=0.55)
+    parser.add_argument('--min-face-size', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--output-mode', default='copy')
+    parser.add_argument('--dedup', action='store_true',
+                        help='liga a deduplicação da busca (no corpus sintético, pula a maior parte das imagens)')
+    parser.add_argument('--batch', action='store_true', help='separação com agrupamento em lote')
+    parser.add_argument('--stage-sample', type=int, default=16,
+                        help='imagens usadas na medição de latência por estágio')
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--baseline', help='resultado anterior para comparar imagens/s')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='queda máxima aceita de imagens/s em relação ao baseline')
+    parser.add_argument('--single', choices=('search', 'separate'), help=argparse.SUPPRESS)
+    parser.add_argument('--single-workers', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        return run_single(args)
+
+    files = list(scan_images(args.corpus))
+    sample = files[::max(1, len(files) // args.stage_sample)][:args.stage_sample]
+    work_dir = tempfile.mkdtemp(prefix='benchmark-')
+    try:
+        with FaceEngine(os.path.join(work_dir, 'face-data.db'), workers=1) as engine:
+            stages = measure_stages(engine, sample, args.persons_dir, args.threshold, args.min_face_size)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    for stage, stats in stages.items():
+        print(f'{stage:>10}: p50 {stats["p50"]:.1f}ms, p90 {stats["p90"]:.1f}ms, p99 {stats["p99"]:.1f}ms')
+
+    runs = []
+    for mode in args.modes:
+        for workers in args.workers:
+            run = run_isolated(args, mode, workers)
+            runs.append(run)
+            print(f'{mode:>8} {workers:>3} processo(s): {run["images_per_second"]:.2f} imagens/s, '
+                  f'{run["embedded"]} de {run["images"]} processadas ({run["embedded_per_second"]:.2f}/s), '
+                  f'pico de RSS {run["peak_rss_mb"]:.0f} MB (processos: {run["peak_worker_rss_mb"]:.0f} MB)')
+
+    results = {
+        'version': git_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'machine': {'platform': platform.platform(), 'python': platform.python_version(),
+                    'cpus': cpu_count()},
+        'corpus': {'path': os.path.abspath(args.corpus), 'images': len(files)},
+        'options': {'threshold': args.threshold, 'min_face_size': args.min_face_size,
+                    'batch_size': args.batch_size, 'output_mode': args.output_mode,
+                    'dedup': args.dedup, 'batch': args.batch},
+        'stages_ms': stages,
+        'runs': runs,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Resultados gravados em {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            for mode, workers, ratio in regressions:
+                print(f'Regressão: {mode} com {workers} processo(s) a {ratio:.2f}x do baseline')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Mede o pré-filtro de imagens sem rosto (ver face_prefilter) em uma amostra rotulada:
+quantas imagens ele pula, quantos rostos verdadeiros se perdem nas imagens puladas e
+quanto tempo economiza em relação à decodificação e detecção HOG de todas as imagens.
+
+Os rótulos são um JSON {caminho relativo a --input-dir: número de rostos}. Sem --labels,
+os rostos encontrados pelo detector HOG contam como verdadeiros (--write-labels os grava
+para revisão manual). Cada combinação de --face-size, --neighbors e --scale-factor é uma linha.
+Uso: python -m benchmarks.prefilter --input-dir amostra --labels rotulos.json --neighbors 1 2 3
+"""
+import argparse
+import json
+import os
+import time
+import dlib
+from face_detection import detect_faces
+from face_prefilter import DEFAULT_CASCADE, THUMBNAIL_FACE_SIZE, FacePrefilter
+from image_loader import load_image
+from search_pipeline import scan_images
+
+SAMPLE_DIR = os.path.join(os.path.dirname(
+    os.path.dirname(os.path.realpath(__file__))), 'fotos_entrada')
+
+
+def detector_labels(files, contents, min_face_size):
+    """Rostos e tempo (decodificação e detecção) do detector HOG em cada imagem, como no pipeline."""
+    detector = dlib.get_frontal_face_detector()
+    labels = []
+    times = []
+    for file, data in zip(files, contents):
+        start = time.perf_counter()
+        img, scale = load_image(file, data, min_face_size)
+        labels.append(len(detect_faces(detector, img, min_face_size * scale)))
+        times.append(time.perf_counter() - start)
+    return labels, times
+
+
+def measure(prefilter, contents, labels):
+    """Resultado do pré-filtro na amostra: imagens e rostos pulados e tempo por imagem."""
+    start = time.perf_counter()
+    passed = [prefilter.has_face(data) for data in contents]
+    elapsed = time.perf_counter() - start
+    skipped = [faces for faces, has_face in zip(labels, passed) if not has_face]
+    return {'skipped': len(skipped),
+            'skipped_without_faces': sum(faces == 0 for faces in skipped),
+            'skipped_with_faces': sum(faces > 0 for faces in skipped),
+            'faces_missed': sum(skipped),
+            'passed': passed, 'elapsed': elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input-dir', default=SAMPLE_DIR)
+    parser.add_argument('--labels', help='JSON {caminho relativo: número de rostos}')
+    parser.add_argument('--write-labels', help='grava os rótulos do detector HOG neste JSON')
+    parser.add_argument('--min-face-size', type=int, default=0)
+    parser.add_argument('--cascade', default=DEFAULT_CASCADE)
+    parser.add_argument('--face-size', type=int, nargs='+', default=[THUMBNAIL_FACE_SIZE])
+    parser.add_argument('--neighbors', type=int, nargs='+', default=[1, 2, 3])
+    parser.add_argument('--scale-factor', type=float, nargs='+', default=[1.1])
+    args = parser.parse_args()
+
+    files = list(scan_images(args.input_dir))
+    contents = []
+    for file in files:
+        with open(file, 'rb') as f:
+            contents.append(f.read())
+    names = [os.path.relpath(file, args.input_dir).replace(os.sep, '/') for file in files]
+
+    hog_labels, hog_times = detector_labels(files, contents, args.min_face_size)
+    if args.labels:
+        with open(args.labels, encoding='utf-8') as f:
+            stored = json.load(f)
+        labels = [int(stored[name]) for name in names]
+    else:
+        labels = hog_labels
+    if args.write_labels:
+        with open(args.write_labels, 'w', encoding='utf-8') as f:
+            json.dump(dict(zip(names, hog_labels)), f, indent=1)
+
+    hog_time = sum(hog_times)
+    with_faces = sum(faces > 0 for faces in labels)
+    print(f'{len(files)} imagens ({with_faces} com rosto, {sum(labels)} rostos); decodificação e HOG: '
+          f'{1000 * hog_time / len(files):.1f}ms por imagem')
+    print(f'{"face_size":>9} {"scale":>6} {"vizinhos":>8} {"puladas":>8} {"sem rosto":>9} '
+          f'{"com rosto":>9} {"rostos perdidos":>15} {"filtro":>8} {"total":>8} {"ganho":>6}')
+    for face_size in args.face_size:
+        for scale_factor in args.scale_factor:
+            for neighbors in args.neighbors:
+                prefilter = FacePrefilter(args.min_face_size, args.cascade, face_size, scale_factor, neighbors)
+                result = measure(prefilter, contents, labels)
+                # Tempo da busca com o pré-filtro: ele em todas as imagens e o HOG só nas aprovadas.
+                total = result['elapsed'] + sum(t for t, passed in zip(hog_times, result['passed']) if passed)
+                lost = 100.0 * result['faces_missed'] / sum(labels) if sum(labels) else 0.0
+                print(f'{face_size:>9} {scale_factor:>6.2f} {neighbors:>8} {result["skipped"]:>8} '
+                      f'{result["skipped_without_faces"]:>9} {result["skipped_with_faces"]:>9} '
+                      f'{result["faces_missed"]:>7} ({lost:>4.1f}%) '
+                      f'{1000 * result["elapsed"] / len(files):>6.1f}ms {1000 * total / len(files):>6.1f}ms '
+                      f'{hog_time / total:>5.2f}x')
+
+
+if __name__ == '__main__':
+    main()
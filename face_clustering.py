@@ -0,0 +1,115 @@
+import dlib
+import numpy as np
+
+
+class FaceClusters:
+    """
+    Agrupa descritores faciais em pessoas (Person_N), mantendo o centroide
+    de cada pessoa em uma matriz float32 contígua.
+    """
+
+    def __init__(self, threshold=0.6, dimensions=128):
+        self.threshold = threshold
+        self.names = []
+        self.counts = np.zeros(16, dtype=np.int64)
+        self.centroids = np.zeros((16, dimensions), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.names)
+
+    def assign(self, descriptor):
+        """Retorna o nome da pessoa mais próxima do descritor, criando uma nova se nenhuma estiver abaixo do limiar."""
+        descriptor = np.asarray(descriptor, dtype=np.float32)
+        size = len(self.names)
+
+        if size:
+            distances = np.linalg.norm(
+                self.centroids[:size] - descriptor, axis=1)
+            best = int(np.argmin(distances))
+            if distances[best] < self.threshold:
+                # Atualiza o centroide com a média incremental dos membros.
+                self.counts[best] += 1
+                self.centroids[best] += (descriptor -
+                                         self.centroids[best]) / self.counts[best]
+                return self.names[best]
+
+        if size == len(self.centroids):
+            self.centroids = np.concatenate(
+                [self.centroids, np.zeros_like(self.centroids)])
+            self.counts = np.concatenate(
+                [self.counts, np.zeros_like(self.counts)])
+
+        self.centroids[size] = descriptor
+        self.counts[size] = 1
+        self.names.append(f'Person_{size + 1}')
+        return self.names[size]
+
+
+def neighbor_edges(descriptors, threshold, max_neighbors=16, block_size=1024, column_block_size=8192):
+    """
+    Calcula as arestas (i, j), com i < j, entre descritores a menos de threshold.
+    As distâncias são calculadas em blocos, sem montar a matriz N x N, e cada
+    rosto mantém no máximo max_neighbors vizinhos mais próximos, limitando a memória.
+    """
+    descriptors = np.ascontiguousarray(descriptors, dtype=np.float32)
+    count = len(descriptors)
+    norms = np.einsum('ij,ij->i', descriptors, descriptors)
+    squared_threshold = threshold * threshold
+    k = min(max_neighbors, max(count - 1, 0))
+    edges = []
+
+    for row_start in range(0, count, block_size):
+        rows = descriptors[row_start:row_start + block_size]
+        row_indices = np.arange(row_start, row_start + len(rows))
+        best_distances = np.full((len(rows), k), np.inf, dtype=np.float32)
+        best_indices = np.full((len(rows), k), -1, dtype=np.int64)
+
+        for column_start in range(0, count, column_block_size):
+            columns = slice(column_start, column_start + column_block_size)
+            squared = (norms[row_start:row_start + len(rows), None] + norms[None, columns]
+                       - 2.0 * rows @ descriptors[columns].T)
+            column_indices = np.arange(column_start, column_start + squared.shape[1])
+            squared[squared >= squared_threshold] = np.inf
+            squared[row_indices[:, None] == column_indices[None, :]] = np.inf
+
+            # Junta os candidatos do bloco com os melhores até agora e mantém os k menores.
+            merged_distances = np.concatenate([best_distances, squared], axis=1)
+            merged_indices = np.concatenate(
+                [best_indices, np.broadcast_to(column_indices, squared.shape)], axis=1)
+            keep = np.argpartition(merged_distances, k - 1, axis=1)[:, :k] if k else \
+                np.zeros((len(rows), 0), dtype=np.int64)
+            best_distances = np.take_along_axis(merged_distances, keep, axis=1)
+            best_indices = np.take_along_axis(merged_indices, keep, axis=1)
+
+        valid = np.isfinite(best_distances)
+        sources = np.broadcast_to(row_indices[:, None], valid.shape)[valid]
+        targets = best_indices[valid]
+        edges.append(np.stack([np.minimum(sources, targets),
+                               np.maximum(sources, targets)], axis=1))
+
+    if not edges:
+        return np.zeros((0, 2), dtype=np.int64)
+    return np.unique(np.concatenate(edges), axis=0)
+
+
+def cluster_faces(descriptors, threshold=0.5, max_neighbors=16, block_size=1024):
+    """
+    Agrupa todos os descritores de uma vez com chinese whispers do dlib sobre o
+    grafo de vizinhos próximos. Retorna um rótulo por descritor, numerado do maior
+    grupo para o menor (empates pela primeira ocorrência), independente da ordem de chegada.
+    """
+    count = len(descriptors)
+    if count == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    edges = neighbor_edges(descriptors, threshold, max_neighbors, block_size)
+    # Laços em cada vértice garantem um rótulo também para rostos isolados.
+    graph = [(i, i) for i in range(count)] + [tuple(edge) for edge in edges.tolist()]
+    raw_labels = np.asarray(dlib.chinese_whispers(graph), dtype=np.int64)
+
+    _, first_seen, inverse, sizes = np.unique(
+        raw_labels, return_index=True, return_inverse=True, return_counts=True)
+    order = np.lexsort((first_seen, -sizes))
+    ranks = np.empty_like(order)
+    ranks[order] = np.arange(len(order))
+    return ranks[inverse]
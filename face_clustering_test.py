@@ -0,0 +1,73 @@
+import unittest
+import numpy as np
+from face_clustering import FaceClusters, cluster_faces, neighbor_edges
+
+
+class TestFaceClustering(unittest.TestCase):
+    """
+    Testes para o agrupamento em lote dos descritores do separador.
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        centers = rng.normal(size=(5, 128)).astype(np.float32)
+        self.identities = rng.integers(0, 5, 300)
+        self.descriptors = centers[self.identities] + rng.normal(
+            scale=0.02, size=(300, 128)).astype(np.float32)
+
+    def test_blocked_edges_match_full_matrix(self):
+        # As arestas calculadas em blocos são as mesmas da matriz completa
+        edges = neighbor_edges(self.descriptors, 0.5, max_neighbors=300,
+                               block_size=64, column_block_size=100)
+        distances = np.linalg.norm(
+            self.descriptors[:, None] - self.descriptors[None], axis=2)
+        expected = np.argwhere(np.triu(distances < 0.5, k=1))
+        np.testing.assert_array_equal(edges, expected)
+
+    def test_clusters_are_pure_and_ordered_by_size(self):
+        # Cada grupo contém uma só identidade e o maior grupo recebe o rótulo 0
+        labels = cluster_faces(self.descriptors, 0.5, block_size=64)
+        self.assertEqual(labels.max() + 1, 5)
+        for label in range(5):
+            self.assertEqual(len(set(self.identities[labels == label])), 1)
+        sizes = np.bincount(labels)
+        self.assertTrue(np.all(sizes[:-1] >= sizes[1:]))
+
+    def test_order_independent(self):
+        # Embaralhar a entrada não muda quais rostos ficam juntos
+        labels = cluster_faces(self.descriptors, 0.5)
+        order = np.random.default_rng(1).permutation(len(self.descriptors))
+        shuffled = np.empty_like(labels)
+        shuffled[order] = cluster_faces(self.descriptors[order], 0.5)
+        pairs = labels[:, None] == labels[None, :]
+        shuffled_pairs = shuffled[:, None] == shuffled[None, :]
+        np.testing.assert_array_equal(pairs, shuffled_pairs)
+
+
+class TestFaceClusters(unittest.TestCase):
+    """
+    Testes para o agrupamento de descritores faciais do separador.
+    """
+
+    def test_assign_groups_close_descriptors(self):
+        # Descritores próximos vão para a mesma pessoa, distantes criam outra
+        clusters = FaceClusters(threshold=0.6)
+        base = np.zeros(128, dtype=np.float32)
+        other = np.full(128, 0.5, dtype=np.float32)
+        self.assertEqual(clusters.assign(base), 'Person_1')
+        self.assertEqual(clusters.assign(base + 0.01), 'Person_1')
+        self.assertEqual(clusters.assign(other), 'Person_2')
+        self.assertEqual(len(clusters), 2)
+
+    def test_assign_grows_matrix(self):
+        # A matriz de centroides cresce além da capacidade inicial
+        clusters = FaceClusters(threshold=0.1)
+        for i in range(40):
+            descriptor = np.zeros(128, dtype=np.float32)
+            descriptor[i % 128] = 1.0 + i
+            self.assertEqual(clusters.assign(descriptor), f'Person_{i + 1}')
+        self.assertEqual(clusters.centroids.dtype, np.float32)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,500 @@
+"""
+Serviço local que mantém o motor de reconhecimento (modelos, pool de processos e
+galerias) carregado entre trabalhos, e linha de comando para usá-lo.
+
+    python face_daemon.py serve --workers 4
+    python face_daemon.py search PESSOAS BUSCA SAIDA --threshold 0.55
+    python face_daemon.py enroll PESSOAS Nome foto1.jpg foto2.jpg
+    python face_daemon.py embed foto1.jpg foto2.jpg
+    python face_daemon.py separate ENTRADA SAIDA --batch
+    python face_daemon.py shard PESSOAS BUSCA PARTES --shard 0 --shards 4
+    python face_daemon.py merge PARTES SAIDA --shards 4
+    python face_daemon.py index BUSCA INDICE
+    python face_daemon.py query INDICE --persons-dir PESSOAS --output-dir SAIDA
+
+Os trabalhos chegam por HTTP em 127.0.0.1 (POST /jobs) e rodam um de cada vez;
+GET /jobs/<id>?since=N devolve o estado, as mensagens a partir da N-ésima e o
+resultado. Toda requisição leva o segredo gravado por serve em ~/.face-daemon-token
+(permissão 0600), para que outros usuários e páginas abertas no navegador não
+disparem trabalhos. Sem o serviço rodando, a linha de comando usa um motor local.
+"""
+import argparse
+import hmac
+import itertools
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from queue import Queue
+from urllib.parse import parse_qs, urlparse
+from face_database import DATABASE_PATH
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Segredo do serviço, recriado a cada serve e lido pelos clientes do mesmo usuário.
+TOKEN_PATH = os.path.join(os.path.expanduser('~'), '.face-daemon-token')
+
+# Valores aceitos no cabeçalho Host, além do endereço em que o serviço escuta.
+LOCAL_HOSTS = frozenset({'127.0.0.1', 'localhost'})
+
+# Trabalhos terminados ficam consultáveis por JOB_TTL segundos, no máximo MAX_FINISHED_JOBS;
+# cada um guarda as últimas MAX_MESSAGES mensagens.
+JOB_TTL = 3600
+MAX_FINISHED_JOBS = 100
+MAX_MESSAGES = 1000
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class Job:
+    """
+    Um trabalho enviado ao serviço, com as mensagens emitidas enquanto roda. Só as
+    últimas max_messages ficam guardadas; os índices de status(since) continuam
+    contando as descartadas.
+    """
+
+    def __init__(self, job_id, kind, options, max_messages=MAX_MESSAGES):
+        self.id = job_id
+        self.kind = kind
+        self.options = options
+        self.state = QUEUED
+        self.messages = []
+        self.dropped = 0
+        self.max_messages = max_messages
+        self.lock = threading.Lock()
+        self.result = None
+        self.error = None
+        self.finished = None
+
+    def report(self, message):
+        print(message)
+        with self.lock:
+            self.messages.append(message)
+            if len(self.messages) > self.max_messages:
+                excess = len(self.messages) - self.max_messages
+                del self.messages[:excess]
+                self.dropped += excess
+
+    def status(self, since=0):
+        with self.lock:
+            messages = self.messages[max(0, since - self.dropped):]
+            following = self.dropped + len(self.messages)
+        return {'id': self.id, 'kind': self.kind, 'state': self.state, 'messages': messages,
+                'next': following, 'result': self.result, 'error': self.error}
+
+
+class FaceDaemon:
+    """
+    Fila de trabalhos servida por uma única thread que usa o mesmo FaceEngine.
+    Trabalhos terminados saem depois de job_ttl segundos ou além dos max_finished
+    mais recentes, para que um serviço de longa duração não acumule todos.
+    """
+
+    def __init__(self, engine, job_ttl=JOB_TTL, max_finished=MAX_FINISHED_JOBS):
+        self.engine = engine
+        self.jobs = {}
+        self.job_ttl = job_ttl
+        self.max_finished = max_finished
+        self.queue = Queue()
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        threading.Thread(target=self._work, daemon=True).start()
+
+    def submit(self, kind, options):
+        if kind not in self.engine.jobs:
+            raise ValueError(f'Trabalho desconhecido: {kind}')
+        with self.lock:
+            self._evict()
+            job = Job(str(next(self.ids)), kind, options)
+            self.jobs[job.id] = job
+        self.queue.put(job)
+        return job
+
+    def job(self, job_id):
+        with self.lock:
+            self._evict()
+            return self.jobs.get(job_id)
+
+    def status(self):
+        with self.lock:
+            self._evict()
+            states = [job.state for job in self.jobs.values()]
+        return {'workers': self.engine.workers, 'database': self.engine.database_path,
+                'shape_predictor': os.path.abspath(self.engine.shape_predictor_path),
+                'jobs': {state: states.count(state) for state in (QUEUED, RUNNING, DONE, FAILED)}}
+
+    def _evict(self):
+        """Remove os trabalhos terminados vencidos ou além do limite (chamado com self.lock)."""
+        now = time.monotonic()
+        finished = sorted((job for job in self.jobs.values() if job.finished is not None),
+                          key=lambda job: job.finished)
+        excess = len(finished) - self.max_finished
+        for i, job in enumerate(finished):
+            if i < excess or now - job.finished > self.job_ttl:
+                del self.jobs[job.id]
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            job.state = RUNNING
+            try:
+                job.result = self.engine.run_job(job.kind, report=job.report, **job.options)
+                job.state = DONE
+            except Exception as e:
+                job.error = f'{type(e).__name__}: {e}'
+                job.state = FAILED
+            job.finished = time.monotonic()
+
+
+def create_token(path=TOKEN_PATH):
+    """Gera um novo segredo do serviço em path, legível só pelo usuário, e o retorna."""
+    token = secrets.token_hex(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        os.chmod(path, 0o600)
+        f.write(token)
+    return token
+
+
+def read_token(path=TOKEN_PATH):
+    """Segredo do serviço gravado por create_token; None se não houver."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def make_handler(daemon, token, allowed_hosts=LOCAL_HOSTS):
+    """
+    Atende a API do serviço só para quem apresenta o segredo (Authorization: Bearer),
+    com Host local (contra DNS rebinding) e, nos POST, corpo application/json, que um
+    navegador não envia de outra origem sem uma pré-verificação que o serviço recusa.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def send_json(self, status, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def authorized(self):
+            host = urlparse('//' + self.headers.get('Host', '')).hostname
+            if host not in allowed_hosts:
+                self.send_json(403, {'error': 'Host não permitido'})
+                return False
+            authorization = self.headers.get('Authorization', '')
+            if not hmac.compare_digest(authorization.encode('utf-8'), f'Bearer {token}'.encode('utf-8')):
+                self.send_json(401, {'error': 'segredo do serviço ausente ou inválido'})
+                return False
+            return True
+
+        def do_GET(self):
+            if not self.authorized():
+                return
+            url = urlparse(self.path)
+            if url.path == '/status':
+                return self.send_json(200, daemon.status())
+            parts = url.path.strip('/').split('/')
+            job = daemon.job(parts[1]) if len(parts) == 2 and parts[0] == 'jobs' else None
+            if job is not None:
+                try:
+                    since = int(parse_qs(url.query).get('since', ['0'])[0])
+                    if since < 0:
+                        raise ValueError(since)
+                except ValueError:
+                    return self.send_json(400, {'error': 'since deve ser um inteiro não negativo'})
+                return self.send_json(200, job.status(since))
+            self.send_json(404, {'error': 'não encontrado'})
+
+        def do_POST(self):
+            if not self.authorized():
+                return
+            if urlparse(self.path).path != '/jobs':
+                return self.send_json(404, {'error': 'não encontrado'})
+            if self.headers.get('Content-Type', '').split(';')[0].strip() != 'application/json':
+                return self.send_json(415, {'error': 'use Content-Type: application/json'})
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                job = daemon.submit(body['kind'], body.get('options', {}))
+            except (ValueError, KeyError, TypeError) as e:
+                return self.send_json(400, {'error': str(e)})
+            self.send_json(202, job.status())
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(engine, host=DEFAULT_HOST, port=DEFAULT_PORT, token_path=TOKEN_PATH):
+    """Atende trabalhos em host:port até ser interrompido, com um novo segredo em token_path."""
+    token = create_token(token_path)
+    handler = make_handler(FaceDaemon(engine), token, LOCAL_HOSTS | {host})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f'Serviço de reconhecimento em http://{host}:{port} com {engine.workers} processo(s)')
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        engine.close()
+
+
+class EngineClient:
+    """
+    Cliente do serviço, com a mesma interface run_job do FaceEngine, para que as
+    interfaces e a linha de comando usem um ou outro sem diferença. Autentica-se
+    com o segredo que o serviço grava em token_path.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, poll_interval=0.5, token_path=TOKEN_PATH):
+        self.url = f'http://{host}:{port}'
+        self.poll_interval = poll_interval
+        self.token_path = token_path
+
+    def request(self, path, body=None, timeout=10):
+        token = read_token(self.token_path)
+        if token is None:
+            raise OSError(f'Segredo do serviço não encontrado em {self.token_path}')
+        data = None if body is None else json.dumps(body).encode('utf-8')
+        request = urllib.request.Request(self.url + path, data=data,
+                                         headers={'Content-Type': 'application/json',
+                                                  'Authorization': f'Bearer {token}'})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+
+    def available(self, workers=None, shape_predictor_path=None):
+        """
+        Indica se o serviço está rodando e aceita o segredo deste usuário. Com workers ou
+        shape_predictor_path, também se o serviço usa esse número de processos e esse modelo
+        de pontos faciais; senão, quem chamou deve usar um motor próprio com as suas opções.
+        """
+        try:
+            status = self.request('/status', timeout=0.5)
+        except (OSError, ValueError):
+            return False
+        if workers is not None and status['workers'] != workers:
+            return False
+        return (shape_predictor_path is None
+                or status.get('shape_predictor') == os.path.abspath(shape_predictor_path))
+
+    def run_job(self, kind, report=print, **options):
+        """Envia o trabalho, repassa suas mensagens para report e retorna o resultado."""
+        try:
+            job = self.request('/jobs', {'kind': kind, 'options': options})
+        except urllib.error.HTTPError as e:
+            raise ValueError(json.loads(e.read()).get('error', str(e)))
+        received = 0
+        while True:
+            status = self.request(f'/jobs/{job["id"]}?since={received}')
+            for message in status['messages']:
+                report(message)
+            received = status['next']
+            if status['state'] == DONE:
+                return status['result']
+            if status['state'] == FAILED:
+                raise RuntimeError(status['error'])
+            time.sleep(self.poll_interval)
+
+
+def connect(database_path=DATABASE_PATH, workers=None, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Retorna um cliente do serviço, se estiver rodando (com workers processos, se dado), ou um motor local."""
+    client = EngineClient(host, port)
+    if client.available(workers):
+        return client
+    from face_engine import FaceEngine
+    return FaceEngine(database_path, workers)
+
+
+# Opções de linha de comando do filtro de qualidade (ver face_quality.QualityGate).
+QUALITY_OPTIONS = ('min_score', 'min_size', 'max_faces', 'max_yaw', 'min_sharpness')
+
+
+def add_quality_arguments(parser):
+    group = parser.add_argument_group('filtro de qualidade', 'descarta rostos ruins antes dos descritores; 0 desliga')
+    group.add_argument('--min-score', type=float, default=0.0, help='pontuação mínima do detector')
+    group.add_argument('--min-size', type=int, default=0, help='lado mínimo do rosto, em pixels da imagem original')
+    group.add_argument('--max-faces', type=int, default=0, help='rostos por imagem (os de maior pontuação)')
+    group.add_argument('--max-yaw', type=float, default=0.0, help='rosto virado de lado, de 0 (frontal) a 1 (perfil)')
+    group.add_argument('--min-sharpness', type=float, default=0.0, help='nitidez mínima do recorte (variância do laplaciano)')
+
+
+# Opções de linha de comando do pré-filtro de imagens sem rosto (ver face_prefilter.FacePrefilter).
+PREFILTER_OPTIONS = {'prefilter_cascade': 'cascade', 'prefilter_face_size': 'face_size',
+                     'prefilter_scale': 'scale_factor', 'prefilter_neighbors': 'min_neighbors'}
+
+
+def add_prefilter_arguments(parser):
+    group = parser.add_argument_group('pré-filtro', 'pula o detector em imagens que um classificador em cascata '
+                                                    'rápido considera sem rosto (exige OpenCV 4.x)')
+    group.add_argument('--prefilter', action='store_true', help='liga o pré-filtro')
+    group.add_argument('--prefilter-cascade',
+                       help='classificador Haar ou LBP: nome de um dos que acompanham o OpenCV ou caminho '
+                            '(padrão: haarcascade_frontalface_default.xml)')
+    group.add_argument('--prefilter-face-size', type=int,
+                       help='pixels do menor rosto na miniatura (padrão: 24); maior perde menos rostos e é mais lento')
+    group.add_argument('--prefilter-scale', type=float,
+                       help='passo entre escalas do classificador (padrão: 1.1); menor perde menos rostos e é mais lento')
+    group.add_argument('--prefilter-neighbors', type=int,
+                       help='detecções vizinhas exigidas (padrão: 1); maior pula mais imagens e perde mais rostos')
+
+
+# Opções de linha de comando da entrada de vídeo (ver video_tracking).
+VIDEO_OPTIONS = ('sample_interval', 'embed_interval', 'max_embeddings')
+
+
+def add_video_arguments(parser):
+    group = parser.add_argument_group('vídeos', 'procura também nos vídeos, acompanhando os rostos entre quadros')
+    group.add_argument('--videos', action='store_true', help='inclui .mp4, .mov, .avi, .mkv, .m4v e .webm')
+    group.add_argument('--sample-interval', type=float, default=0.5, help='segundos entre quadros amostrados')
+    group.add_argument('--embed-interval', type=float, default=2.0,
+                       help='segundos entre descritores do mesmo rosto acompanhado')
+    group.add_argument('--max-embeddings', type=int, default=3, help='descritores por rosto acompanhado')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serviço e linha de comando do reconhecimento facial.')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--database', default=DATABASE_PATH, help='banco de referências (motor local ou serviço)')
+    parser.add_argument('--workers', type=int, default=None)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('serve', help='mantém os modelos carregados e atende trabalhos')
+    commands.add_parser('status', help='mostra o estado do serviço')
+
+    search = commands.add_parser('search', help='procura as pessoas de referência em um diretório')
+    search.add_argument('persons_dir')
+    search.add_argument('search_dir')
+    search.add_argument('output_dir')
+    search.add_argument('--threshold', type=float, default=0.55)
+    search.add_argument('--min-face-size', type=int, default=0)
+    search.add_argument('--batch-size', type=int, default=32)
+    search.add_argument('--output-mode', default='copy')
+    search.add_argument('--no-incremental', dest='incremental', action='store_false')
+    search.add_argument('--no-dedup', dest='dedup', action='store_false')
+    search.add_argument('--metrics', dest='metrics_path',
+                        help='grava as métricas (formato do Prometheus e JSON ao lado) durante a busca')
+    add_quality_arguments(search)
+    add_prefilter_arguments(search)
+    add_video_arguments(search)
+
+    embed = commands.add_parser('embed', help='imprime os descritores dos rostos de cada arquivo em JSON')
+    embed.add_argument('file_paths', nargs='+')
+    embed.add_argument('--min-face-size', type=int, default=0)
+    add_quality_arguments(embed)
+
+    enroll = commands.add_parser('enroll', help='cadastra fotos de uma pessoa no diretório de referência')
+    enroll.add_argument('persons_dir')
+    enroll.add_argument('name')
+    enroll.add_argument('file_paths', nargs='+')
+
+    check = commands.add_parser('check', help='lista referências sem rosto detectável')
+    check.add_argument('persons_dir')
+
+    separate = commands.add_parser('separate', help='agrupa os rostos de um diretório por pessoa')
+    separate.add_argument('input_dir')
+    separate.add_argument('output_dir')
+    separate.add_argument('--batch', action='store_true')
+    separate.add_argument('--min-face-size', type=int, default=0)
+    separate.add_argument('--batch-size', type=int, default=32)
+    separate.add_argument('--metrics', dest='metrics_path',
+                          help='grava as métricas (formato do Prometheus e JSON ao lado) durante a separação')
+    add_quality_arguments(separate)
+    add_prefilter_arguments(separate)
+    add_video_arguments(separate)
+
+    shard = commands.add_parser('shard', help='executa uma parte de uma busca dividida entre máquinas')
+    shard.add_argument('persons_dir')
+    shard.add_argument('search_dir')
+    shard.add_argument('shards_dir')
+    shard.add_argument('--shard', type=int, required=True, help='parte a executar, de 0 a SHARDS - 1')
+    shard.add_argument('--shards', type=int, required=True)
+    shard.add_argument('--threshold', type=float, default=0.55)
+    shard.add_argument('--min-face-size', type=int, default=0)
+    shard.add_argument('--batch-size', type=int, default=32)
+    shard.add_argument('--no-dedup', dest='dedup', action='store_false')
+    shard.add_argument('--metrics', dest='metrics_path')
+    add_quality_arguments(shard)
+    add_prefilter_arguments(shard)
+
+    merge = commands.add_parser('merge', help='junta as partes concluídas nas pastas de cada pessoa')
+    merge.add_argument('shards_dir')
+    merge.add_argument('output_dir')
+    merge.add_argument('--shards', type=int, required=True)
+    merge.add_argument('--output-mode', default='copy')
+    merge.add_argument('--search-dir', help='diretório de busca nesta máquina, se montado em outro caminho')
+
+    index = commands.add_parser('index', help='indexa (ou atualiza o índice de) os rostos de um acervo de fotos')
+    index.add_argument('search_dir')
+    index.add_argument('index_dir')
+    index.add_argument('--min-face-size', type=int, default=0)
+    index.add_argument('--batch-size', type=int, default=32)
+    index.add_argument('--no-dedup', dest='dedup', action='store_false')
+    add_quality_arguments(index)
+    add_prefilter_arguments(index)
+
+    query = commands.add_parser('query', help='procura as pessoas de referência no índice, sem decodificar fotos')
+    query.add_argument('index_dir')
+    query.add_argument('--persons-dir', help='diretório de pessoas (padrão: as referências do banco)')
+    query.add_argument('--output-dir', help='coloca as fotos nas pastas de cada pessoa')
+    query.add_argument('--threshold', type=float, default=0.55)
+    query.add_argument('--output-mode', default='copy')
+
+    args = parser.parse_args(argv)
+    if args.command == 'serve':
+        from face_engine import FaceEngine
+        return serve(FaceEngine(args.database, args.workers), args.host, args.port)
+    if args.command == 'status':
+        client = EngineClient(args.host, args.port)
+        print(json.dumps(client.request('/status') if client.available() else {'running': False}))
+        return
+
+    paths = {'persons_dir', 'search_dir', 'output_dir', 'input_dir', 'metrics_path', 'shards_dir', 'index_dir'}
+    options = {key: os.path.abspath(value) if key in paths and value else value
+               for key, value in vars(args).items()
+               if key not in ('host', 'port', 'database', 'workers', 'command')}
+    if args.command in ('search', 'embed', 'separate', 'shard', 'index'):
+        quality = {key: options.pop(key) for key in QUALITY_OPTIONS}
+        options['quality'] = quality if any(quality.values()) else None
+    if args.command in ('search', 'separate', 'shard', 'index'):
+        prefilter = {name: options.pop(key) for key, name in PREFILTER_OPTIONS.items()}
+        prefilter = {name: value for name, value in prefilter.items() if value is not None}
+        if os.path.dirname(prefilter.get('cascade', '')):
+            prefilter['cascade'] = os.path.abspath(prefilter['cascade'])
+        options['prefilter'] = prefilter if options.pop('prefilter') else None
+    if args.command in ('search', 'separate'):
+        video = {key: options.pop(key) for key in VIDEO_OPTIONS}
+        options['video'] = video if options.pop('videos') else None
+    if 'file_paths' in options:
+        options['file_paths'] = [os.path.abspath(path) for path in options['file_paths']]
+
+    if args.command == 'merge':
+        # A junção só copia arquivos: não precisa dos modelos.
+        from search_shards import merge_shards
+        print(json.dumps(merge_shards(**options)))
+        return
+
+    engine = connect(args.database, args.workers, args.host, args.port)
+    report = print if args.command != 'embed' else (lambda message: print(message, file=sys.stderr))
+    try:
+        result = engine.run_job(args.command, report=report, **options)
+    finally:
+        if hasattr(engine, 'close'):
+            engine.close()
+    print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
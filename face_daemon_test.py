@@ -0,0 +1,144 @@
+import http.client
+import json
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+import unittest
+from http.server import ThreadingHTTPServer
+from face_daemon import EngineClient, FaceDaemon, Job, create_token, make_handler
+
+
+class FakeEngine:
+    """Motor falso: 'echo' devolve as opções e 'fail' lança um erro."""
+
+    workers = 1
+    database_path = ':memory:'
+    shape_predictor_path = 'shape_predictor_68_face_landmarks.dat'
+
+    def __init__(self):
+        self.jobs = {'echo': self.echo, 'fail': self.fail}
+
+    def run_job(self, kind, report=print, **options):
+        return self.jobs[kind](report=report, **options)
+
+    def echo(self, report, **options):
+        report('primeira')
+        report('segunda')
+        return options
+
+    def fail(self, report):
+        raise FileNotFoundError('diretório não encontrado')
+
+
+class TestFaceDaemon(unittest.TestCase):
+    """
+    Testes para o serviço local de reconhecimento e seu cliente.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.token_path = os.path.join(self.temp_dir, 'token')
+        self.token = create_token(self.token_path)
+        self.daemon = FaceDaemon(FakeEngine())
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(self.daemon, self.token))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.port = self.server.server_address[1]
+        self.client = EngineClient(port=self.port, poll_interval=0.01, token_path=self.token_path)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.temp_dir)
+
+    def raw_request(self, method, path, body=None, headers=None):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=5)
+        try:
+            connection.request(method, path, body=body, headers=headers or {})
+            return connection.getresponse().status
+        finally:
+            connection.close()
+
+    def test_run_job_returns_result_and_messages(self):
+        # O cliente repassa as mensagens do trabalho e devolve o resultado
+        messages = []
+        result = self.client.run_job('echo', report=messages.append, search_dir='/fotos', threshold=0.5)
+        self.assertEqual(result, {'search_dir': '/fotos', 'threshold': 0.5})
+        self.assertEqual(messages, ['primeira', 'segunda'])
+        self.assertEqual(self.client.request('/status')['jobs']['done'], 1)
+
+    def test_errors_reach_the_client(self):
+        # Erros do motor e trabalhos desconhecidos viram exceções no cliente
+        self.assertTrue(self.client.available())
+        with self.assertRaises(RuntimeError):
+            self.client.run_job('fail', report=lambda message: None)
+        with self.assertRaises(ValueError):
+            self.client.run_job('unknown')
+
+    def test_unavailable(self):
+        self.assertFalse(EngineClient(port=1, token_path=self.token_path).available())
+        # Sem o arquivo do segredo, o serviço rodando também não é usado
+        missing = os.path.join(self.temp_dir, 'missing')
+        self.assertFalse(EngineClient(port=self.port, token_path=missing).available())
+
+    def test_available_checks_engine_options(self):
+        # Um serviço com outro número de processos ou outro modelo não é usado
+        self.assertTrue(self.client.available(1, 'shape_predictor_68_face_landmarks.dat'))
+        self.assertFalse(self.client.available(workers=4))
+        self.assertFalse(self.client.available(shape_predictor_path='/outro/shape_predictor.dat'))
+
+    def test_invalid_since_is_rejected(self):
+        job = self.client.request('/jobs', {'kind': 'echo', 'options': {}})
+        headers = {'Authorization': f'Bearer {self.token}'}
+        self.assertEqual(self.raw_request('GET', f'/jobs/{job["id"]}?since=abc', headers=headers), 400)
+        self.assertEqual(self.raw_request('GET', f'/jobs/{job["id"]}?since=-1', headers=headers), 400)
+        self.assertEqual(self.raw_request('GET', f'/jobs/{job["id"]}?since=1', headers=headers), 200)
+
+    def test_token_file_is_private(self):
+        self.assertEqual(stat.S_IMODE(os.stat(self.token_path).st_mode), 0o600)
+
+    def test_requests_without_token_host_or_json_are_rejected(self):
+        # Sem segredo, com Host de outro domínio (DNS rebinding) ou com um corpo que um
+        # formulário de outra página enviaria, nenhum trabalho é aceito
+        authorization = {'Authorization': f'Bearer {self.token}'}
+        body = json.dumps({'kind': 'echo'})
+        self.assertEqual(self.raw_request('GET', '/status'), 401)
+        self.assertEqual(self.raw_request('GET', '/status', headers={'Authorization': 'Bearer errado'}), 401)
+        self.assertEqual(self.raw_request('GET', '/status', headers={**authorization, 'Host': 'evil.example:8765'}), 403)
+        self.assertEqual(self.raw_request('POST', '/jobs', body, {'Content-Type': 'application/json'}), 401)
+        self.assertEqual(self.raw_request('POST', '/jobs', body, {**authorization, 'Content-Type': 'text/plain'}), 415)
+        self.assertEqual(self.daemon.jobs, {})
+        self.assertEqual(self.raw_request('GET', '/status', headers={**authorization, 'Host': f'localhost:{self.port}'}), 200)
+
+
+class TestJobs(unittest.TestCase):
+    """
+    Testes para os limites de memória dos trabalhos do serviço.
+    """
+
+    def test_messages_are_bounded(self):
+        # Mensagens antigas são descartadas, mas os índices de since continuam valendo
+        job = Job('1', 'echo', {}, max_messages=3)
+        for i in range(5):
+            job.report(str(i))
+        self.assertEqual(job.messages, ['2', '3', '4'])
+        self.assertEqual(job.status(0)['messages'], ['2', '3', '4'])
+        self.assertEqual(job.status(4)['messages'], ['4'])
+        self.assertEqual(job.status(4)['next'], 5)
+
+    def test_finished_jobs_are_evicted(self):
+        daemon = FaceDaemon(FakeEngine(), job_ttl=60, max_finished=2)
+        jobs = [daemon.submit('echo', {}) for _ in range(3)]
+        while any(job.finished is None for job in jobs):
+            time.sleep(0.01)
+        self.assertEqual(daemon.status()['jobs']['done'], 2)
+        self.assertIsNone(daemon.job(jobs[0].id))
+        jobs[1].finished -= 120
+        self.assertIsNone(daemon.job(jobs[1].id))
+        self.assertIs(daemon.job(jobs[2].id), jobs[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,227 @@
+import hashlib
+import os
+import sqlite3
+import numpy as np
+from face_gallery import FaceGallery
+
+DATABASE_PATH = os.path.join(os.path.dirname(
+    os.path.realpath(__file__)), 'face-data.db')
+
+# Muda sempre que o modelo, a decodificação ou a forma de detecção mudar, invalidando os descritores salvos.
+MODEL_VERSION = 'dlib_face_recognition_resnet_model_v1/hog_upsample_1/opencv_exif'
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Espera (s) pelo banco quando outro processo o atualiza, como partes de uma busca dividida.
+DATABASE_TIMEOUT = 120
+
+
+def file_hash(file_path, chunk_size=1 << 20):
+    """Calcula o hash SHA-1 do conteúdo de um arquivo lendo em blocos."""
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def reference_person_name(persons_dir, file_path):
+    """Nome da pessoa: o nome do arquivo na raiz do diretório ou o nome da subpasta."""
+    relative = os.path.relpath(file_path, persons_dir)
+    parts = relative.split(os.sep)
+    if len(parts) == 1:
+        return os.path.basename(file_path).split('.')[0]
+    return parts[0]
+
+
+class FaceDatabase:
+    """
+    Armazena os descritores das imagens de referência na tabela FaceData, uma
+    linha por rosto de cada imagem, identificada pelo diretório de pessoas, pelo
+    caminho relativo a ele e pelo hash do conteúdo, junto com a versão do modelo.
+    Vários diretórios de pessoas podem usar o mesmo banco. Imagens inalteradas
+    nunca são decodificadas novamente, e uma cópia de uma imagem já conhecida
+    (em outra pasta ou outro diretório) reaproveita os seus descritores.
+    """
+
+    def __init__(self, path=DATABASE_PATH, model_version=MODEL_VERSION):
+        self.path = path
+        self.model_version = model_version
+        self.connection = sqlite3.connect(path, timeout=DATABASE_TIMEOUT)
+        self.create_schema()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def create_schema(self):
+        """Cria a tabela FaceData, se necessário, e adiciona as colunas de controle de versão."""
+        with self.connection:
+            # Trava o banco desde a leitura: outros processos podem estar migrando ao mesmo tempo.
+            self.connection.execute('BEGIN IMMEDIATE')
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS FaceData (
+                ID INT PRIMARY KEY,
+                PersonName VARCHAR(255),
+                FaceDescriptor BLOB
+            )''')
+            columns = {row[1] for row in self.connection.execute(
+                'PRAGMA table_info(FaceData)')}
+            for column in ('FilePath', 'FileHash', 'ModelVersion', 'PersonsDir'):
+                if column not in columns:
+                    self.connection.execute(
+                        f'ALTER TABLE FaceData ADD COLUMN {column} TEXT')
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS FaceDataFileHash ON FaceData (FileHash, ModelVersion)')
+            self.connection.execute(
+                'CREATE INDEX IF NOT EXISTS FaceDataFilePath ON FaceData (PersonsDir, FilePath)')
+
+    def sync(self, persons_dir, embed_file):
+        """
+        Reconcilia as linhas de persons_dir com as imagens do diretório e retorna a galeria
+        dele. embed_file(caminho) só é chamado para imagens de conteúdo ainda desconhecido
+        e deve retornar a lista de descritores dos rostos encontrados. Imagens removidas ou
+        alteradas saem da tabela; as de outros diretórios de pessoas não são tocadas.
+        Retorna (galeria, estatísticas).
+        """
+        root = self.root(persons_dir)
+        stats = {'reused': 0, 'enrolled': 0, 'removed': 0}
+        current = {}
+        for directory, dirs, files in os.walk(persons_dir):
+            for file in sorted(files):
+                if file.lower().endswith(IMAGE_EXTENSIONS):
+                    file_path = os.path.join(directory, file)
+                    current[os.path.relpath(file_path, persons_dir)] = (
+                        file_path, file_hash(file_path))
+
+        # Os descritores novos são calculados fora da transação, que só grava: o banco não fica
+        # travado para outros processos durante a detecção. Se outro processo mudou o banco
+        # entretanto e falta algum conteúdo, a rodada se repete só com o que falta.
+        embedded = {}
+        while True:
+            missing = {}
+            for file_path, file_hash_value in self._unknown(root, current):
+                if file_hash_value not in embedded:
+                    missing.setdefault(file_hash_value, file_path)
+            for file_hash_value, file_path in missing.items():
+                embedded[file_hash_value] = embed_file(file_path)
+            if self._write_sync(persons_dir, root, current, embedded, stats):
+                break
+
+        return self.load_gallery(persons_dir), stats
+
+    def _stored(self, root):
+        """Caminho relativo -> hash das imagens gravadas de root para a versão atual do modelo."""
+        return dict(self.connection.execute(
+            'SELECT DISTINCT FilePath, FileHash FROM FaceData WHERE PersonsDir = ? AND ModelVersion = ?',
+            (root, self.model_version)))
+
+    def _unknown(self, root, current):
+        """(caminho, hash) das imagens de current que mudaram e cujo conteúdo o banco não conhece."""
+        stored = self._stored(root)
+        return [(file_path, file_hash_value) for relative_path, (file_path, file_hash_value) in current.items()
+                if stored.get(relative_path) != file_hash_value and not self.known_descriptors(file_hash_value)]
+
+    def _write_sync(self, persons_dir, root, current, embedded, stats):
+        """
+        Grava a sincronização de root em uma transação curta, com os descritores já calculados
+        em embedded (hash -> descritores). Retorna False, sem gravar nada, se falta algum.
+        """
+        with self.connection:
+            # Leitura e gravação na mesma transação exclusiva, para que vários processos
+            # (partes de uma busca dividida) sincronizem o mesmo banco sem duplicar linhas.
+            self.connection.execute('BEGIN IMMEDIATE')
+            if any(file_hash_value not in embedded for _, file_hash_value in self._unknown(root, current)):
+                return False
+            stored = self._stored(root)
+            stats.update(reused=0, enrolled=0, removed=0)
+
+            for relative_path, (file_path, file_hash_value) in current.items():
+                if stored.get(relative_path) == file_hash_value:
+                    stats['reused'] += 1
+                    continue
+                person_name = reference_person_name(persons_dir, file_path)
+                known = self.known_descriptors(file_hash_value)
+                if known:
+                    # Conteúdo já conhecido (outra pasta ou outro diretório): copia os descritores.
+                    self.insert(person_name, relative_path, file_hash_value,
+                                [np.frombuffer(blob, dtype=np.float32) for blob in known if blob is not None],
+                                root)
+                    stats['reused'] += 1
+                    continue
+
+                self.insert(person_name, relative_path, file_hash_value, embedded[file_hash_value], root)
+                stats['enrolled'] += 1
+
+            # Só depois das cópias: uma imagem movida ou renomeada ainda serve de origem.
+            removed = [(root, relative_path, file_hash_value) for relative_path, file_hash_value in stored.items()
+                       if current.get(relative_path, (None, None))[1] != file_hash_value]
+            self.connection.executemany(
+                'DELETE FROM FaceData WHERE PersonsDir = ? AND FilePath = ? AND FileHash = ?', removed)
+            stats['removed'] = len(removed)
+
+            # Linhas de versões anteriores do banco, sem diretório, viram origem de descritores
+            # até o seu diretório ser sincronizado.
+            self.connection.executemany(
+                'DELETE FROM FaceData WHERE PersonsDir IS NULL AND FileHash = ?',
+                [(file_hash_value,) for _, file_hash_value in current.values()])
+            self.connection.execute(
+                'DELETE FROM FaceData WHERE ModelVersion IS NOT ? OR FileHash IS NULL',
+                (self.model_version,))
+        return True
+
+    def known_descriptors(self, file_hash_value):
+        """
+        Descritores (blobs, None para imagem sem rosto) da primeira imagem gravada com este
+        conteúdo, em qualquer diretório, ou uma lista vazia se o conteúdo é desconhecido.
+        """
+        source = self.connection.execute(
+            'SELECT PersonsDir, FilePath FROM FaceData WHERE FileHash = ? AND ModelVersion = ? ORDER BY ID LIMIT 1',
+            (file_hash_value, self.model_version)).fetchone()
+        if source is None:
+            return []
+        return [row[0] for row in self.connection.execute(
+            'SELECT FaceDescriptor FROM FaceData WHERE FileHash = ? AND ModelVersion = ? '
+            'AND PersonsDir IS ? AND FilePath IS ? ORDER BY ID',
+            (file_hash_value, self.model_version) + source)]
+
+    def insert(self, person_name, relative_path, file_hash_value, descriptors, persons_dir=None):
+        """Grava os descritores de uma imagem; imagens sem rosto ganham uma linha sem descritor."""
+        next_id = self.connection.execute(
+            'SELECT COALESCE(MAX(ID), 0) + 1 FROM FaceData').fetchone()[0]
+        blobs = [np.asarray(descriptor, dtype=np.float32).tobytes()
+                 for descriptor in descriptors] or [None]
+        self.connection.executemany(
+            'INSERT INTO FaceData (ID, PersonName, FaceDescriptor, FilePath, FileHash, ModelVersion, PersonsDir) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(next_id + i, person_name, blob, relative_path, file_hash_value, self.model_version, persons_dir)
+             for i, blob in enumerate(blobs)])
+
+    def load_gallery(self, persons_dir=None):
+        """
+        Monta a galeria com os descritores salvos de persons_dir (sem ele, de todos os
+        diretórios) para a versão atual do modelo.
+        """
+        gallery = FaceGallery()
+        for person_name, blob in self.connection.execute(
+                'SELECT PersonName, FaceDescriptor FROM FaceData WHERE ModelVersion = ? '
+                'AND FaceDescriptor IS NOT NULL AND (? IS NULL OR PersonsDir = ?) ORDER BY ID',
+                (self.model_version,) + (self.root(persons_dir),) * 2):
+            gallery.add(person_name, np.frombuffer(blob, dtype=np.float32))
+        return gallery
+
+    def files_without_faces(self, persons_dir=None):
+        """Lista as imagens de referência de persons_dir (sem ele, de todos) em que nenhum rosto foi detectado."""
+        return [row[0] for row in self.connection.execute(
+            'SELECT FilePath FROM FaceData WHERE ModelVersion = ? AND FaceDescriptor IS NULL '
+            'AND (? IS NULL OR PersonsDir = ?) ORDER BY FilePath',
+            (self.model_version,) + (self.root(persons_dir),) * 2)]
+
+    @staticmethod
+    def root(persons_dir):
+        """Diretório de pessoas como gravado na coluna PersonsDir."""
+        return None if persons_dir is None else os.path.abspath(persons_dir)
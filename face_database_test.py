@@ -0,0 +1,143 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import numpy as np
+from face_database import FaceDatabase
+
+
+class TestFaceDatabase(unittest.TestCase):
+    """
+    Testes para a persistência da galeria de referência em SQLite.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.persons_dir = os.path.join(self.temp_dir, 'PERSONS')
+        os.makedirs(os.path.join(self.persons_dir, 'Ana'))
+        self.write('Bruno.jpg', b'bruno')
+        self.write(os.path.join('Ana', 'ana1.jpg'), b'ana1')
+        self.write(os.path.join('Ana', 'ana2.png'), b'ana2')
+        self.embedded = []
+        self.database = FaceDatabase(os.path.join(self.temp_dir, 'faces.db'))
+
+    def tearDown(self):
+        self.database.close()
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, relative_path, content):
+        with open(os.path.join(self.persons_dir, relative_path), 'wb') as f:
+            f.write(content)
+
+    def embed_file(self, file_path):
+        # Descritor falso derivado do conteúdo; arquivos "vazio" não têm rosto
+        self.embedded.append(os.path.basename(file_path))
+        with open(file_path, 'rb') as f:
+            content = f.read()
+        if content == b'vazio':
+            return []
+        return [np.full(128, len(content), dtype=np.float32)]
+
+    def test_sync_reuses_unchanged_files(self):
+        # A segunda sincronização não processa nenhuma imagem
+        gallery, stats = self.database.sync(self.persons_dir, self.embed_file)
+        self.assertEqual(stats['enrolled'], 3)
+        self.assertEqual(sorted(gallery.names), ['Ana', 'Bruno'])
+
+        self.embedded.clear()
+        gallery, stats = self.database.sync(self.persons_dir, self.embed_file)
+        self.assertEqual(self.embedded, [])
+        self.assertEqual(stats['reused'], 3)
+        self.assertEqual(len(gallery), 3)
+
+    def test_embedding_runs_outside_the_write_lock(self):
+        # Outro processo consegue gravar no banco enquanto as referências são processadas
+        def embed_file(file_path):
+            other = sqlite3.connect(os.path.join(self.temp_dir, 'faces.db'), timeout=0)
+            try:
+                other.execute('BEGIN IMMEDIATE')
+                other.rollback()
+            finally:
+                other.close()
+            return self.embed_file(file_path)
+
+        gallery, stats = self.database.sync(self.persons_dir, embed_file)
+        self.assertEqual(stats['enrolled'], 3)
+        self.assertEqual(len(gallery), 3)
+
+    def test_sync_embeds_content_forgotten_meanwhile(self):
+        # Se outro processo apaga a origem de um conteúdo conhecido durante o processamento,
+        # a sincronização calcula esse conteúdo em vez de gravar referências sem descritores
+        other_dir = os.path.join(self.temp_dir, 'OTHER')
+        os.makedirs(other_dir)
+        for name, content in (('Davi.jpg', b'bruno'), ('Eva.jpg', b'eva')):
+            with open(os.path.join(other_dir, name), 'wb') as f:
+                f.write(content)
+        self.database.sync(self.persons_dir, self.embed_file)
+        self.embedded.clear()
+
+        def embed_file(file_path):
+            other = sqlite3.connect(os.path.join(self.temp_dir, 'faces.db'))
+            with other:
+                other.execute('DELETE FROM FaceData WHERE PersonsDir = ?', (os.path.abspath(self.persons_dir),))
+            other.close()
+            return self.embed_file(file_path)
+
+        gallery, stats = self.database.sync(other_dir, embed_file)
+        self.assertEqual(self.embedded, ['Eva.jpg', 'Davi.jpg'])
+        self.assertEqual(stats, {'reused': 0, 'enrolled': 2, 'removed': 0})
+        self.assertEqual(sorted(gallery.names), ['Davi', 'Eva'])
+
+    def test_sync_reconciles_changes(self):
+        # Arquivos alterados são reprocessados e removidos saem da tabela
+        self.database.sync(self.persons_dir, self.embed_file)
+        self.embedded.clear()
+        self.write('Bruno.jpg', b'vazio')
+        os.remove(os.path.join(self.persons_dir, 'Ana', 'ana2.png'))
+
+        gallery, stats = self.database.sync(self.persons_dir, self.embed_file)
+        self.assertEqual(self.embedded, ['Bruno.jpg'])
+        self.assertEqual(stats['removed'], 2)
+        self.assertEqual(gallery.names, ['Ana'])
+        self.assertEqual(self.database.files_without_faces(), ['Bruno.jpg'])
+
+
+    def test_identical_files_in_different_folders(self):
+        # A mesma foto em duas pastas vale para as duas pessoas e não é processada de novo
+        os.makedirs(os.path.join(self.persons_dir, 'Carla'))
+        self.write(os.path.join('Carla', 'ana1.jpg'), b'ana1')
+        gallery, stats = self.database.sync(self.persons_dir, self.embed_file)
+        self.assertEqual(stats, {'reused': 1, 'enrolled': 3, 'removed': 0})
+        self.assertEqual(sorted(gallery.names), ['Ana', 'Bruno', 'Carla'])
+
+        gallery, stats = self.database.sync(self.persons_dir, self.embed_file)
+        self.assertEqual(stats, {'reused': 4, 'enrolled': 0, 'removed': 0})
+        self.assertEqual(len(gallery), 4)
+        os.remove(os.path.join(self.persons_dir, 'Carla', 'ana1.jpg'))
+        gallery, stats = self.database.sync(self.persons_dir, self.embed_file)
+        self.assertEqual(stats['removed'], 1)
+        self.assertEqual(sorted(gallery.names), ['Ana', 'Bruno'])
+
+    def test_persons_dirs_are_kept_apart(self):
+        # Sincronizar outro diretório de pessoas não apaga nem mistura as linhas do primeiro
+        other_dir = os.path.join(self.temp_dir, 'OTHER')
+        os.makedirs(other_dir)
+        with open(os.path.join(other_dir, 'Davi.jpg'), 'wb') as f:
+            f.write(b'bruno')
+        self.database.sync(self.persons_dir, self.embed_file)
+        self.embedded.clear()
+
+        gallery, stats = self.database.sync(other_dir, self.embed_file)
+        self.assertEqual(self.embedded, [])
+        self.assertEqual(stats, {'reused': 1, 'enrolled': 0, 'removed': 0})
+        self.assertEqual(gallery.names, ['Davi'])
+
+        gallery, stats = self.database.sync(self.persons_dir, self.embed_file)
+        self.assertEqual(stats, {'reused': 3, 'enrolled': 0, 'removed': 0})
+        self.assertEqual(sorted(gallery.names), ['Ana', 'Bruno'])
+        self.assertEqual(len(self.database.load_gallery()), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import cv2
+import dlib
+
+# A janela do detector HOG do dlib encontra rostos a partir de ~80px; cada
+# upsample de 2x reduz esse mínimo pela metade.
+DETECTOR_WINDOW_SIZE = 80
+
+
+def detection_scale(image_shape, min_face_size, upsample=1):
+    """
+    Escolhe a escala (<= 1) em que o detector deve rodar para ainda encontrar
+    rostos de min_face_size pixels na imagem original. min_face_size 0 mantém a resolução total.
+    """
+    if not min_face_size:
+        return 1.0
+    smallest_detectable = DETECTOR_WINDOW_SIZE / (2 ** upsample)
+    scale = smallest_detectable / min_face_size
+    # Imagens pequenas não são reduzidas abaixo de uma janela do detector.
+    scale = max(scale, DETECTOR_WINDOW_SIZE / min(image_shape[:2]))
+    return min(scale, 1.0)
+
+
+def scale_rectangle(rect, factor):
+    """Reescala um dlib.rectangle por um fator."""
+    return dlib.rectangle(int(round(rect.left() * factor)), int(round(rect.top() * factor)),
+                          int(round(rect.right() * factor)), int(round(rect.bottom() * factor)))
+
+
+def detect_faces(detector, img, min_face_size=0, upsample=1):
+    """
+    Roda o detector em uma cópia reduzida da imagem, escolhida pelo tamanho da
+    imagem e pelo menor rosto desejado, e devolve os retângulos na resolução
+    original para o preditor de pontos e os recortes de rosto.
+    """
+    return detect_faces_with_scores(detector, img, min_face_size, upsample)[0]
+
+
+def detect_faces_with_scores(detector, img, min_face_size=0, upsample=1, adjust_threshold=0.0):
+    """
+    Como detect_faces, mas retorna (retângulos, pontuações do detector) usando detector.run;
+    adjust_threshold < 0 devolve também detecções menos confiáveis.
+    """
+    scale = detection_scale(img.shape, min_face_size, upsample)
+    if scale >= 1.0:
+        rects, scores, _ = detector.run(img, upsample, adjust_threshold)
+        return rects, list(scores)
+
+    small = cv2.resize(img, None, fx=scale, fy=scale,
+                       interpolation=cv2.INTER_AREA)
+    dets, scores, _ = detector.run(small, upsample, adjust_threshold)
+    rects = dlib.rectangles()
+    for det in dets:
+        rects.append(scale_rectangle(det, 1.0 / scale))
+    return rects, list(scores)
@@ -0,0 +1,45 @@
+import dlib
+import numpy as np
+
+DEFAULT_BATCH_SIZE = 32
+
+
+class FaceEmbedder:
+    """
+    Estágio de descritores faciais em lote.
+    Extrai os recortes alinhados de 150x150 de vários rostos e imagens e os passa
+    pela ResNet do dlib em lotes de tamanho fixo, amortizando o custo por chamada.
+    """
+
+    def __init__(self, facerec, sp, batch_size=DEFAULT_BATCH_SIZE):
+        self.facerec = facerec
+        self.sp = sp
+        self.batch_size = max(1, batch_size)
+
+    def extract_chips(self, img, rects):
+        """Retorna os recortes alinhados (150x150, padding 0.25) dos rostos de uma imagem."""
+        return self.chips_from_shapes(img, self.extract_shapes(img, rects))
+
+    def extract_shapes(self, img, rects):
+        """Pontos faciais de cada rosto de uma imagem."""
+        detections = dlib.full_object_detections()
+        for rect in rects:
+            detections.append(self.sp(img, rect))
+        return detections
+
+    def chips_from_shapes(self, img, shapes):
+        """Recortes alinhados a partir dos pontos faciais já calculados."""
+        if not len(shapes):
+            return []
+        if not isinstance(shapes, dlib.full_object_detections):
+            shapes = dlib.full_object_detections(shapes)
+        return dlib.get_face_chips(img, shapes, size=150, padding=0.25)
+
+    def embed_chips(self, chips):
+        """Calcula os descritores de uma lista de recortes, em lotes de batch_size, como matriz float32 (N, 128)."""
+        descriptors = np.zeros((len(chips), 128), dtype=np.float32)
+        for start in range(0, len(chips), self.batch_size):
+            batch = chips[start:start + self.batch_size]
+            descriptors[start:start + len(batch)] = np.asarray(
+                self.facerec.compute_face_descriptor(batch), dtype=np.float32)
+        return descriptors
@@ -0,0 +1,71 @@
+import unittest
+from unittest import mock
+import dlib
+import numpy as np
+import face_engine
+from face_embedding import FaceEmbedder
+from metrics import Metrics
+
+
+class FakeRecognitionModel:
+    """Modelo falso que registra o tamanho de cada lote recebido."""
+
+    def __init__(self):
+        self.batches = []
+
+    def compute_face_descriptor(self, batch):
+        self.batches.append(len(batch))
+        return [np.full(128, chip[0, 0, 0], dtype=np.float64) for chip in batch]
+
+
+class FakeDetector:
+    """Detector falso: a imagem de valor n tem n rostos, em left = 10 * imagem + rosto."""
+
+    def run(self, img, upsample, adjust_threshold):
+        value = int(img[0, 0, 0])
+        rects = [dlib.rectangle(10 * value + i, 0, 10 * value + i + 20, 20) for i in range(value % 10)]
+        return rects, [1.0] * len(rects), [0] * len(rects)
+
+
+class RectangleChipEmbedder(FaceEmbedder):
+    """Sem modelo de pontos: cada recorte guarda o left do seu retângulo."""
+
+    def extract_shapes(self, img, rects):
+        return list(rects)
+
+    def chips_from_shapes(self, img, shapes):
+        return [np.full((150, 150, 3), shape.left(), dtype=np.uint8) for shape in shapes]
+
+
+class TestFaceEmbedder(unittest.TestCase):
+    """
+    Testes para o estágio de descritores em lote.
+    """
+
+    def setUp(self):
+        self.facerec = FakeRecognitionModel()
+        self.chips = [np.full((150, 150, 3), i, dtype=np.uint8)
+                      for i in range(10)]
+
+    def test_embed_chips_fixed_size_batches(self):
+        # Os recortes são enviados em lotes de tamanho fixo e voltam em ordem
+        embedder = FaceEmbedder(self.facerec, None, batch_size=4)
+        descriptors = embedder.embed_chips(self.chips)
+        self.assertEqual(self.facerec.batches, [4, 4, 2])
+        self.assertEqual(descriptors.dtype, np.float32)
+        np.testing.assert_array_equal(descriptors[:, 0], np.arange(10))
+
+    def test_detect_and_embed_batches_across_images(self):
+        # Rostos de imagens diferentes dividem o mesmo lote e voltam separados por imagem
+        embedder = RectangleChipEmbedder(self.facerec, None)
+        state = {'detector': FakeDetector(), 'embedder': embedder, 'metrics': Metrics()}
+        images = [(np.full((40, 40, 3), value, dtype=np.uint8), 1.0, None) for value in (3, 0, 14)]
+        with mock.patch.dict(face_engine.worker_state, state):
+            results = face_engine.detect_and_embed(images, batch_size=8)
+        self.assertEqual(self.facerec.batches, [7])
+        self.assertEqual([len(descriptors) for _, _, _, descriptors in results], [3, 0, 4])
+        np.testing.assert_array_equal(results[2][3][:, 0], [140, 141, 142, 143])
+        self.assertEqual(state['metrics'].snapshot()['counters']['faces_embedded'], 7)
+
+if __name__ == '__main__':
+    unittest.main()
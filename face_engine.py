@@ -0,0 +1,990 @@
+import csv
+import functools
+import os
+import shutil
+import threading
+import time
+from collections import namedtuple
+from multiprocessing import Pool, cpu_count
+import dlib
+import numpy as np
+from tqdm import tqdm
+from face_clustering import FaceClusters, cluster_faces
+from face_database import DATABASE_PATH, MODEL_VERSION, FaceDatabase
+from face_detection import detect_faces_with_scores, scale_rectangle
+from face_embedding import DEFAULT_BATCH_SIZE, FaceEmbedder
+from face_prefilter import FacePrefilter
+from face_quality import QualityGate, rejected_counts
+from gallery_index import BruteForceIndex, recall
+from image_dedup import DuplicateIndex
+from image_loader import TARGET_FACE_SIZE, load_image
+from metrics import Metrics
+from photo_index import PhotoIndex
+from search_manifest import MANIFEST_NAME, PENDING, STALE, UNCHANGED, SearchManifest
+from search_output import COPY, MANIFEST_ONLY, SearchOutput
+from search_pipeline import SearchPipeline, scan_images
+from search_shards import ERRORS_NAME, SHARD_SUMMARY_NAME, shard_dir, shard_files, shard_summary, write_summary
+from video_tracking import (DEFAULT_EMBED_INTERVAL, DEFAULT_MAX_EMBEDDINGS, DEFAULT_SAMPLE_INTERVAL, MAX_MISSES,
+                            VIDEO_EXTENSIONS, VIDEO_MATCHES_NAME, FaceTracker, format_time, merge_ranges,
+                            sample_frames, write_video_matches)
+
+RECOGNITION_MODEL_PATH = 'dlib_face_recognition_resnet_model_v1.dat'
+SHAPE_PREDICTOR_PATH = os.path.join(
+    os.getcwd(), 'shape_predictor_68_face_landmarks.dat')
+
+# A partir deste número de referências a galeria usa o índice aproximado IVF; abaixo dele
+# a comparação exata é tão rápida quanto (ver gallery_index.IVF_MIN_REFERENCES).
+GALLERY_INDEX_MIN_REFERENCES = 5000
+
+# Consultas usadas para medir o recall do índice IVF ao criá-lo.
+RECALL_QUERIES = 2000
+
+# Imagens enviadas juntas a cada processo, para que seus rostos formem lotes de descritores.
+IMAGES_PER_TASK = 8
+
+# Ação do pipeline para cada estado do manifesto na busca incremental.
+INCREMENTAL_ACTIONS = {PENDING: 'process', STALE: 'rematch', UNCHANGED: None}
+
+# Intervalo (s) entre gravações do arquivo de métricas durante um trabalho longo.
+METRICS_INTERVAL = 10
+
+# Imagens entre gravações do manifesto da busca, para que uma busca interrompida
+# recomece de onde parou.
+MANIFEST_COMMIT_INTERVAL = 256
+
+# Estado de cada processo do pool, preenchido uma única vez por init_worker.
+worker_state = {}
+
+# Rosto encontrado por embed_files_function: retângulo nas coordenadas da imagem original,
+# pontuação do detector, recorte 150x150 (ou None) e descritor.
+Face = namedtuple('Face', 'left top right bottom score chip descriptor')
+
+# Rosto acompanhado em um vídeo por embed_video_function: como Face, com o retângulo, a pontuação e
+# o recorte do melhor quadro e a média dos descritores, mais o primeiro e o último instante (s)
+# em que aparece e todos os descritores calculados.
+VideoFace = namedtuple('VideoFace', Face._fields + ('start', 'end', 'descriptors'))
+
+
+class FaceEngine:
+    """
+    Motor de detecção, descritores e comparação, sem interface gráfica.
+
+    Mantém os modelos carregados no processo principal (referências) e em um pool
+    de processos que sobrevive entre trabalhos, além das galerias de referência já
+    sincronizadas. As mensagens de cada trabalho vão para report(mensagem); erros
+    viram exceções para quem chamou. Usado pelas interfaces, pela linha de comando
+    e pelo serviço de face_daemon.
+    """
+
+    def __init__(self, database_path=DATABASE_PATH, workers=None,
+                 shape_predictor_path=SHAPE_PREDICTOR_PATH, recognition_model_path=RECOGNITION_MODEL_PATH):
+        self.database_path = database_path
+        self.workers = workers or cpu_count()
+        self.shape_predictor_path = shape_predictor_path
+        self.recognition_model_path = recognition_model_path
+        self.detector = dlib.get_frontal_face_detector()
+        self.sp = dlib.shape_predictor(shape_predictor_path)
+        self.facerec = dlib.face_recognition_model_v1(recognition_model_path)
+        self.pool = None
+        self.pool_lock = threading.Lock()
+        # Galeria (com índice) de cada diretório de pessoas, reaproveitada enquanto não mudar.
+        self.galleries = {}
+        self.jobs = {'search': self.search, 'embed': self.embed, 'enroll': self.enroll_person,
+                     'check': self.check_references, 'separate': self.separate,
+                     'shard': self.search_shard, 'index': self.index_photos, 'query': self.query_index}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        with self.pool_lock:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+                self.pool = None
+
+    def get_pool(self):
+        """Retorna o pool de processos, criando-o (e carregando os modelos) no primeiro uso."""
+        with self.pool_lock:
+            if self.pool is None:
+                self.pool = Pool(self.workers, initializer=init_worker,
+                                 initargs=(self.shape_predictor_path, self.recognition_model_path))
+            return self.pool
+
+    def run_job(self, kind, report=print, **options):
+        """Executa um trabalho (uma das chaves de self.jobs, ex.: 'search') e retorna seu resultado."""
+        if kind not in self.jobs:
+            raise ValueError(f'Trabalho desconhecido: {kind}')
+        return self.jobs[kind](report=report, **options)
+
+    def embed_reference_image(self, file_path):
+        """Detecta e retorna os descritores de todos os rostos de uma imagem de referência."""
+        img, _ = load_image(file_path)
+        embedder = FaceEmbedder(self.facerec, self.sp)
+        return list(embedder.embed_chips(embedder.extract_chips(img, self.detector(img, 1))))
+
+    def enroll(self, persons_dir, report=print):
+        """Cria a galeria de referência com todos os rostos de todas as fotos de cada pessoa.
+
+        Fotos na raiz do diretório usam o nome do arquivo como pessoa; fotos em
+        subpastas usam o nome da subpasta, permitindo várias fotos por pessoa.
+        Os descritores ficam salvos em face-data.db e só imagens novas ou alteradas são processadas."""
+        with FaceDatabase(self.database_path) as database:
+            gallery, stats = database.sync(
+                persons_dir, self.embed_reference_image)
+        report(f'Referências: {stats["enrolled"]} novas, {stats["reused"]} reaproveitadas, '
+               f'{stats["removed"]} removidas ({gallery.num_people} pessoas)')
+
+        key = os.path.abspath(persons_dir)
+        cached = self.galleries.get(key)
+        if cached is not None and cached.fingerprint() == gallery.fingerprint():
+            return cached
+        self.prepare_gallery_index(gallery, report)
+        self.galleries[key] = gallery
+        return gallery
+
+    def prepare_gallery_index(self, gallery, report=print):
+        """Carrega ou cria o índice aproximado para galerias grandes e informa o recall medido."""
+        if len(gallery) < GALLERY_INDEX_MIN_REFERENCES:
+            return
+        index_path = os.path.splitext(self.database_path)[0] + '.ivf.npz'
+        if gallery.load_index(index_path) is not None:
+            report(f'Índice IVF carregado de {index_path}')
+            return
+
+        start = time.perf_counter()
+        index = gallery.build_index('ivf')
+        gallery.save_index(index_path)
+        # As consultas são referências da própria galeria, que não contam como vizinhas de si mesmas.
+        sample = np.random.default_rng(0).choice(len(gallery), min(len(gallery), RECALL_QUERIES), replace=False)
+        exact = BruteForceIndex(gallery.descriptors)
+        k = gallery.index_candidates()
+        measured = recall(index, exact, gallery.descriptors[sample], k, query_ids=sample)
+        nearest = recall(index, exact, gallery.descriptors[sample], 1, query_ids=sample)
+        report(f'Índice IVF com {len(index.centroids)} listas criado em {time.perf_counter() - start:.2f}s '
+               f'(em {len(sample)} consultas, em relação à busca exata: recall@{k} {measured:.3f}, '
+               f'vizinho mais próximo {nearest:.3f})')
+
+    def check_references(self, persons_dir, report=print):
+        """Sincroniza as referências e lista as imagens em que nenhum rosto foi detectado."""
+        self.enroll(persons_dir, report)
+        with FaceDatabase(self.database_path) as database:
+            return database.files_without_faces(persons_dir)
+
+    def enroll_person(self, persons_dir, name, file_paths, report=print):
+        """Copia as fotos de uma pessoa para persons_dir/nome e atualiza a galeria."""
+        person_dir = os.path.join(persons_dir, name)
+        os.makedirs(person_dir, exist_ok=True)
+        for file_path in file_paths:
+            shutil.copy2(file_path, person_dir)
+        gallery = self.enroll(persons_dir, report)
+        references = int(np.sum(gallery.person_ids == gallery.names.index(name))) if name in gallery.names else 0
+        return {'person': name, 'references': references, 'people': gallery.num_people}
+
+    def embed(self, file_paths, min_face_size=0, batch_size=DEFAULT_BATCH_SIZE, quality=None, report=print):
+        """Retorna, para cada arquivo, a posição e o descritor de cada rosto encontrado."""
+        tasks = [file_paths[i:i + IMAGES_PER_TASK]
+                 for i in range(0, len(file_paths), IMAGES_PER_TASK)]
+        function = functools.partial(embed_files_function, min_face_size=min_face_size,
+                                     batch_size=batch_size, gate=quality_gate(quality))
+        results = []
+        for task_results, _ in self.get_pool().imap(function, tasks):
+            for file_path, faces in task_results:
+                results.append({'file_path': file_path,
+                                'faces': [{'left': face.left, 'top': face.top, 'right': face.right,
+                                           'bottom': face.bottom, 'score': face.score,
+                                           'descriptor': face.descriptor.tolist()}
+                                          for face in faces]})
+        report(f'{len(results)} imagens, {sum(len(r["faces"]) for r in results)} rostos')
+        return results
+
+    def search(self, persons_dir, search_dir, output_dir, threshold=0.55, min_face_size=0,
+               batch_size=DEFAULT_BATCH_SIZE, incremental=True, dedup=True, output_mode=COPY,
+               metrics_path=None, file_paths=None, errors_path=None, quality=None, prefilter=None,
+               video=None, report=print):
+        """
+        Procura as pessoas do diretório de referência nas imagens do diretório de busca
+        e as coloca no diretório de saída. Retorna um resumo com os contadores e as métricas
+        por estágio, que também são gravadas em metrics_path durante a busca (ver Metrics.write).
+        file_paths restringe a busca a parte das imagens (ver search_shard) e errors_path
+        recebe um CSV com as imagens que não puderam ser processadas. quality traz as opções
+        de QualityGate para descartar rostos ruins antes dos descritores, e prefilter as de
+        FacePrefilter para pular sem detecção as imagens que parecem não ter rosto. Com video
+        (opções de embed_video_function, {} para os padrões), os vídeos do diretório de busca
+        também são procurados: cada um vai para as pastas das pessoas encontradas e os
+        trechos de cada pessoa ficam em videos.csv e em 'videos' no resumo.
+        """
+        if not os.path.isdir(persons_dir):
+            raise FileNotFoundError(f'O diretório de pessoas "{persons_dir}" não foi encontrado.')
+        if not os.path.isdir(search_dir):
+            raise FileNotFoundError(f'O diretório de busca "{search_dir}" não foi encontrado.')
+        os.makedirs(output_dir, exist_ok=True)
+
+        # lê todas as imagens de referência e cria os descritores faciais
+        gallery = self.enroll(persons_dir, report)
+        top_k = 1
+        match_key = f'{gallery.fingerprint()}:{threshold}:{top_k}'
+
+        # As imagens fluem do diretório até a gravação por filas limitadas: cada
+        # tarefa leva só as imagens decodificadas; a comparação com a galeria é feita
+        # aqui, então o mesmo pool serve a qualquer galeria e limiar.
+        gate = quality_gate(quality)
+        face_prefilter = prefilter_for(prefilter, min_face_size)
+        manifest = None
+        select = None
+        if incremental:
+            # Pula imagens inalteradas; se só a galeria ou o limiar mudou,
+            # recompara a partir dos descritores salvos, sem decodificar a imagem.
+            manifest = SearchManifest(os.path.join(output_dir, MANIFEST_NAME),
+                                      detection_version(min_face_size, gate, face_prefilter))
+
+            def select(file_path):
+                return INCREMENTAL_ACTIONS[manifest.classify(file_path, match_key)]
+
+        metrics = Metrics()
+        pipeline = SearchPipeline(
+            self.get_pool,
+            functools.partial(embed_images_function, min_face_size=min_face_size, batch_size=batch_size,
+                              gate=gate),
+            self.workers, images_per_task=IMAGES_PER_TASK, select=select,
+            dedup=DuplicateIndex() if dedup else None, shared_pool=True, metrics=metrics,
+            prefilter=face_prefilter, hash_files=incremental)
+
+        exporter = MetricsExporter(metrics, metrics_path, pipeline.counts)
+
+        # Fotos com várias pessoas vão para a pasta de cada uma; ver SearchOutput.
+        output = SearchOutput(output_dir, output_mode)
+
+        def place(file_path, persons, file_hash_value=None):
+            placed = output.counts['placed']
+            with metrics.time('output'):
+                output.place(file_path, persons, file_hash_value)
+            metrics.count('copies', output.counts['placed'] - placed)
+
+        errors_file = None
+        if errors_path is not None:
+            errors_file = open(errors_path, 'w', newline='', encoding='utf-8')
+            errors_writer = csv.writer(errors_file)
+            errors_writer.writerow(['file_path', 'error'])
+
+        load_times = {}
+        image_times = []
+        rematched = 0
+        video_matches = {}
+        start = time.perf_counter()
+        try:
+            with tqdm(ncols=70, desc="Processing Images", unit='img') as progress:
+                if file_paths is None:
+                    file_paths = scan_images(search_dir)
+                for item in pipeline.run(file_paths):
+                    if item[0] == 'process':
+                        result = item[1]
+                        metrics.merge(result.pop('metrics', None))
+                        if 'persons' not in result:
+                            with metrics.time('match'):
+                                result['persons'] = match_persons(
+                                    gallery, result['descriptors'], threshold, top_k)
+                        metrics.count('matches', len(result['persons']))
+                        if manifest is not None:
+                            previous_hash = manifest.stored_hash(result['file_path'])
+                            if previous_hash not in (None, result['file_hash']):
+                                # O conteúdo mudou: as entradas com o conteúdo antigo saem antes
+                                # das novas, inclusive das pessoas que deixaram de aparecer.
+                                with metrics.time('output'):
+                                    output.remove(result['file_path'], manifest.matches(result['file_path']),
+                                                  previous_hash)
+                        place(result['file_path'], result['persons'], result['file_hash'])
+                        if 'pid' in result:
+                            load_times[result['pid']] = result['load_time']
+                        if 'duplicate_of' not in result and 'prefiltered' not in result:
+                            image_times.append(result['elapsed'])
+                        if manifest is not None:
+                            manifest.record(result['file_path'], result['file_hash'],
+                                            result['descriptors'], result['persons'], match_key)
+                    elif item[0] == 'rematch':
+                        file_path = item[1]
+                        with metrics.time('match'):
+                            persons = match_persons(gallery, manifest.descriptors(
+                                file_path), threshold, top_k)
+                        metrics.count('matches', len(persons))
+                        previous = set(manifest.matches(file_path))
+                        place(file_path, set(persons) - previous)
+                        # Quem deixou de ser encontrado sai da saída, como se a busca fosse nova.
+                        with metrics.time('output'):
+                            output.remove(file_path, previous - set(persons))
+                        manifest.update_matches(file_path, persons, match_key)
+                        rematched += 1
+                    else:
+                        report(f'Erro ao processar {item[1]}: {item[2]}')
+                        if errors_file is not None:
+                            errors_writer.writerow([os.path.abspath(item[1]), item[2]])
+                    progress.update(1)
+                    progress.set_postfix(pipeline.counts, refresh=False)
+                    exporter.tick()
+                    if manifest is not None and progress.n % MANIFEST_COMMIT_INTERVAL == 0:
+                        # A saída vai para o disco antes do manifesto: uma imagem
+                        # registrada nunca fica sem as suas correspondências.
+                        output.flush()
+                        manifest.commit()
+            if manifest is not None:
+                manifest.remove_unseen()
+                if output.mode == MANIFEST_ONLY:
+                    # O índice vira a cópia exata do manifesto, sem as correspondências antigas.
+                    manifest.commit()
+                    output.rewrite_index(manifest.entries())
+
+            # Os vídeos não entram no manifesto: são procurados de novo a cada busca.
+            if video is not None:
+                video_paths = scan_images(search_dir, VIDEO_EXTENSIONS)
+                for file_path, ranges, error in self.match_videos(gallery, video_paths, threshold, min_face_size,
+                                                                  batch_size, gate, video, metrics):
+                    if error is not None:
+                        report(f'Erro ao processar {file_path}: {error}')
+                        if errors_file is not None:
+                            errors_writer.writerow([os.path.abspath(file_path), error])
+                        continue
+                    metrics.count('matches', len(ranges))
+                    place(file_path, sorted(ranges))
+                    for person, person_ranges in ranges.items():
+                        video_matches.setdefault(person, []).extend(
+                            {'file_path': os.path.abspath(file_path), 'start': clip_start, 'end': clip_end,
+                             'distance': distance} for clip_start, clip_end, distance in person_ranges)
+                    exporter.tick()
+                write_video_matches(os.path.join(output_dir, VIDEO_MATCHES_NAME), video_matches)
+        finally:
+            output.close()
+            if manifest is not None:
+                manifest.close()
+            if errors_file is not None:
+                errors_file.close()
+
+        counts = pipeline.counts
+        elapsed = time.perf_counter() - start
+        metrics.set('rematched', rematched)
+        exporter.tick(force=True)
+        report(f'{counts["scanned"]} imagens encontradas: {counts["embedded"]} processadas, '
+               f'{counts["duplicates"]} duplicatas puladas, {counts["prefiltered"]} sem rosto pelo pré-filtro, '
+               f'{rematched} recomparadas, {counts["skipped"]} inalteradas, {counts["errors"]} erros')
+        report(f'Saída ({output.mode}): {output.counts["placed"]} colocadas, '
+               f'{output.counts["identical"]} já existentes, {output.counts["fallback"]} copiadas por falta de suporte, '
+               f'{output.counts["removed"]} retiradas')
+        rejected = report_rejected(metrics, gate, report)
+        print_timing(load_times, image_times, elapsed, batch_size, report)
+        report_video_matches(video_matches, report)
+        return dict(counts, rematched=rematched, output=output.counts, elapsed=elapsed,
+                    match_key=match_key, rejected=rejected, videos=video_matches, metrics=metrics.snapshot())
+
+    def match_videos(self, gallery, file_paths, threshold, min_face_size=0, batch_size=DEFAULT_BATCH_SIZE,
+                     gate=None, video=None, metrics=None):
+        """
+        Procura as pessoas da galeria nos vídeos, um por tarefa do pool (ver embed_video_function).
+        Gera, para cada vídeo, (caminho, {pessoa: [(início, fim, distância)]}, erro ou None).
+        """
+        video = video or {}
+        metrics = metrics if metrics is not None else Metrics()
+        function = functools.partial(embed_video_function, min_face_size=min_face_size, batch_size=batch_size,
+                                     gate=gate, **video)
+        for file_path, faces, error, task_metrics in self.get_pool().imap(function, file_paths):
+            metrics.merge(task_metrics)
+            if error is not None:
+                yield file_path, None, error
+                continue
+            with metrics.time('match'):
+                ranges = match_video_faces(gallery, faces, threshold,
+                                           video.get('sample_interval', DEFAULT_SAMPLE_INTERVAL))
+            yield file_path, ranges, None
+
+    def search_shard(self, persons_dir, search_dir, shards_dir, shard, shards, threshold=0.55,
+                     min_face_size=0, batch_size=DEFAULT_BATCH_SIZE, dedup=True, metrics_path=None,
+                     quality=None, prefilter=None, report=print):
+        """
+        Executa a parte shard (de 0 a shards - 1) de uma busca dividida entre processos ou
+        máquinas e grava o resultado parcial em shards_dir (ver search_shards). Executar a
+        mesma parte de novo continua uma execução interrompida. Junte as partes com merge_shards.
+        """
+        directory = shard_dir(shards_dir, shard, shards)
+        os.makedirs(directory, exist_ok=True)
+        summary_path = os.path.join(directory, SHARD_SUMMARY_NAME)
+        if os.path.exists(summary_path):
+            os.remove(summary_path)
+
+        report(f'Parte {shard + 1} de {shards} em {directory}')
+        result = self.search(persons_dir, search_dir, directory, threshold, min_face_size, batch_size,
+                             incremental=True, dedup=dedup, output_mode=MANIFEST_ONLY,
+                             metrics_path=metrics_path, file_paths=shard_files(search_dir, shard, shards),
+                             errors_path=os.path.join(directory, ERRORS_NAME), quality=quality,
+                             prefilter=prefilter, report=report)
+        counts = {key: result[key] for key in ('scanned', 'skipped', 'embedded', 'duplicates', 'prefiltered',
+                                                'errors', 'rematched')}
+        write_summary(summary_path, shard_summary(shard, shards, search_dir, result['match_key'], counts))
+        return dict(result, shard=shard, shards=shards, shard_dir=directory)
+
+    def index_photos(self, search_dir, index_dir, min_face_size=0, batch_size=DEFAULT_BATCH_SIZE,
+                     dedup=True, quality=None, prefilter=None, report=print):
+        """
+        Acrescenta ao índice de index_dir (ver PhotoIndex) os rostos das fotos novas ou
+        alteradas de search_dir e retira as que sumiram. Depois disso, query_index responde
+        quem aparece em quais fotos sem decodificar nenhuma imagem.
+        """
+        if not os.path.isdir(search_dir):
+            raise FileNotFoundError(f'O diretório de busca "{search_dir}" não foi encontrado.')
+
+        gate = quality_gate(quality)
+        face_prefilter = prefilter_for(prefilter, min_face_size)
+        index = PhotoIndex(index_dir, detection_version(min_face_size, gate, face_prefilter))
+        metrics = Metrics()
+        pipeline = SearchPipeline(
+            self.get_pool,
+            functools.partial(embed_images_function, min_face_size=min_face_size, batch_size=batch_size,
+                              gate=gate),
+            self.workers, images_per_task=IMAGES_PER_TASK,
+            select=lambda file_path: 'process' if index.needs_indexing(file_path) else None,
+            dedup=DuplicateIndex() if dedup else None, shared_pool=True,
+            metrics=metrics, prefilter=face_prefilter)
+
+        faces = 0
+        start = time.perf_counter()
+        try:
+            for n, item in enumerate(pipeline.run(scan_images(search_dir)), 1):
+                if item[0] == 'process':
+                    result = item[1]
+                    metrics.merge(result.pop('metrics', None))
+                    index.add(result['file_path'], result['file_hash'], result['descriptors'],
+                              result['boxes'], result['scores'])
+                    faces += len(result['descriptors'])
+                else:
+                    report(f'Erro ao processar {item[1]}: {item[2]}')
+                if n % MANIFEST_COMMIT_INTERVAL == 0:
+                    index.commit()
+                    report(f'{n} imagens indexadas')
+            index.remove_unseen(search_dir)
+        finally:
+            index.close()
+
+        counts = pipeline.counts
+        elapsed = time.perf_counter() - start
+        indexed = counts["embedded"] + counts["duplicates"] + counts["prefiltered"]
+        report(f'{counts["scanned"]} imagens encontradas: {indexed} indexadas ({faces} rostos, '
+               f'{counts["prefiltered"]} sem rosto pelo pré-filtro), {counts["skipped"]} já no índice, '
+               f'{counts["errors"]} erros em {elapsed:.2f}s')
+        rejected = report_rejected(metrics, gate, report)
+        return dict(counts, faces=faces, elapsed=elapsed, rejected=rejected)
+
+    def query_index(self, index_dir, persons_dir=None, output_dir=None, threshold=0.55, output_mode=COPY,
+                    report=print):
+        """
+        Procura as pessoas de referência no índice criado por index_photos. A galeria vem de
+        persons_dir ou, sem ele, do banco de referências. Com output_dir, coloca as fotos nas
+        pastas de cada pessoa (ver SearchOutput). Retorna, por pessoa, as fotos encontradas
+        com a distância e o retângulo do rosto.
+        """
+        if persons_dir is not None:
+            gallery = self.enroll(persons_dir, report)
+        else:
+            with FaceDatabase(self.database_path) as database:
+                gallery = database.load_gallery()
+
+        start = time.perf_counter()
+        with PhotoIndex(index_dir) as index:
+            matches = index.query(gallery, threshold)
+            photos = index.photos()
+            faces = index.faces()
+            people = {person: [{'file_path': photos[photo_id][0], 'distance': distance,
+                                'box': [int(faces[row][column]) for column in ('left', 'top', 'right', 'bottom')],
+                                'score': float(faces[row]['score'])}
+                               for photo_id, distance, row in person_matches]
+                      for person, person_matches in sorted(matches.items())}
+            faces_indexed = len(index)
+        elapsed = time.perf_counter() - start
+        report(f'{faces_indexed} rostos de {len(photos)} fotos comparados com {gallery.num_people} pessoas '
+               f'em {elapsed:.2f}s')
+
+        output_counts = None
+        if output_dir is not None:
+            with SearchOutput(output_dir, output_mode) as output:
+                for person, person_matches in matches.items():
+                    for photo_id, _, _ in person_matches:
+                        file_path, file_hash_value = photos[photo_id]
+                        output.place(file_path, [person], file_hash_value)
+                output_counts = output.counts
+        for person, person_matches in people.items():
+            report(f'{person}: {len(person_matches)} fotos')
+        return {'people': people, 'output': output_counts, 'elapsed': elapsed}
+
+    def separate(self, input_dir, output_dir, batch=False, min_face_size=0,
+                 batch_size=DEFAULT_BATCH_SIZE, metrics_path=None, quality=None, prefilter=None,
+                 video=None, report=print):
+        """Separa as fotos de cada rosto em pastas diferentes utilizando a IA.
+
+        Decodificação, detecção, pontos faciais e descritores rodam no pool de
+        processos; o agrupamento fica neste coordenador, na ordem dos arquivos,
+        para que as pastas não dependam do número de processos. Com batch=True,
+        todos os descritores são coletados antes e agrupados de uma só vez.
+        min_face_size > 0 roda o detector em resolução reduzida (ver face_detection) e
+        batch_size define quantos rostos passam juntos pela ResNet. As métricas por estágio
+        vão no resumo e, se pedido, para metrics_path (ver Metrics.write). quality traz as
+        opções de QualityGate, que evita pastas de pessoas formadas por rostos ruins, e
+        prefilter as de FacePrefilter, que pula a detecção em imagens sem rosto aparente.
+        Com video (opções de embed_video_function, {} para os padrões), os vídeos também são
+        separados: cada rosto acompanhado vira um recorte, agrupado pela média dos descritores,
+        com o instante em que aparece no nome do arquivo."""
+        input_files = []
+        video_files = []
+        for root, dirs, files in os.walk(input_dir):
+            for file in files:
+                if file.endswith(".jpg") or file.endswith(".jpeg") or file.endswith(".png"):
+                    input_files.append(os.path.join(root, file))
+                elif video is not None and file.lower().endswith(VIDEO_EXTENSIONS):
+                    video_files.append(os.path.join(root, file))
+        input_files.sort()
+        video_files.sort()
+
+        clusters = FaceClusters()
+        start = time.perf_counter()
+
+        # No modo em lote, os recortes ficam numa pasta temporária até o
+        # agrupamento de todos os descritores, mantendo a memória limitada.
+        staging_dir = os.path.join(output_dir, '.staging')
+        staged_faces = []
+        staged_descriptors = []
+        if batch:
+            os.makedirs(staging_dir, exist_ok=True)
+
+        tasks = [input_files[i:i + IMAGES_PER_TASK]
+                 for i in range(0, len(input_files), IMAGES_PER_TASK)]
+        gate = quality_gate(quality)
+        function = functools.partial(embed_files_function, min_face_size=min_face_size,
+                                     batch_size=batch_size, chips=True, gate=gate,
+                                     prefilter=prefilter_for(prefilter, min_face_size))
+        metrics = Metrics()
+        exporter = MetricsExporter(metrics, metrics_path)
+
+        def results():
+            for task_results, task_metrics in self.get_pool().imap(function, tasks):
+                metrics.merge(task_metrics)
+                yield from task_results
+            if video_files:
+                video_function = functools.partial(embed_video_function, min_face_size=min_face_size,
+                                                   batch_size=batch_size, chips=True, gate=gate, **video)
+                for file_path, faces, error, task_metrics in self.get_pool().imap(video_function, video_files):
+                    metrics.merge(task_metrics)
+                    if error is not None:
+                        report(f'Erro ao processar {file_path}: {error}')
+                        continue
+                    yield file_path, faces
+
+        faces_found = 0
+        for input_file_path, faces in results():
+            exporter.tick()
+            file = os.path.basename(input_file_path)
+            if not faces:
+                report('\033[1;49;31m' +
+                       f"No face detected in {file}" + '\033[m')
+                continue
+
+            for face in faces:
+                face_chip_150, face_descriptor = face.chip, face.descriptor
+                output_file_name = face_file_name(file, face)
+
+                if batch:
+                    staging_path = os.path.join(
+                        staging_dir, f'{len(staged_faces)}{os.path.splitext(output_file_name)[1]}')
+                    with metrics.time('output'):
+                        dlib.save_image(face_chip_150, staging_path)
+                    staged_faces.append(
+                        (staging_path, output_file_name))
+                    staged_descriptors.append(face_descriptor)
+                else:
+                    # Cada rosto foi embutido uma única vez e é comparado
+                    # com todas as pessoas em uma só operação vetorizada.
+                    with metrics.time('match'):
+                        folder_name = clusters.assign(face_descriptor)
+                    with metrics.time('output'):
+                        save_face(face_chip_150, output_dir,
+                                  folder_name, output_file_name)
+                faces_found += 1
+                metrics.count('copies')
+                report('\033[1;49;32m' +
+                       f'Face found in {file}!!' + '\033[m')
+
+        people = len(clusters)
+        if batch:
+            descriptors = np.asarray(
+                staged_descriptors, dtype=np.float32).reshape(-1, 128)
+            with metrics.time('cluster'):
+                labels = cluster_faces(descriptors, clusters.threshold)
+            for (staging_path, output_file_name), label in zip(staged_faces, labels):
+                person_folder_path = os.path.join(
+                    output_dir, f'Person_{label + 1}')
+                os.makedirs(person_folder_path, exist_ok=True)
+                os.replace(staging_path, os.path.join(
+                    person_folder_path, output_file_name))
+            os.rmdir(staging_dir)
+            people = len(set(labels.tolist()))
+            report(f'{len(staged_faces)} rostos agrupados em {people} pessoas')
+
+        elapsed = time.perf_counter() - start
+        report(f'{len(input_files)} imagens em {elapsed:.2f}s com {self.workers} processo(s) '
+               f'({len(input_files) / max(elapsed, 1e-9):.2f} imagens/s, lote de descritores: {batch_size})')
+        if video is not None:
+            report(f'{len(video_files)} vídeos, {metrics.snapshot()["counters"].get("frames", 0)} quadros amostrados')
+        rejected = report_rejected(metrics, gate, report)
+        prefiltered = metrics.snapshot()['counters'].get('images_prefiltered', 0)
+        if prefilter is not None:
+            report(f'{prefiltered} imagens puladas pelo pré-filtro')
+        exporter.tick(force=True)
+        return {'images': len(input_files), 'videos': len(video_files), 'faces': faces_found, 'people': people,
+                'elapsed': elapsed,
+                'rejected': rejected, 'prefiltered': prefiltered, 'metrics': metrics.snapshot()}
+
+
+class MetricsExporter:
+    """
+    Grava as métricas em path (ver Metrics.write) no máximo a cada interval segundos,
+    copiando antes os contadores mantidos fora delas (counters, ex.: SearchPipeline.counts).
+    """
+
+    def __init__(self, metrics, path=None, counters=None, interval=METRICS_INTERVAL):
+        self.metrics = metrics
+        self.path = path
+        self.counters = counters or {}
+        self.interval = interval
+        self.last = time.monotonic()
+
+    def tick(self, force=False):
+        if not force and time.monotonic() - self.last < self.interval:
+            return
+        for name in ('scanned', 'skipped', 'duplicates', 'prefiltered', 'errors'):
+            if name in self.counters:
+                self.metrics.set(name, self.counters[name])
+        if self.path:
+            self.metrics.write(self.path)
+        self.last = time.monotonic()
+
+
+def quality_gate(quality):
+    """QualityGate com as opções de um trabalho (dicionário, para passar pelo serviço) ou None."""
+    return QualityGate(**quality) if quality else None
+
+
+def prefilter_for(prefilter, min_face_size):
+    """FacePrefilter com as opções de um trabalho (dicionário) e o menor rosto procurado, ou None."""
+    return FacePrefilter(min_face_size=min_face_size, **prefilter) if prefilter is not None else None
+
+
+def detection_version(min_face_size, gate=None, prefilter=None):
+    """
+    Versão dos descritores salvos (manifesto, índice): muda com o modelo, a detecção, o
+    filtro de qualidade e o pré-filtro, que registra imagens puladas como sem rostos.
+    """
+    version = f'{MODEL_VERSION}/min_face_{min_face_size}/decode_{TARGET_FACE_SIZE}/full_chips'
+    if gate is not None:
+        version = f'{version}/quality_{gate.key()}'
+    if prefilter is not None:
+        version = f'{version}/prefilter_{prefilter.key()}'
+    return version
+
+
+def report_video_matches(video_matches, report=print):
+    """Informa os trechos de vídeo em que cada pessoa aparece."""
+    for person, clips in sorted(video_matches.items()):
+        report(f'{person} em vídeos: ' + '; '.join(
+            f'{os.path.basename(clip["file_path"])} {format_time(clip["start"])}-{format_time(clip["end"])}'
+            for clip in clips))
+
+
+def report_rejected(metrics, gate, report=print):
+    """Informa e retorna quantos rostos o filtro de qualidade descartou, por motivo."""
+    if gate is None:
+        return None
+    rejected = rejected_counts(metrics.snapshot()['counters'])
+    report(f'Rostos descartados pela qualidade: {sum(rejected.values())} '
+           f'({", ".join(f"{reason}: {count}" for reason, count in rejected.items())})')
+    return rejected
+
+
+def init_worker(shape_predictor_path=SHAPE_PREDICTOR_PATH, recognition_model_path=RECOGNITION_MODEL_PATH):
+    """Carrega detector, preditor de pontos e modelo de reconhecimento uma única vez por processo."""
+    start = time.perf_counter()
+    worker_state['detector'] = dlib.get_frontal_face_detector()
+    worker_state['sp'] = dlib.shape_predictor(shape_predictor_path)
+    worker_state['facerec'] = dlib.face_recognition_model_v1(
+        recognition_model_path)
+    worker_state['embedder'] = FaceEmbedder(
+        worker_state['facerec'], worker_state['sp'])
+    worker_state['metrics'] = Metrics()
+    worker_state['load_time'] = time.perf_counter() - start
+
+
+def worker_embedder(batch_size):
+    """Embedder do processo com o tamanho de lote pedido pela tarefa."""
+    embedder = worker_state['embedder']
+    embedder.batch_size = max(1, batch_size)
+    return embedder
+
+
+def print_timing(load_times, image_times, total_time, batch_size, report=print):
+    """Imprime separadamente o tempo de carga dos modelos e o tempo por imagem."""
+    if not image_times:
+        report('Nenhuma imagem processada.')
+        return
+    report(f'Carga dos modelos: {sum(load_times.values()):.2f}s em {len(load_times)} processo(s) '
+           f'({max(load_times.values()):.2f}s no mais lento)')
+    report(f'Tempo por imagem: média {1000 * np.mean(image_times):.1f}ms, '
+           f'máximo {1000 * np.max(image_times):.1f}ms (lote de descritores: {batch_size})')
+    report(f'{len(image_times)} imagens em {total_time:.2f}s '
+           f'({len(image_times) / total_time:.2f} imagens/s)')
+
+
+def detect_and_embed(images, min_face_size=0, batch_size=DEFAULT_BATCH_SIZE, gate=None):
+    """
+    Detecta os rostos de tuplas (imagem, escala da decodificação, conteúdo do arquivo), alinha
+    os recortes e calcula todos os descritores em lotes, medindo cada estágio nas métricas do
+    processo. A detecção usa a imagem decodificada em escala reduzida; se ela tiver rostos, os
+    pontos faciais e os recortes vêm da decodificação completa do conteúdo, para que os
+    descritores não dependam de min_face_size. Com gate (QualityGate), detecções ruins são
+    descartadas antes dos pontos faciais e dos descritores. Retorna, por imagem, (retângulos na
+    imagem reduzida, pontuações do detector, recortes, descritores).
+    """
+    metrics = worker_state['metrics']
+    detector = worker_state['detector']
+    embedder = worker_embedder(batch_size)
+
+    rects = []
+    scores = []
+    chips = []
+    for img, scale, data in images:
+        with metrics.time('detect'):
+            dets, det_scores = detect_faces_with_scores(
+                detector, img, min_face_size * scale, adjust_threshold=gate.adjust_threshold if gate else 0.0)
+        metrics.count('faces_detected', len(dets))
+        if gate is not None:
+            keep = gate.filter_detections(dets, det_scores, scale, metrics)
+            dets, det_scores = [dets[i] for i in keep], [det_scores[i] for i in keep]
+        full_img, full_dets = img, dets
+        if scale < 1.0 and len(dets):
+            with metrics.time('decode'):
+                full_img = load_image(data=data)[0]
+            full_dets = [scale_rectangle(det, 1.0 / scale) for det in dets]
+        with metrics.time('landmarks'):
+            shapes = embedder.extract_shapes(full_img, full_dets)
+            if gate is not None:
+                keep = gate.filter_shapes(shapes, metrics)
+                dets, det_scores = [dets[i] for i in keep], [det_scores[i] for i in keep]
+                shapes = [shapes[i] for i in keep]
+            image_chips = embedder.chips_from_shapes(full_img, shapes)
+            if gate is not None:
+                keep = gate.filter_chips(image_chips, metrics)
+                dets, det_scores = [dets[i] for i in keep], [det_scores[i] for i in keep]
+                image_chips = [image_chips[i] for i in keep]
+        rects.append(dets)
+        scores.append(det_scores)
+        chips.append(image_chips)
+
+    with metrics.time('embed'):
+        descriptors = embedder.embed_chips([chip for image_chips in chips for chip in image_chips])
+    metrics.count('faces_embedded', len(descriptors))
+    metrics.count('images', len(rects))
+    counts = [len(image_chips) for image_chips in chips]
+    split = np.split(descriptors, np.cumsum(counts)[:-1]) if counts else []
+    return list(zip(rects, scores, chips, split))
+
+
+def embed_images_function(images, min_face_size=0, batch_size=DEFAULT_BATCH_SIZE, gate=None):
+    """Decodifica um grupo de imagens, detecta os rostos e calcula seus descritores.
+
+    Recebe tuplas (caminho, hash do conteúdo, conteúdo do arquivo) do SearchPipeline; os rostos
+    de todas as imagens do grupo passam juntos pelo estágio de descritores em lote. Usa os
+    modelos carregados por init_worker e retorna, por imagem e na mesma ordem, os tempos, os
+    descritores, os retângulos e as pontuações do detector, ou {'file_path', 'error'} se ela
+    não puder ser decodificada.
+    O primeiro resultado leva as métricas acumuladas pelo processo na tarefa."""
+    metrics = worker_state['metrics']
+    start = time.perf_counter()
+    results = []
+    decoded = []
+    for file_path, file_hash_value, data in images:
+        try:
+            with metrics.time('decode'):
+                img, scale = load_image(file_path, data, min_face_size)
+        except Exception as e:
+            results.append({'file_path': file_path, 'file_hash': file_hash_value, 'error': str(e)})
+            continue
+        results.append(None)
+        decoded.append((len(results) - 1, file_path, file_hash_value, img, scale, data))
+    faces = detect_and_embed(((img, scale, data) for *_, img, scale, data in decoded), min_face_size,
+                             batch_size, gate)
+    elapsed = (time.perf_counter() - start) / len(images)
+
+    for (i, file_path, file_hash_value, _, scale, _), (dets, scores, _, descriptors) in zip(decoded, faces):
+        results[i] = {'pid': os.getpid(), 'load_time': worker_state['load_time'],
+                      'elapsed': elapsed, 'file_path': file_path,
+                      'file_hash': file_hash_value, 'descriptors': descriptors,
+                      'boxes': original_boxes(dets, scale),
+                      'scores': np.asarray(scores, dtype=np.float32)}
+    results[0]['metrics'] = metrics.drain()
+    return results
+
+
+def original_boxes(dets, scale):
+    """Retângulos (esquerda, topo, direita, base) nas coordenadas da imagem original."""
+    boxes = np.array([[d.left(), d.top(), d.right(), d.bottom()] for d in dets], dtype=np.float64)
+    return np.round(boxes.reshape(-1, 4) / scale).astype(np.int32)
+
+
+def embed_files_function(input_file_paths, min_face_size=0, batch_size=DEFAULT_BATCH_SIZE, chips=False,
+                         gate=None, prefilter=None):
+    """Decodifica um grupo de imagens e retorna (resultados, métricas da tarefa). Cada resultado
+    é (caminho, rostos), com cada rosto como um Face (recorte só com chips=True).
+    Os descritores de todos os rostos do grupo são calculados juntos, em lotes. Imagens
+    reprovadas pelo prefilter (FacePrefilter) saem sem rostos, sem decodificação completa."""
+    metrics = worker_state['metrics']
+    file_paths = []
+    images = []
+    scales = []
+    results = []
+    for input_file_path in input_file_paths:
+        with metrics.time('read'), open(input_file_path, 'rb') as f:
+            data = f.read()
+        if prefilter is not None:
+            with metrics.time('prefilter'):
+                has_face = prefilter.has_face(data)
+            if not has_face:
+                metrics.count('images_prefiltered')
+                results.append((input_file_path, []))
+                continue
+        with metrics.time('decode'):
+            img, scale = load_image(input_file_path, data, min_face_size)
+        file_paths.append(input_file_path)
+        images.append((img, scale, data))
+        scales.append(scale)
+    faces = detect_and_embed(images, min_face_size, batch_size, gate) if images else []
+
+    for input_file_path, scale, (dets, scores, face_chips, descriptors) in zip(file_paths, scales, faces):
+        # Posições ficam nas coordenadas da imagem original.
+        results.append((input_file_path, [
+            Face(round(d.left() / scale), round(d.top() / scale), round(d.right() / scale),
+                 round(d.bottom() / scale), float(score), face_chip_150 if chips else None, descriptor)
+            for d, score, face_chip_150, descriptor in zip(dets, scores, face_chips, descriptors)]))
+    # Mantém a ordem dos arquivos, que define as pastas no agrupamento.
+    order = {file_path: i for i, file_path in enumerate(input_file_paths)}
+    results.sort(key=lambda result: order[result[0]])
+    return results, metrics.drain()
+
+
+def embed_video_function(file_path, min_face_size=0, batch_size=DEFAULT_BATCH_SIZE, chips=False, gate=None,
+                         **video):
+    """Amostra os quadros de um vídeo, acompanha os rostos entre eles (ver video_tracking) e calcula
+    só os descritores pedidos por cada trilha, em lotes. video traz sample_interval, embed_interval
+    e max_embeddings. Retorna (caminho, rostos como VideoFace, erro ou None, métricas da tarefa)."""
+    metrics = worker_state['metrics']
+    detector = worker_state['detector']
+    embedder = worker_embedder(batch_size)
+    sample_interval = video.get('sample_interval', DEFAULT_SAMPLE_INTERVAL)
+    embed_interval = video.get('embed_interval', DEFAULT_EMBED_INTERVAL)
+    max_embeddings = video.get('max_embeddings', DEFAULT_MAX_EMBEDDINGS)
+    tracker = FaceTracker()
+    pending = []
+
+    def embed_pending():
+        with metrics.time('embed'):
+            descriptors = embedder.embed_chips([chip for *_, chip in pending])
+        metrics.count('faces_embedded', len(descriptors))
+        for (track, rect, score, chip), descriptor in zip(pending, descriptors):
+            track.add(descriptor, rect, score, chip if chips else None)
+        pending.clear()
+
+    try:
+        frames = sample_frames(file_path, sample_interval)
+        while True:
+            with metrics.time('decode'):
+                frame = next(frames, None)
+            if frame is None:
+                break
+            timestamp, img = frame
+            metrics.count('frames')
+            with metrics.time('detect'):
+                dets, scores = detect_faces_with_scores(
+                    detector, img, min_face_size, adjust_threshold=gate.adjust_threshold if gate else 0.0)
+            metrics.count('faces_detected', len(dets))
+            if gate is not None:
+                keep = gate.filter_detections(dets, scores, 1.0, metrics)
+                dets, scores = [dets[i] for i in keep], [scores[i] for i in keep]
+            tracks = tracker.update(timestamp, dets)
+            wanted = [i for i, track in enumerate(tracks)
+                      if track.wants_embedding(timestamp, embed_interval, max_embeddings)]
+            if not wanted:
+                continue
+            with metrics.time('landmarks'):
+                shapes = embedder.extract_shapes(img, [dets[i] for i in wanted])
+                if gate is not None:
+                    keep = gate.filter_shapes(shapes, metrics)
+                    wanted, shapes = [wanted[i] for i in keep], [shapes[i] for i in keep]
+                frame_chips = embedder.chips_from_shapes(img, shapes) if shapes else []
+                if gate is not None:
+                    keep = gate.filter_chips(frame_chips, metrics)
+                    wanted, frame_chips = [wanted[i] for i in keep], [frame_chips[i] for i in keep]
+            for i, chip in zip(wanted, frame_chips):
+                tracks[i].mark_embedded(timestamp)
+                pending.append((tracks[i], dets[i], scores[i], chip))
+            if len(pending) >= batch_size:
+                embed_pending()
+        embed_pending()
+    except Exception as e:
+        return file_path, None, str(e), metrics.drain()
+
+    faces = []
+    for track in tracker.tracks():
+        if not track.descriptors:
+            continue
+        rect, score, chip = track.best
+        descriptors = np.asarray(track.descriptors, dtype=np.float32)
+        faces.append(VideoFace(rect.left(), rect.top(), rect.right(), rect.bottom(), float(score), chip,
+                               descriptors.mean(axis=0), track.start, track.end, descriptors))
+    metrics.count('videos')
+    metrics.count('tracks', len(faces))
+    return file_path, faces, None, metrics.drain()
+
+
+def match_video_faces(gallery, faces, threshold, sample_interval=DEFAULT_SAMPLE_INTERVAL):
+    """
+    Compara as trilhas de um vídeo com a galeria. Cada trilha vai para a pessoa mais próxima
+    entre todos os seus descritores; trilhas da mesma pessoa próximas no tempo viram um só
+    trecho. Retorna {pessoa: [(início, fim, menor distância)]}.
+    """
+    ranges = {}
+    for face in faces:
+        best = None
+        for face_matches in gallery.match(face.descriptors, threshold, 1):
+            for person, distance in face_matches:
+                if best is None or distance < best[1]:
+                    best = (person, distance)
+        if best is not None:
+            ranges.setdefault(best[0], []).append((face.start, face.end, float(best[1])))
+    gap = (MAX_MISSES + 1) * sample_interval
+    return {person: merge_ranges(person_ranges, gap) for person, person_ranges in ranges.items()}
+
+
+def match_persons(gallery, descriptors, threshold, top_k=1):
+    """Retorna as pessoas da galeria encontradas entre os rostos de uma imagem."""
+    matches = gallery.match(descriptors, threshold, top_k)
+    return sorted({person for face_matches in matches for person, _ in face_matches})
+
+
+def face_file_name(file, face):
+    """Nome do recorte de um rosto: a posição na imagem e, em vídeos, o instante em que aparece."""
+    stem, extension = os.path.splitext(file)
+    if isinstance(face, VideoFace):
+        return f'{stem}_{face.start:.1f}s_face_{face.left}_{face.top}.jpg'
+    return f'{stem}_face_{face.left}_{face.top}{extension}'
+
+
+def save_face(face_chip, output_dir, folder_name, output_file_name):
+    """Salva o recorte do rosto na pasta da pessoa."""
+    person_folder_path = os.path.join(output_dir, folder_name)
+    os.makedirs(person_folder_path, exist_ok=True)
+    dlib.save_image(face_chip, os.path.join(
+        person_folder_path, output_file_name))
@@ -0,0 +1,203 @@
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+from multiprocessing.pool import ThreadPool
+from unittest import mock
+import numpy as np
+import face_engine
+from face_engine import FaceEngine
+from search_output import INDEX_NAME
+from search_shards import merge_shards, shard_dir
+
+
+class FakeGallery:
+    """Galeria falsa em que todo rosto é de person."""
+
+    num_people = 1
+
+    def __init__(self, person='Ana'):
+        self.person = person
+
+    def fingerprint(self):
+        return self.person
+
+    def match(self, descriptors, threshold, top_k=1):
+        return [[(self.person, 0.3)] for _ in descriptors]
+
+
+def embed_images(images, **options):
+    # Processamento falso: um rosto por imagem
+    return [{'pid': 0, 'load_time': 0.0, 'file_path': file_path, 'file_hash': file_hash_value, 'elapsed': 0.0,
+             'descriptors': np.zeros((1, 128), dtype=np.float32), 'boxes': np.zeros((1, 4), dtype=np.int32),
+             'scores': np.ones(1, dtype=np.float32)}
+            for file_path, file_hash_value, _ in images]
+
+
+class TestFaceEngineSearch(unittest.TestCase):
+    """
+    Testes da busca do motor, sem carregar os modelos (galeria e vídeos falsos).
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.persons_dir = os.path.join(self.temp_dir, 'persons')
+        self.search_dir = os.path.join(self.temp_dir, 'search')
+        self.output_dir = os.path.join(self.temp_dir, 'output')
+        os.makedirs(self.persons_dir)
+        os.makedirs(self.search_dir)
+        self.video_path = os.path.join(self.search_dir, 'event.mp4')
+        with open(self.video_path, 'wb') as f:
+            f.write(b'video')
+
+        self.engine = FaceEngine.__new__(FaceEngine)
+        self.engine.workers = 1
+        self.engine.enroll = lambda persons_dir, report=print: FakeGallery()
+
+        def match_videos(gallery, file_paths, *args, **kwargs):
+            for file_path in file_paths:
+                yield file_path, {'Ana': [(3600.0, 3700.0, 0.3)]}, None
+
+        self.engine.match_videos = match_videos
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_video_search_reports_clips_and_wall_time(self):
+        # O tempo da busca não pode ser confundido com os instantes dos trechos de vídeo
+        result = self.engine.search(self.persons_dir, self.search_dir, self.output_dir, video={},
+                                    report=lambda message: None)
+        self.assertEqual(result['videos']['Ana'], [{'file_path': self.video_path, 'start': 3600.0,
+                                                     'end': 3700.0, 'distance': 0.3}])
+        self.assertGreaterEqual(result['elapsed'], 0.0)
+        self.assertLess(result['elapsed'], 60.0)
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, 'Ana', 'event.mp4')))
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, 'videos.csv')))
+
+
+class TestFaceEngineRematch(unittest.TestCase):
+    """
+    Testes da busca incremental recomparada com outra galeria, sem carregar os modelos.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.persons_dir = os.path.join(self.temp_dir, 'persons')
+        self.search_dir = os.path.join(self.temp_dir, 'search')
+        self.output_dir = os.path.join(self.temp_dir, 'output')
+        os.makedirs(self.persons_dir)
+        os.makedirs(self.search_dir)
+        with open(os.path.join(self.search_dir, 'photo.jpg'), 'wb') as f:
+            f.write(b'photo')
+
+        self.pool = ThreadPool(1)
+        self.gallery = FakeGallery('Ana')
+        self.engine = FaceEngine.__new__(FaceEngine)
+        self.engine.workers = 1
+        self.engine.enroll = lambda persons_dir, report=print: self.gallery
+        self.engine.get_pool = lambda: self.pool
+        patcher = mock.patch.object(face_engine, 'embed_images_function', embed_images)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.pool.terminate()
+        shutil.rmtree(self.temp_dir)
+
+    def search(self):
+        return self.engine.search(self.persons_dir, self.search_dir, self.output_dir, report=lambda message: None)
+
+    def test_people_no_longer_found_are_removed(self):
+        self.search()
+        self.assertEqual(os.listdir(os.path.join(self.output_dir, 'Ana')), ['photo.jpg'])
+        self.gallery = FakeGallery('Bia')
+        result = self.search()
+        self.assertEqual(result['rematched'], 1)
+        self.assertEqual(result['output']['removed'], 1)
+        self.assertEqual(os.listdir(os.path.join(self.output_dir, 'Ana')), [])
+        self.assertEqual(os.listdir(os.path.join(self.output_dir, 'Bia')), ['photo.jpg'])
+
+    def test_changed_photo_replaces_old_placements(self):
+        # Uma foto editada sai da pasta de quem não aparece mais nela e não deixa a cópia antiga
+        # na pasta de quem continua aparecendo
+        self.search()
+        self.gallery = FakeGallery('Bia')
+        for content in (b'edited photo', b'edited again'):
+            with open(os.path.join(self.search_dir, 'photo.jpg'), 'wb') as f:
+                f.write(content)
+            result = self.search()
+            self.assertEqual(result['rematched'], 0)
+            self.assertEqual(os.listdir(os.path.join(self.output_dir, 'Ana')), [])
+            self.assertEqual(os.listdir(os.path.join(self.output_dir, 'Bia')), ['photo.jpg'])
+            with open(os.path.join(self.output_dir, 'Bia', 'photo.jpg'), 'rb') as f:
+                self.assertEqual(f.read(), content)
+
+
+class TestFaceEngineShards(unittest.TestCase):
+    """
+    Testes da busca dividida em partes, sem carregar os modelos.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.persons_dir = os.path.join(self.temp_dir, 'persons')
+        self.search_dir = os.path.join(self.temp_dir, 'search')
+        self.shards_dir = os.path.join(self.temp_dir, 'shards')
+        os.makedirs(self.persons_dir)
+        os.makedirs(self.search_dir)
+        for i in range(3):
+            with open(os.path.join(self.search_dir, f'{i}.jpg'), 'wb') as f:
+                f.write(f'photo {i}'.encode())
+
+        self.pool = ThreadPool(1)
+        self.gallery = FakeGallery('Ana')
+        self.engine = FaceEngine.__new__(FaceEngine)
+        self.engine.workers = 1
+        self.engine.enroll = lambda persons_dir, report=print: self.gallery
+        self.engine.get_pool = lambda: self.pool
+        patcher = mock.patch.object(face_engine, 'embed_images_function', embed_images)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.pool.terminate()
+        shutil.rmtree(self.temp_dir)
+
+    def run_shard(self):
+        self.engine.search_shard(self.persons_dir, self.search_dir, self.shards_dir, 0, 1,
+                                 report=lambda message: None)
+        with open(os.path.join(shard_dir(self.shards_dir, 0, 1), INDEX_NAME), newline='') as f:
+            return sorted((row['person'], os.path.basename(row['file_path'])) for row in csv.DictReader(f))
+
+    def test_rerun_after_gallery_change_replaces_matches(self):
+        # Recomparada com outra galeria, a parte não guarda nem junta as correspondências antigas
+        self.assertEqual(self.run_shard(), [('Ana', '0.jpg'), ('Ana', '1.jpg'), ('Ana', '2.jpg')])
+        self.gallery = FakeGallery('Bia')
+        os.remove(os.path.join(self.search_dir, '2.jpg'))
+        self.assertEqual(self.run_shard(), [('Bia', '0.jpg'), ('Bia', '1.jpg')])
+
+        output_dir = os.path.join(self.temp_dir, 'output')
+        merge_shards(self.shards_dir, output_dir, 1, report=lambda message: None)
+        self.assertEqual(sorted(os.listdir(os.path.join(output_dir, 'Bia'))), ['0.jpg', '1.jpg'])
+        self.assertFalse(os.path.exists(os.path.join(output_dir, 'Ana')))
+
+    def test_merge_again_after_gallery_change(self):
+        # Juntar de novo no mesmo diretório depois da recomparação troca as correspondências
+        # antigas pelas novas, em vez de recusar a junção
+        output_dir = os.path.join(self.temp_dir, 'output')
+        self.run_shard()
+        merge_shards(self.shards_dir, output_dir, 1, report=lambda message: None)
+        self.assertEqual(sorted(os.listdir(os.path.join(output_dir, 'Ana'))), ['0.jpg', '1.jpg', '2.jpg'])
+
+        self.gallery = FakeGallery('Bia')
+        self.run_shard()
+        result = merge_shards(self.shards_dir, output_dir, 1, report=lambda message: None)
+        self.assertEqual(result['merged'], 1)
+        self.assertEqual(result['output']['removed'], 3)
+        self.assertEqual(os.listdir(os.path.join(output_dir, 'Ana')), [])
+        self.assertEqual(sorted(os.listdir(os.path.join(output_dir, 'Bia'))), ['0.jpg', '1.jpg', '2.jpg'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+import hashlib
+import numpy as np
+from gallery_index import build_index, load_index
+
+# Mínimo de referências candidatas por rosto na busca com índice (ver FaceGallery.index_candidates).
+MIN_INDEX_CANDIDATES = 32
+
+
+class FaceGallery:
+    """
+    Galeria de referência para busca de rostos.
+    Empilha todos os descritores de referência em uma matriz float32 contígua,
+    com um índice de pessoa por linha, permitindo várias referências por pessoa.
+    """
+
+    def __init__(self, dimensions=128):
+        self.dimensions = dimensions
+        self.names = []
+        self.descriptors = np.zeros((0, dimensions), dtype=np.float32)
+        self.person_ids = np.zeros(0, dtype=np.int32)
+        self._name_to_id = {}
+        self._compiled = None
+        self.index = None
+
+    def __len__(self):
+        """Número de descritores de referência."""
+        return len(self.person_ids)
+
+    @property
+    def num_people(self):
+        return len(self.names)
+
+    def add(self, name, descriptors):
+        """Adiciona um ou mais descritores de referência à pessoa indicada."""
+        descriptors = np.asarray(descriptors, dtype=np.float32).reshape(
+            -1, self.dimensions)
+        if name not in self._name_to_id:
+            self._name_to_id[name] = len(self.names)
+            self.names.append(name)
+        person_id = self._name_to_id[name]
+
+        self.descriptors = np.ascontiguousarray(
+            np.concatenate([self.descriptors, descriptors]))
+        self.person_ids = np.concatenate(
+            [self.person_ids, np.full(len(descriptors), person_id, dtype=np.int32)])
+        self._compiled = None
+        self.index = None
+
+    def fingerprint(self):
+        """Hash que identifica o conteúdo da galeria (nomes e descritores)."""
+        digest = hashlib.sha1()
+        digest.update('\0'.join(self.names).encode('utf-8'))
+        digest.update(self.person_ids.tobytes())
+        digest.update(self.descriptors.tobytes())
+        return digest.hexdigest()
+
+    def _compile(self):
+        """Ordena as referências por pessoa para reduzir distâncias com np.minimum.reduceat."""
+        if self._compiled is None:
+            order = np.argsort(self.person_ids, kind='stable')
+            sorted_ids = self.person_ids[order]
+            starts = np.flatnonzero(
+                np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+            matrix = np.ascontiguousarray(self.descriptors[order])
+            self._compiled = (matrix, np.einsum('ij,ij->i', matrix, matrix),
+                              starts, sorted_ids[starts])
+        return self._compiled
+
+    def distances(self, descriptors):
+        """Retorna a matriz (rostos, pessoas) com a menor distância de cada rosto a cada pessoa."""
+        descriptors = np.asarray(descriptors, dtype=np.float32).reshape(
+            -1, self.dimensions)
+        if not len(self) or not len(descriptors):
+            return np.zeros((len(descriptors), self.num_people), dtype=np.float32)
+
+        matrix, norms, starts, people = self._compile()
+        squared = (np.einsum('ij,ij->i', descriptors, descriptors)[:, None]
+                   + norms[None, :] - 2.0 * descriptors @ matrix.T)
+        reference_distances = np.sqrt(np.maximum(squared, 0.0))
+
+        person_distances = np.full(
+            (len(descriptors), self.num_people), np.inf, dtype=np.float32)
+        person_distances[:, people] = np.minimum.reduceat(
+            reference_distances, starts, axis=1)
+        return person_distances
+
+    def build_index(self, kind='ivf', **options):
+        """Cria um índice (ver gallery_index) usado por match no lugar da comparação exata."""
+        self.index = build_index(self.descriptors, kind, **options)
+        return self.index
+
+    def save_index(self, path):
+        """Salva o índice junto com a impressão digital da galeria que o gerou."""
+        self.index.save(path)
+        with open(path + '.fingerprint', 'w') as f:
+            f.write(self.fingerprint())
+
+    def load_index(self, path):
+        """Carrega um índice salvo, se ele foi gerado a partir desta mesma galeria."""
+        try:
+            with open(path + '.fingerprint') as f:
+                if f.read() != self.fingerprint():
+                    return None
+            self.index = load_index(path)
+        except OSError:
+            return None
+        return self.index
+
+    def index_candidates(self, top_k=1):
+        """
+        Referências candidatas por rosto na busca com índice: o bastante para chegar a top_k
+        pessoas distintas mesmo que todas as referências da pessoa mais fotografada venham
+        antes, e crescendo com a raiz do tamanho da galeria (como o número de listas do IVF).
+        """
+        references_per_person = int(np.bincount(self.person_ids).max()) if len(self) else 1
+        return max(MIN_INDEX_CANDIDATES, top_k * references_per_person, int(np.sqrt(len(self))))
+
+    def match(self, descriptors, threshold, top_k=1, candidates=None):
+        """
+        Compara todos os rostos de uma imagem com a galeria em uma única operação.
+        Retorna, para cada rosto, até top_k pares (pessoa, distância) abaixo do limiar,
+        do mais próximo para o mais distante. Com um índice, só as `candidates`
+        referências mais próximas de cada rosto são consideradas (por padrão,
+        index_candidates(top_k)).
+        """
+        if self.index is not None:
+            if candidates is None:
+                candidates = self.index_candidates(top_k)
+            return self._match_index(descriptors, threshold, top_k, candidates)
+
+        person_distances = self.distances(descriptors)
+        if not person_distances.size:
+            return [[] for _ in range(len(person_distances))]
+
+        top_k = min(top_k, self.num_people)
+        candidates = np.argpartition(
+            person_distances, top_k - 1, axis=1)[:, :top_k]
+        candidate_distances = np.take_along_axis(
+            person_distances, candidates, axis=1)
+        order = np.argsort(candidate_distances, axis=1)
+
+        matches = []
+        for face_candidates, face_distances, face_order in zip(candidates, candidate_distances, order):
+            matches.append([(self.names[face_candidates[i]], float(face_distances[i]))
+                            for i in face_order if face_distances[i] < threshold])
+        return matches
+
+    def _match_index(self, descriptors, threshold, top_k, candidates):
+        """Reduz as referências candidatas do índice à menor distância por pessoa."""
+        descriptors = np.asarray(descriptors, dtype=np.float32).reshape(
+            -1, self.dimensions)
+        if not len(descriptors):
+            return []
+
+        distances, indices = self.index.search(
+            descriptors, max(candidates, top_k))
+        matches = []
+        for face_distances, face_indices in zip(distances, indices):
+            # As distâncias já vêm ordenadas: a primeira ocorrência de cada pessoa é a menor.
+            face_matches = []
+            seen = set()
+            for distance, index in zip(face_distances, face_indices):
+                if index < 0 or distance >= threshold or len(face_matches) == top_k:
+                    break
+                person_id = self.person_ids[index]
+                if person_id not in seen:
+                    seen.add(person_id)
+                    face_matches.append((self.names[person_id], float(distance)))
+            matches.append(face_matches)
+        return matches
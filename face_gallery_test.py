@@ -0,0 +1,42 @@
+import unittest
+import numpy as np
+from face_gallery import FaceGallery
+
+
+class TestFaceGallery(unittest.TestCase):
+    """
+    Testes para a galeria de referência com várias referências por pessoa.
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.references = rng.normal(size=(6, 128)).astype(np.float32)
+        self.gallery = FaceGallery()
+        for name, reference in zip(['a', 'b', 'a', 'c', 'b', 'a'], self.references):
+            self.gallery.add(name, reference)
+
+    def test_multiple_references_per_person(self):
+        # Nenhuma referência é sobrescrita ao repetir o nome da pessoa
+        self.assertEqual(len(self.gallery), 6)
+        self.assertEqual(self.gallery.num_people, 3)
+
+    def test_match_nearest_person(self):
+        # Cada rosto é atribuído à pessoa mais próxima, não à primeira abaixo do limiar
+        faces = self.references[[2, 4]] + 0.001
+        matches = self.gallery.match(faces, threshold=0.5)
+        self.assertEqual([face[0][0] for face in matches], ['a', 'b'])
+
+    def test_match_top_k_sorted(self):
+        # Com top_k, os candidatos vêm ordenados pela distância
+        matches = self.gallery.match(self.references[:1], threshold=100, top_k=3)
+        distances = [distance for _, distance in matches[0]]
+        self.assertEqual(len(matches[0]), 3)
+        self.assertEqual(distances, sorted(distances))
+
+    def test_match_without_faces(self):
+        # Imagens sem rostos não geram correspondências
+        self.assertEqual(self.gallery.match([], threshold=0.5), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import threading
+import cv2
+from image_loader import image_size, is_jpeg, load_image
+
+DEFAULT_CASCADE = 'haarcascade_frontalface_default.xml'
+
+# Tamanho, em pixels da miniatura, do menor rosto procurado. Maior é mais lento e perde menos rostos.
+THUMBNAIL_FACE_SIZE = 24
+
+# Sem min_face_size, o menor rosto procurado pelo pré-filtro: com THUMBNAIL_FACE_SIZE, permite
+# decodificar a miniatura direto em 1/4. O menor rosto que o HOG acha (40 px) exigiria a
+# decodificação completa, que custa quase o mesmo que processar a imagem.
+PREFILTER_MIN_FACE_SIZE = 4 * THUMBNAIL_FACE_SIZE
+
+# Um classificador por thread e arquivo: detectMultiScale não deve ser chamado por várias threads ao mesmo tempo.
+_classifiers = threading.local()
+
+
+def cascade_path(cascade=DEFAULT_CASCADE):
+    """Caminho do arquivo do classificador; nomes sem diretório vêm dos que acompanham o OpenCV."""
+    if os.path.dirname(cascade) or not hasattr(cv2, 'data'):
+        return cascade
+    return os.path.join(cv2.data.haarcascades, cascade)
+
+
+def load_classifier(path):
+    cache = getattr(_classifiers, 'cache', None)
+    if cache is None:
+        cache = _classifiers.cache = {}
+    if path not in cache:
+        if not hasattr(cv2, 'CascadeClassifier'):
+            raise RuntimeError('Esta versão do OpenCV não tem CascadeClassifier; '
+                               'use a do requirements.txt ou desligue o pré-filtro.')
+        classifier = cv2.CascadeClassifier(path)
+        if classifier.empty():
+            raise FileNotFoundError(f'Classificador não encontrado ou inválido: {path}')
+        cache[path] = classifier
+    return cache[path]
+
+
+class FacePrefilter:
+    """
+    Teste barato de "esta imagem tem algum rosto?" antes da decodificação completa e do
+    detector HOG: roda um classificador em cascata do OpenCV (Haar ou LBP) em uma
+    miniatura em tons de cinza, decodificada direto em 1/2, 1/4 ou 1/8, em que o menor
+    rosto procurado (min_face_size, por padrão PREFILTER_MIN_FACE_SIZE) tem face_size
+    pixels. Imagens que não podem ser decodificadas reduzidas (PNG, ou rostos pequenos
+    demais para a redução) passam sem teste: decodificá-las inteiras aqui, na leitura,
+    custaria quase o mesmo que processá-las.
+
+    Troca velocidade por recall: face_size maior, scale_factor menor (mais próximo de 1)
+    e min_neighbors menor perdem menos rostos e pulam menos imagens. Imagens reprovadas
+    não passam pelo detector; ver benchmarks/prefilter.py para medir os rostos perdidos.
+    """
+
+    def __init__(self, min_face_size=0, cascade=DEFAULT_CASCADE, face_size=THUMBNAIL_FACE_SIZE,
+                 scale_factor=1.1, min_neighbors=1):
+        self.min_face_size = min_face_size
+        self.cascade = cascade_path(cascade)
+        self.face_size = face_size
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        # Falha já na criação se o classificador não puder ser carregado.
+        load_classifier(self.cascade)
+
+    def options(self):
+        return {'cascade': os.path.basename(self.cascade), 'face_size': self.face_size,
+                'scale_factor': self.scale_factor, 'min_neighbors': self.min_neighbors}
+
+    def key(self):
+        """Identifica as opções, para invalidar resultados salvos com outras."""
+        return '/'.join(f'{name}_{value}' for name, value in self.options().items())
+
+    def scale(self):
+        """Tamanho da miniatura sobre o da imagem original."""
+        return self.face_size / (self.min_face_size or PREFILTER_MIN_FACE_SIZE)
+
+    def decode_factor(self, data):
+        """Redução (2, 4 ou 8) da decodificação da miniatura, ou 1 se a imagem não pode ser reduzida."""
+        if not is_jpeg(data) or image_size(data) is None:
+            return 1
+        return max([f for f in (2, 4, 8) if 1 / f >= self.scale()] or [1])
+
+    def thumbnail(self, data, factor=None):
+        """Miniatura em tons de cinza, com histograma equalizado, usada pelo classificador."""
+        scale = self.scale()
+        if factor is None:
+            factor = self.decode_factor(data)
+        img, decoded_scale = load_image(data=data, grayscale=True, factor=factor)
+        if scale < decoded_scale:
+            ratio = scale / decoded_scale
+            img = cv2.resize(img, None, fx=ratio, fy=ratio, interpolation=cv2.INTER_AREA)
+        return cv2.equalizeHist(img)
+
+    def has_face(self, data):
+        """Indica se a imagem (bytes do arquivo) pode ter um rosto; False pula o detector."""
+        factor = self.decode_factor(data)
+        if factor == 1:
+            return True
+        faces = load_classifier(self.cascade).detectMultiScale(
+            self.thumbnail(data, factor), scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors)
+        return len(faces) > 0
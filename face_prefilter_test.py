@@ -0,0 +1,56 @@
+import os
+import unittest
+from unittest import mock
+import cv2
+import numpy as np
+from face_prefilter import FacePrefilter
+
+SAMPLE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'fotos_entrada')
+
+
+def encode(img):
+    return cv2.imencode('.jpg', img)[1].tobytes()
+
+
+@unittest.skipUnless(hasattr(cv2, 'CascadeClassifier'), 'OpenCV sem classificadores em cascata')
+class TestFacePrefilter(unittest.TestCase):
+    """
+    Testes para o pré-filtro de imagens sem rosto.
+    """
+
+    def test_thumbnail_keeps_smallest_face_at_face_size(self):
+        # Um rosto de min_face_size pixels fica com face_size pixels na miniatura
+        data = encode(np.full((1200, 1600, 3), 128, dtype=np.uint8))
+        thumbnail = FacePrefilter(min_face_size=100, face_size=24).thumbnail(data)
+        self.assertEqual(thumbnail.shape, (288, 384))
+        self.assertEqual(thumbnail.dtype, np.uint8)
+
+    def test_default_options_decode_reduced(self):
+        # Com as opções padrão a miniatura sai de uma decodificação reduzida; o que não pode
+        # ser reduzido (PNG) passa sem teste, sem decodificação completa na leitura
+        data = encode(np.full((1200, 1600, 3), 128, dtype=np.uint8))
+        self.assertEqual(FacePrefilter().decode_factor(data), 4)
+        self.assertEqual(FacePrefilter().thumbnail(data).shape, (300, 400))
+        self.assertEqual(FacePrefilter(min_face_size=40).decode_factor(data), 1)
+        png = cv2.imencode('.png', np.full((1200, 1600, 3), 128, dtype=np.uint8))[1].tobytes()
+        with mock.patch('face_prefilter.load_image') as load_image:
+            self.assertTrue(FacePrefilter().has_face(png))
+            self.assertTrue(FacePrefilter(min_face_size=40).has_face(data))
+        load_image.assert_not_called()
+
+    def test_blank_image_has_no_face(self):
+        rng = np.random.default_rng(0)
+        img = cv2.resize(rng.integers(0, 256, (6, 8, 3), dtype=np.uint8), (800, 600))
+        self.assertFalse(FacePrefilter(min_face_size=60).has_face(encode(img)))
+
+    def test_sample_photo_has_face(self):
+        file = sorted(os.listdir(SAMPLE_DIR))[0]
+        with open(os.path.join(SAMPLE_DIR, file), 'rb') as f:
+            self.assertTrue(FacePrefilter(min_face_size=100).has_face(f.read()))
+
+    def test_key_changes_with_options(self):
+        self.assertNotEqual(FacePrefilter(min_neighbors=1).key(), FacePrefilter(min_neighbors=3).key())
+
+
+if __name__ == '__main__':
+    unittest.main()
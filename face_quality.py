@@ -0,0 +1,107 @@
+import cv2
+import numpy as np
+
+# Pontos do modelo de 68 pontos usados na estimativa de pose: cantos externos dos olhos e ponta do nariz.
+LEFT_EYE_CORNER = 36
+RIGHT_EYE_CORNER = 45
+NOSE_TIP = 30
+
+# Motivos de descarte, na ordem em que o filtro é aplicado.
+REJECT_REASONS = ('score', 'size', 'crowd', 'pose', 'blur')
+
+
+def face_yaw(shape):
+    """
+    Estimativa de quanto o rosto está virado de lado, de 0 (frontal) a 1 (perfil), pela
+    posição da ponta do nariz entre os cantos dos olhos. None para modelos sem esses pontos.
+    """
+    if shape.num_parts != 68:
+        return None
+    left = shape.part(LEFT_EYE_CORNER).x
+    right = shape.part(RIGHT_EYE_CORNER).x
+    if right <= left:
+        return 1.0
+    position = (shape.part(NOSE_TIP).x - left) / (right - left)
+    return min(1.0, abs(position - 0.5) * 2)
+
+
+def chip_sharpness(chip):
+    """Nitidez do recorte alinhado: variância do laplaciano em tons de cinza (baixa = borrado)."""
+    gray = cv2.cvtColor(np.asarray(chip), cv2.COLOR_RGB2GRAY)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+class QualityGate:
+    """
+    Descarta detecções ruins antes dos estágios caros (pontos faciais e descritores):
+    pontuação do detector abaixo de min_score, retângulo menor que min_size pixels na
+    imagem original, além dos max_faces rostos de maior pontuação de cada imagem, rosto
+    virado além de max_yaw (ver face_yaw) e recorte com nitidez abaixo de min_sharpness.
+    Zero desliga cada critério. Os descartes são contados em metrics como
+    faces_rejected_<motivo> (ver REJECT_REASONS).
+    """
+
+    def __init__(self, min_score=0.0, min_size=0, max_faces=0, max_yaw=0.0, min_sharpness=0.0):
+        self.min_score = min_score
+        self.min_size = min_size
+        self.max_faces = max_faces
+        self.max_yaw = max_yaw
+        self.min_sharpness = min_sharpness
+
+    def options(self):
+        return {'min_score': self.min_score, 'min_size': self.min_size, 'max_faces': self.max_faces,
+                'max_yaw': self.max_yaw, 'min_sharpness': self.min_sharpness}
+
+    def key(self):
+        """Identifica os critérios, para invalidar descritores salvos com outros."""
+        return '/'.join(f'{name}_{value}' for name, value in self.options().items())
+
+    @property
+    def adjust_threshold(self):
+        """Limiar para detector.run: abaixo de zero o detector devolve também as detecções fracas."""
+        return min(self.min_score, 0.0)
+
+    def filter_detections(self, rects, scores, scale, metrics):
+        """Índices das detecções aprovadas por pontuação, tamanho e número de rostos."""
+        keep = []
+        for i, (rect, score) in enumerate(zip(rects, scores)):
+            if score < self.min_score:
+                metrics.count('faces_rejected_score')
+            elif min(rect.width(), rect.height()) / scale < self.min_size:
+                metrics.count('faces_rejected_size')
+            else:
+                keep.append(i)
+        if self.max_faces and len(keep) > self.max_faces:
+            metrics.count('faces_rejected_crowd', len(keep) - self.max_faces)
+            keep = sorted(sorted(keep, key=lambda i: -scores[i])[:self.max_faces])
+        return keep
+
+    def filter_shapes(self, shapes, metrics):
+        """Índices dos rostos com pose aceitável."""
+        if not self.max_yaw:
+            return list(range(len(shapes)))
+        keep = []
+        for i, shape in enumerate(shapes):
+            yaw = face_yaw(shape)
+            if yaw is not None and yaw > self.max_yaw:
+                metrics.count('faces_rejected_pose')
+            else:
+                keep.append(i)
+        return keep
+
+    def filter_chips(self, chips, metrics):
+        """Índices dos recortes nítidos o bastante."""
+        if not self.min_sharpness:
+            return list(range(len(chips)))
+        keep = []
+        for i, chip in enumerate(chips):
+            if chip_sharpness(chip) < self.min_sharpness:
+                metrics.count('faces_rejected_blur')
+            else:
+                keep.append(i)
+        return keep
+
+
+def rejected_counts(counters):
+    """Descartes por motivo a partir dos contadores das métricas."""
+    return {reason: counters.get(f'faces_rejected_{reason}', 0) for reason in REJECT_REASONS}
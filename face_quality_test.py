@@ -0,0 +1,65 @@
+import unittest
+import dlib
+import numpy as np
+from face_quality import QualityGate, chip_sharpness, face_yaw, rejected_counts
+from metrics import Metrics
+
+
+def shape(nose_x):
+    """Pontos faciais de 68 pontos com os olhos em x=40 e x=60 e o nariz em nose_x."""
+    points = [dlib.point(50, 50)] * 68
+    points[36] = dlib.point(40, 40)
+    points[45] = dlib.point(60, 40)
+    points[30] = dlib.point(nose_x, 55)
+    return dlib.full_object_detection(dlib.rectangle(0, 0, 100, 100), points)
+
+
+class TestQualityGate(unittest.TestCase):
+    """
+    Testes para o filtro de qualidade dos rostos detectados.
+    """
+
+    def setUp(self):
+        self.metrics = Metrics()
+        self.rects = [dlib.rectangle(0, 0, 99, 99), dlib.rectangle(0, 0, 19, 19),
+                      dlib.rectangle(0, 0, 79, 79), dlib.rectangle(0, 0, 59, 59)]
+        self.scores = [0.9, 1.2, -0.2, 0.5]
+
+    def test_disabled_gate_keeps_everything(self):
+        # Com o limiar padrão o detector não devolve pontuações negativas
+        gate = QualityGate()
+        scores = [max(score, 0.0) for score in self.scores]
+        self.assertEqual(gate.filter_detections(self.rects, scores, 1.0, self.metrics), [0, 1, 2, 3])
+        self.assertEqual(gate.adjust_threshold, 0.0)
+
+    def test_score_size_and_crowd(self):
+        # A pontuação, o tamanho na imagem original e o limite por imagem descartam, em ordem
+        gate = QualityGate(min_score=0.0, min_size=50, max_faces=1)
+        self.assertEqual(gate.filter_detections(self.rects, self.scores, 0.5, self.metrics), [0])
+        self.assertEqual(rejected_counts(self.metrics.snapshot()['counters']),
+                         {'score': 1, 'size': 1, 'crowd': 1, 'pose': 0, 'blur': 0})
+
+    def test_negative_min_score_lowers_detector_threshold(self):
+        self.assertEqual(QualityGate(min_score=-0.5).adjust_threshold, -0.5)
+        self.assertEqual(QualityGate(min_score=0.5).adjust_threshold, 0.0)
+
+    def test_pose(self):
+        self.assertAlmostEqual(face_yaw(shape(50)), 0.0)
+        self.assertAlmostEqual(face_yaw(shape(58)), 0.8)
+        gate = QualityGate(max_yaw=0.5)
+        self.assertEqual(gate.filter_shapes([shape(58), shape(51)], self.metrics), [1])
+        self.assertEqual(self.metrics.snapshot()['counters'], {'faces_rejected_pose': 1})
+
+    def test_blur(self):
+        # Um recorte liso é borrado; um xadrez é nítido
+        flat = np.full((150, 150, 3), 128, dtype=np.uint8)
+        checker = np.zeros((150, 150, 3), dtype=np.uint8)
+        checker[::2, ::2] = 255
+        self.assertEqual(chip_sharpness(flat), 0.0)
+        gate = QualityGate(min_sharpness=10)
+        self.assertEqual(gate.filter_chips([flat, checker], self.metrics), [1])
+        self.assertEqual(self.metrics.snapshot()['counters'], {'faces_rejected_blur': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
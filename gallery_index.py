@@ -0,0 +1,188 @@
+import numpy as np
+
+# Abaixo deste número de referências, ou visitando metade das listas ou mais, a comparação
+# exata (uma multiplicação de matrizes para todas as consultas) é mais rápida que o IVF.
+# Medido com 3 consultas e 32 vizinhos: 0,34ms contra 0,35ms com 2000 referências e
+# 0,72ms contra 0,34ms com 5000.
+IVF_MIN_REFERENCES = 2000
+IVF_MAX_PROBE_FRACTION = 0.5
+
+
+def squared_distances(queries, references, reference_norms=None):
+    """Distâncias euclidianas ao quadrado entre duas matrizes de descritores."""
+    if reference_norms is None:
+        reference_norms = np.einsum('ij,ij->i', references, references)
+    squared = (np.einsum('ij,ij->i', queries, queries)[:, None]
+               + reference_norms[None, :] - 2.0 * queries @ references.T)
+    return np.maximum(squared, 0.0)
+
+
+def top_k(distances, indices, k):
+    """Seleciona os k menores valores de cada linha, ordenados."""
+    k = min(k, distances.shape[1])
+    if k == 0:
+        return distances[:, :0], indices[:, :0]
+    keep = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    distances = np.take_along_axis(distances, keep, axis=1)
+    indices = np.take_along_axis(indices, keep, axis=1)
+    order = np.argsort(distances, axis=1)
+    return np.take_along_axis(distances, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+
+class BruteForceIndex:
+    """Índice exato: compara cada consulta com todas as referências."""
+
+    kind = 'brute_force'
+
+    def __init__(self, descriptors):
+        self.descriptors = np.ascontiguousarray(descriptors, dtype=np.float32)
+        self.norms = np.einsum('ij,ij->i', self.descriptors, self.descriptors)
+
+    def __len__(self):
+        return len(self.descriptors)
+
+    def search(self, queries, k):
+        """Retorna (distâncias, índices) das k referências mais próximas de cada consulta."""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.descriptors.shape[1])
+        squared = squared_distances(queries, self.descriptors, self.norms)
+        indices = np.broadcast_to(np.arange(len(self)), squared.shape)
+        distances, indices = top_k(squared, indices, k)
+        return np.sqrt(distances), indices
+
+    def save(self, path):
+        np.savez(path, kind=self.kind, descriptors=self.descriptors)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays['descriptors'])
+
+
+class IVFIndex:
+    """
+    Índice aproximado IVF: as referências são divididas em listas por k-means
+    e cada consulta só compara com as n_probe listas de centroide mais próximo.
+    Com menos de exact_below referências, ou quando as listas visitadas cobririam boa
+    parte da galeria, a busca compara com todas, o que é exato e mais rápido.
+    """
+
+    kind = 'ivf'
+
+    def __init__(self, descriptors, n_lists=None, n_probe=8, iterations=10, seed=0,
+                 exact_below=IVF_MIN_REFERENCES, _lists=None):
+        descriptors = np.ascontiguousarray(descriptors, dtype=np.float32)
+        self.n_probe = n_probe
+        self.exact_below = exact_below
+        if _lists is not None:
+            self.centroids, self.order, self.offsets = _lists
+        else:
+            n_lists = n_lists or max(1, int(np.sqrt(len(descriptors))))
+            self.centroids = kmeans(descriptors, n_lists, iterations, seed)
+            assignments = assign(descriptors, self.centroids)
+            self.order = np.argsort(assignments, kind='stable')
+            self.offsets = np.searchsorted(
+                assignments[self.order], np.arange(len(self.centroids) + 1))
+        # Referências reordenadas por lista, para leitura contígua na busca.
+        self.descriptors = np.ascontiguousarray(descriptors[self.order])
+        self.norms = np.einsum('ij,ij->i', self.descriptors, self.descriptors)
+
+    def __len__(self):
+        return len(self.descriptors)
+
+    def search(self, queries, k):
+        """Retorna (distâncias, índices) aproximados das k referências mais próximas de cada consulta."""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.descriptors.shape[1])
+        n_probe = min(self.n_probe, len(self.centroids))
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        if len(self) < self.exact_below or n_probe >= IVF_MAX_PROBE_FRACTION * len(self.centroids):
+            squared = squared_distances(queries, self.descriptors, self.norms)
+            found_distances, found = top_k(squared, np.broadcast_to(np.arange(len(self)), squared.shape), k)
+            distances[:, :found.shape[1]] = np.sqrt(found_distances)
+            indices[:, :found.shape[1]] = self.order[found]
+            return distances, indices
+
+        probes = np.argpartition(squared_distances(queries, self.centroids),
+                                 n_probe - 1, axis=1)[:, :n_probe]
+        for i, query_probes in enumerate(probes):
+            candidates = np.concatenate([np.arange(self.offsets[probe], self.offsets[probe + 1])
+                                         for probe in query_probes])
+            if not len(candidates):
+                continue
+            squared = squared_distances(
+                queries[i:i + 1], self.descriptors[candidates], self.norms[candidates])
+            found_distances, found = top_k(squared, candidates[None, :], k)
+            distances[i, :found.shape[1]] = np.sqrt(found_distances[0])
+            indices[i, :found.shape[1]] = self.order[found[0]]
+        return distances, indices
+
+    def save(self, path):
+        descriptors = np.empty_like(self.descriptors)
+        descriptors[self.order] = self.descriptors
+        np.savez(path, kind=self.kind, descriptors=descriptors, centroids=self.centroids,
+                 order=self.order, offsets=self.offsets, n_probe=self.n_probe, exact_below=self.exact_below)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        exact_below = int(arrays['exact_below']) if 'exact_below' in arrays else IVF_MIN_REFERENCES
+        return cls(arrays['descriptors'], n_probe=int(arrays['n_probe']), exact_below=exact_below,
+                   _lists=(arrays['centroids'], arrays['order'], arrays['offsets']))
+
+
+INDEX_BACKENDS = {index.kind: index for index in (BruteForceIndex, IVFIndex)}
+
+
+def build_index(descriptors, kind='brute_force', **options):
+    """Cria um índice do tipo indicado ('brute_force' ou 'ivf')."""
+    return INDEX_BACKENDS[kind](descriptors, **options)
+
+
+def load_index(path):
+    """Carrega um índice salvo com index.save(path)."""
+    with np.load(path) as arrays:
+        return INDEX_BACKENDS[str(arrays['kind'])].from_arrays(arrays)
+
+
+def assign(descriptors, centroids, block_size=4096):
+    """Retorna o centroide mais próximo de cada descritor, calculando em blocos."""
+    norms = np.einsum('ij,ij->i', centroids, centroids)
+    return np.concatenate([np.argmin(squared_distances(descriptors[start:start + block_size], centroids, norms), axis=1)
+                           for start in range(0, len(descriptors), block_size)] or [np.zeros(0, dtype=np.int64)])
+
+
+def kmeans(descriptors, n_clusters, iterations=10, seed=0, max_samples_per_cluster=256):
+    """k-means simples em NumPy, treinado em uma amostra dos descritores."""
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(descriptors))
+    sample_size = min(len(descriptors), n_clusters * max_samples_per_cluster)
+    sample = descriptors[rng.choice(len(descriptors), sample_size, replace=False)]
+    centroids = sample[rng.choice(len(sample), n_clusters, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = assign(sample, centroids)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+
+def recall(index, exact_index, queries, k=10, query_ids=None):
+    """
+    Fração dos k vizinhos exatos que o índice aproximado também encontra. Com query_ids
+    (consultas tiradas das próprias referências), cada consulta não conta a si mesma.
+    """
+    if query_ids is None:
+        _, found = index.search(queries, k)
+        _, expected = exact_index.search(queries, k)
+        hits = sum(len(set(f.tolist()) & set(e.tolist())) for f, e in zip(found, expected))
+        return hits / expected.size if expected.size else 1.0
+
+    _, found = index.search(queries, k + 1)
+    _, expected = exact_index.search(queries, k + 1)
+    hits = total = 0
+    for query_id, f, e in zip(query_ids, found, expected):
+        neighbors = [neighbor for neighbor in e.tolist() if neighbor != query_id][:k]
+        hits += len(set(neighbors) & set(f.tolist()))
+        total += len(neighbors)
+    return hits / total if total else 1.0
@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from face_gallery import FaceGallery
+from gallery_index import BruteForceIndex, IVFIndex, load_index, recall
+
+
+class TestGalleryIndex(unittest.TestCase):
+    """
+    Testes para os índices exato e aproximado da galeria.
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        centers = rng.normal(size=(200, 128)).astype(np.float32) * 0.1
+        self.descriptors = np.repeat(centers, 3, axis=0) + rng.normal(
+            scale=0.01, size=(600, 128)).astype(np.float32)
+        self.queries = centers[:50] + rng.normal(
+            scale=0.01, size=(50, 128)).astype(np.float32)
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_ivf_probing_all_lists_is_exact(self):
+        # Visitando todas as listas, o IVF encontra exatamente os mesmos vizinhos
+        exact = BruteForceIndex(self.descriptors)
+        index = IVFIndex(self.descriptors, n_lists=10, n_probe=10)
+        self.assertEqual(recall(index, exact, self.queries, k=3), 1.0)
+
+    def test_ivf_recall_with_few_probes(self):
+        # Com poucas listas visitadas o vizinho mais próximo ainda é encontrado
+        index = IVFIndex(self.descriptors, n_lists=20, n_probe=4, exact_below=0)
+        self.assertGreater(recall(index, BruteForceIndex(
+            self.descriptors), self.queries, k=1), 0.9)
+
+    def test_save_and_load(self):
+        # O índice salvo em disco responde igual ao original
+        index = IVFIndex(self.descriptors, n_lists=10, n_probe=3, exact_below=0)
+        path = os.path.join(self.temp_dir, 'index.npz')
+        index.save(path)
+        loaded = load_index(path)
+        np.testing.assert_array_equal(loaded.search(self.queries, 5)[1],
+                                      index.search(self.queries, 5)[1])
+        self.assertEqual(loaded.exact_below, 0)
+
+    def test_small_or_wide_ivf_searches_everything(self):
+        # Galeria pequena ou listas visitadas demais: a busca compara com todas as referências
+        exact = BruteForceIndex(self.descriptors)
+        queries = self.descriptors[::7] + 0.05
+        for index in (IVFIndex(self.descriptors, n_lists=20, n_probe=1),
+                      IVFIndex(self.descriptors, n_lists=20, n_probe=10, exact_below=0)):
+            self.assertEqual(recall(index, exact, queries, k=10), 1.0)
+        np.testing.assert_array_equal(IVFIndex(self.descriptors, n_lists=20, n_probe=1).search(queries, 700)[1][:, 600:],
+                                      -1)
+
+    def test_recall_without_the_query_itself(self):
+        # Consultas tiradas da galeria não contam a si mesmas como vizinho encontrado
+        index = IVFIndex(self.descriptors, n_lists=20, n_probe=1, exact_below=0)
+        ids = np.arange(0, 600, 5)
+        self.assertLess(recall(index, BruteForceIndex(self.descriptors), self.descriptors[ids], k=5, query_ids=ids),
+                        recall(index, BruteForceIndex(self.descriptors), self.descriptors[ids], k=5))
+
+    def test_gallery_match_with_index(self):
+        # A galeria com índice devolve as mesmas pessoas da busca exata
+        gallery = FaceGallery()
+        for i, descriptor in enumerate(self.descriptors):
+            gallery.add(f'pessoa_{i // 3}', descriptor)
+        expected = [[name for name, _ in face] for face in gallery.match(self.queries, 0.3)]
+        gallery.build_index('ivf', n_lists=10, n_probe=10)
+        found = [[name for name, _ in face] for face in gallery.match(self.queries, 0.3)]
+        self.assertEqual(found, expected)
+
+    def test_index_candidates_scale(self):
+        # Candidatos suficientes para top_k pessoas com várias referências e para galerias grandes
+        gallery = FaceGallery()
+        gallery.add('muitas', self.descriptors[:100])
+        gallery.add('uma', self.descriptors[100])
+        self.assertEqual(gallery.index_candidates(1), 100)
+        self.assertEqual(gallery.index_candidates(3), 300)
+        gallery = FaceGallery()
+        for i in range(0, 600, 3):
+            gallery.add(f'pessoa_{i}', self.descriptors[i:i + 3])
+        self.assertEqual(gallery.index_candidates(1), 32)
+        gallery.add('grande', np.zeros((5000, 128), dtype=np.float32))
+        self.assertEqual(gallery.index_candidates(1), 5000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import threading
+import cv2
+import numpy as np
+from image_loader import load_image
+
+# Distância de Hamming máxima (em 64 bits) entre hashes perceptuais de quase duplicatas.
+NEAR_DUPLICATE_DISTANCE = 4
+
+
+def perceptual_hash(data):
+    """
+    Hash perceptual de diferença (dHash) de 64 bits, calculado sobre uma decodificação
+    reduzida a 1/8 em tons de cinza. Cópias redimensionadas ou recomprimidas da mesma
+    foto têm hashes iguais ou a poucos bits de distância.
+    """
+    img, _ = load_image(data=data, grayscale=True, factor=8)
+    small = cv2.resize(img, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def hamming_distances(hashes, value):
+    """Distâncias de Hamming entre um vetor de hashes uint64 e um hash."""
+    xor = np.bitwise_xor(hashes, np.uint64(value))
+    return np.unpackbits(xor.view(np.uint8)).reshape(-1, 64).sum(axis=1)
+
+
+class DuplicateIndex:
+    """
+    Índice das imagens canônicas vistas em uma busca. Cada imagem nova é comparada
+    primeiro pelo hash SHA-1 do conteúdo (cópias exatas) e depois pelo hash perceptual
+    (cópias redimensionadas ou recomprimidas); duplicatas apontam para a canônica.
+    Pode ser usado pelas threads de decodificação ao mesmo tempo.
+    """
+
+    def __init__(self, near_duplicate_distance=NEAR_DUPLICATE_DISTANCE):
+        # None desativa a comparação perceptual e deixa só as cópias exatas.
+        self.near_duplicate_distance = near_duplicate_distance
+        self.by_hash = {}
+        self.paths = []
+        self.hashes = np.empty(64, dtype=np.uint64)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.paths)
+
+    def canonical(self, file_path, file_hash_value, data):
+        """
+        Retorna o caminho da imagem canônica da qual file_path é duplicata, ou None,
+        registrando file_path como canônica.
+        """
+        with self.lock:
+            if file_hash_value in self.by_hash:
+                return self.by_hash[file_hash_value]
+            self.by_hash[file_hash_value] = file_path
+        if self.near_duplicate_distance is None:
+            return None
+
+        try:
+            value = perceptual_hash(data)
+        except Exception:
+            # Arquivo que não decodifica: o erro aparece na decodificação completa.
+            return None
+        with self.lock:
+            count = len(self.paths)
+            if count:
+                distances = hamming_distances(self.hashes[:count], value)
+                nearest = int(np.argmin(distances))
+                if distances[nearest] <= self.near_duplicate_distance:
+                    self.by_hash[file_hash_value] = self.paths[nearest]
+                    return self.paths[nearest]
+            if count == len(self.hashes):
+                self.hashes = np.concatenate([self.hashes, np.empty_like(self.hashes)])
+            self.hashes[count] = value
+            self.paths.append(file_path)
+        return None
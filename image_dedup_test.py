@@ -0,0 +1,48 @@
+import unittest
+import cv2
+import numpy as np
+from image_dedup import DuplicateIndex, hamming_distances, perceptual_hash
+
+
+def encode(img, quality=95):
+    return cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+
+class TestImageDedup(unittest.TestCase):
+    """
+    Testes para a detecção de imagens duplicadas.
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.photo = cv2.resize(rng.integers(0, 256, (8, 8, 3), dtype=np.uint8), (640, 480))
+        self.other = cv2.resize(rng.integers(0, 256, (8, 8, 3), dtype=np.uint8), (640, 480))
+
+    def test_perceptual_hash_survives_resize_and_recompression(self):
+        original = perceptual_hash(encode(self.photo))
+        copy = perceptual_hash(encode(cv2.resize(self.photo, (320, 240)), quality=60))
+        different = perceptual_hash(encode(self.other))
+        hashes = np.array([copy, different], dtype=np.uint64)
+        distances = hamming_distances(hashes, original)
+        self.assertLessEqual(distances[0], 4)
+        self.assertGreater(distances[1], 10)
+
+    def test_canonical(self):
+        # Cópias exatas e quase duplicatas apontam para a primeira imagem vista
+        index = DuplicateIndex()
+        data = encode(self.photo)
+        self.assertIsNone(index.canonical('a.jpg', 'h1', data))
+        self.assertEqual(index.canonical('b.jpg', 'h1', data), 'a.jpg')
+        self.assertEqual(index.canonical('c.jpg', 'h2', encode(self.photo, quality=50)), 'a.jpg')
+        self.assertIsNone(index.canonical('d.jpg', 'h3', encode(self.other)))
+        self.assertEqual(len(index), 2)
+
+    def test_exact_only(self):
+        index = DuplicateIndex(near_duplicate_distance=None)
+        self.assertIsNone(index.canonical('a.jpg', 'h1', encode(self.photo)))
+        self.assertIsNone(index.canonical('c.jpg', 'h2', encode(self.photo, quality=50)))
+        self.assertEqual(index.canonical('b.jpg', 'h1', b''), 'a.jpg')
+
+
+if __name__ == '__main__':
+    unittest.main()
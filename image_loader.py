@@ -0,0 +1,155 @@
+import struct
+import cv2
+import numpy as np
+
+# Tamanho (px) que o menor rosto procurado deve manter depois da decodificação reduzida.
+TARGET_FACE_SIZE = 100
+
+# Lado menor mínimo da imagem decodificada, para não reduzir fotos já pequenas.
+MIN_DECODED_SIDE = 320
+
+REDUCED_COLOR_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+REDUCED_GRAYSCALE_FLAGS = {
+    1: cv2.IMREAD_GRAYSCALE,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+
+def is_jpeg(data):
+    return data[:2] == b'\xff\xd8'
+
+
+def _jpeg_segments(data):
+    """Percorre os segmentos do cabeçalho JPEG, gerando (marcador, conteúdo), até o início dos dados."""
+    position = 2
+    while position + 4 <= len(data):
+        if data[position] != 0xFF:
+            return
+        marker = data[position + 1]
+        if marker == 0xFF:
+            position += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            position += 2
+            continue
+        length = struct.unpack('>H', data[position + 2:position + 4])[0]
+        yield marker, data[position + 4:position + 2 + length]
+        if marker == 0xDA:
+            return
+        position += 2 + length
+
+
+def image_size(data):
+    """Lê (largura, altura) do cabeçalho JPEG ou PNG sem decodificar a imagem; None se desconhecido."""
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+        return struct.unpack('>II', data[16:24])
+    if is_jpeg(data):
+        for marker, segment in _jpeg_segments(data):
+            # SOF0..SOF15, exceto DHT (C4), JPG (C8) e DAC (CC).
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC) and len(segment) >= 5:
+                height, width = struct.unpack('>HH', segment[1:5])
+                return width, height
+    return None
+
+
+def oriented_size(data):
+    """(largura, altura) da imagem em pé, com a orientação EXIF aplicada; None se desconhecido."""
+    size = image_size(data)
+    if size is not None and exif_orientation(data) >= 5:
+        return size[::-1]
+    return size
+
+
+def exif_orientation(data):
+    """Lê a tag de orientação EXIF (1 a 8) de um JPEG; 1 quando ausente."""
+    if not is_jpeg(data):
+        return 1
+    for marker, segment in _jpeg_segments(data):
+        if marker != 0xE1 or not segment.startswith(b'Exif\x00\x00'):
+            continue
+        tiff = segment[6:]
+        if len(tiff) < 8 or tiff[:2] not in (b'II', b'MM'):
+            return 1
+        endian = '<' if tiff[:2] == b'II' else '>'
+        ifd_offset = struct.unpack(endian + 'I', tiff[4:8])[0]
+        if ifd_offset + 2 > len(tiff):
+            return 1
+        entries = struct.unpack(endian + 'H', tiff[ifd_offset:ifd_offset + 2])[0]
+        for i in range(entries):
+            entry = ifd_offset + 2 + 12 * i
+            if entry + 12 > len(tiff):
+                break
+            tag, field_type = struct.unpack(endian + 'HH', tiff[entry:entry + 4])
+            if tag == 0x0112 and field_type == 3:
+                orientation = struct.unpack(endian + 'H', tiff[entry + 8:entry + 10])[0]
+                return orientation if 1 <= orientation <= 8 else 1
+        return 1
+    return 1
+
+
+def apply_orientation(img, orientation):
+    """Gira e espelha a imagem conforme a orientação EXIF, deixando-a em pé."""
+    if orientation in (5, 7):
+        # Orientações transpostas: 5 é a transposição e 7 a transposição girada 180°
+        img = np.swapaxes(img, 0, 1)
+        if orientation == 7:
+            img = img[::-1, ::-1]
+    elif orientation == 2:
+        img = img[:, ::-1]
+    elif orientation == 3:
+        img = img[::-1, ::-1]
+    elif orientation == 4:
+        img = img[::-1]
+    elif orientation == 6:
+        img = np.rot90(img, -1)
+    elif orientation == 8:
+        img = np.rot90(img, 1)
+    return np.ascontiguousarray(img)
+
+
+def decode_factor(size, min_face_size, target_face_size=TARGET_FACE_SIZE):
+    """
+    Escolhe a redução de decodificação (1, 2, 4 ou 8) a partir das dimensões do
+    cabeçalho e do menor rosto procurado, mantendo esse rosto com target_face_size pixels.
+    """
+    if not min_face_size or size is None:
+        return 1
+    for factor in (8, 4, 2):
+        if min_face_size / factor >= target_face_size and min(size) / factor >= MIN_DECODED_SIDE:
+            return factor
+    return 1
+
+
+def load_image(file_path=None, data=None, min_face_size=0, target_face_size=TARGET_FACE_SIZE,
+               grayscale=False, factor=None):
+    """
+    Decodifica uma imagem já em pé (orientação EXIF aplicada) e retorna (imagem, escala),
+    em que escala é o tamanho decodificado sobre o original. JPEGs são decodificados
+    direto em 1/2, 1/4 ou 1/8 pelo libjpeg quando o menor rosto procurado permite;
+    PNG e outros formatos usam a decodificação completa.
+    """
+    if data is None:
+        with open(file_path, 'rb') as f:
+            data = f.read()
+
+    if not is_jpeg(data):
+        factor = 1
+    elif factor is None:
+        factor = decode_factor(image_size(data), min_face_size, target_face_size)
+    flags = (REDUCED_GRAYSCALE_FLAGS if grayscale else REDUCED_COLOR_FLAGS)[factor]
+
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8),
+                       flags | cv2.IMREAD_IGNORE_ORIENTATION)
+    if img is None:
+        raise ValueError(f'Não foi possível decodificar {file_path or "a imagem"}')
+    if not grayscale:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    return apply_orientation(img, exif_orientation(data)), 1.0 / factor
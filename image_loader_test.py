@@ -0,0 +1,90 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import cv2
+import numpy as np
+from image_loader import decode_factor, exif_orientation, image_size, load_image
+
+
+def with_orientation(jpeg, orientation):
+    # Insere um segmento APP1 (EXIF) mínimo, só com a tag de orientação, logo após o SOI
+    tiff = b'MM\x00\x2a\x00\x00\x00\x08' + struct.pack('>H', 1) + \
+        struct.pack('>HHIHH', 0x0112, 3, 1, orientation, 0) + b'\x00\x00\x00\x00'
+    payload = b'Exif\x00\x00' + tiff
+    return jpeg[:2] + b'\xff\xe1' + struct.pack('>H', len(payload) + 2) + payload + jpeg[2:]
+
+
+class TestImageLoader(unittest.TestCase):
+    """
+    Testes para a decodificação rápida de imagens.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        # Imagem 640x480 com o canto superior esquerdo vermelho (em BGR para o OpenCV)
+        self.bgr = np.zeros((480, 640, 3), dtype=np.uint8)
+        self.bgr[:240, :320] = (0, 0, 255)
+        self.jpeg = cv2.imencode('.jpg', self.bgr, [cv2.IMWRITE_JPEG_QUALITY, 95])[1].tobytes()
+        self.png_path = os.path.join(self.temp_dir, 'a.png')
+        cv2.imwrite(self.png_path, self.bgr)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_image_size_from_header(self):
+        # As dimensões saem do cabeçalho, sem decodificar
+        self.assertEqual(image_size(self.jpeg), (640, 480))
+        with open(self.png_path, 'rb') as f:
+            self.assertEqual(image_size(f.read()), (640, 480))
+        self.assertIsNone(image_size(b'not an image'))
+
+    def test_decode_factor(self):
+        # A redução mantém o menor rosto com o tamanho alvo e não encolhe fotos pequenas
+        self.assertEqual(decode_factor((4000, 3000), 0), 1)
+        self.assertEqual(decode_factor((4000, 3000), 200), 2)
+        self.assertEqual(decode_factor((4000, 3000), 800), 8)
+        self.assertEqual(decode_factor((640, 480), 800), 1)
+
+    def test_reduced_jpeg_decode(self):
+        # JPEGs são decodificados já reduzidos e em RGB
+        img, scale = load_image(data=self.jpeg, factor=2)
+        self.assertEqual(img.shape, (240, 320, 3))
+        self.assertEqual(scale, 0.5)
+        self.assertGreater(img[10, 10, 0], 200)
+        self.assertLess(img[10, 10, 2], 50)
+
+    def test_png_is_never_reduced(self):
+        img, scale = load_image(self.png_path, min_face_size=1000)
+        self.assertEqual((img.shape, scale), ((480, 640, 3), 1.0))
+
+    def test_exif_orientation_is_applied(self):
+        # Orientação 6: a foto foi tirada de lado e precisa girar 90° no sentido horário
+        rotated = with_orientation(self.jpeg, 6)
+        self.assertEqual(exif_orientation(rotated), 6)
+        self.assertEqual(exif_orientation(self.jpeg), 1)
+        img, _ = load_image(data=rotated)
+        self.assertEqual(img.shape, (640, 480, 3))
+        # O canto vermelho vai para o canto superior direito
+        self.assertGreater(img[10, 470, 0], 200)
+        self.assertLess(img[10, 10, 0], 50)
+
+    def test_all_orientations_match_opencv(self):
+        # As oito orientações ficam iguais às da decodificação do OpenCV, que também aplica o EXIF
+        for orientation in range(1, 9):
+            data = with_orientation(self.jpeg, orientation)
+            expected = cv2.cvtColor(cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR),
+                                    cv2.COLOR_BGR2RGB)
+            img, _ = load_image(data=data)
+            np.testing.assert_array_equal(img, expected, err_msg=f'orientação {orientation}')
+            gray, _ = load_image(data=data, grayscale=True)
+            self.assertEqual(gray.shape, expected.shape[:2])
+
+    def test_invalid_image_raises(self):
+        with self.assertRaises(ValueError):
+            load_image(data=b'\xff\xd8not a jpeg')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Limites (em segundos) dos baldes dos histogramas de duração dos estágios.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROMETHEUS_PREFIX = 'face'
+
+
+class Metrics:
+    """
+    Tempo acumulado, contagem e histograma de duração de cada estágio, mais
+    contadores (imagens, rostos, correspondências, cópias...). Cada processo do
+    pool mantém o seu e devolve o acumulado a cada tarefa com drain(); o
+    coordenador soma tudo com merge(). Pode ser usado por várias threads.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.stages = {}
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set(self, name, value):
+        """Define um contador mantido em outro lugar (ex.: os contadores do SearchPipeline)."""
+        with self.lock:
+            self.counters[name] = value
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                entry = self.stages[stage] = {'seconds': 0.0, 'count': 0,
+                                              'buckets': [0] * (len(BUCKETS) + 1)}
+            entry['seconds'] += seconds
+            entry['count'] += 1
+            entry['buckets'][bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def snapshot(self):
+        """Cópia serializável (JSON, pickle) dos valores atuais."""
+        with self.lock:
+            return {'counters': dict(self.counters),
+                    'stages': {stage: dict(entry, buckets=list(entry['buckets']))
+                               for stage, entry in self.stages.items()}}
+
+    def drain(self):
+        """Retorna o snapshot e zera os valores; usado pelos processos ao fim de cada tarefa."""
+        with self.lock:
+            snapshot = {'counters': self.counters, 'stages': self.stages}
+            self.counters = {}
+            self.stages = {}
+        return snapshot
+
+    def merge(self, snapshot):
+        """Soma um snapshot (de outro processo) a estes valores."""
+        if not snapshot:
+            return
+        with self.lock:
+            for name, value in snapshot['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for stage, other in snapshot['stages'].items():
+                entry = self.stages.setdefault(stage, {'seconds': 0.0, 'count': 0,
+                                                       'buckets': [0] * (len(BUCKETS) + 1)})
+                entry['seconds'] += other['seconds']
+                entry['count'] += other['count']
+                entry['buckets'] = [a + b for a, b in zip(entry['buckets'], other['buckets'])]
+
+    def to_json(self):
+        snapshot = self.snapshot()
+        snapshot['buckets'] = list(BUCKETS)
+        return json.dumps(snapshot, indent=2, sort_keys=True)
+
+    def to_prometheus(self, prefix=PROMETHEUS_PREFIX):
+        """Formato de texto do Prometheus (coletor textfile do node exporter)."""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f'# TYPE {prefix}_{name}_total counter')
+            lines.append(f'{prefix}_{name}_total {value}')
+        if snapshot['stages']:
+            lines.append(f'# HELP {prefix}_stage_seconds Duração de cada execução de um estágio do pipeline.')
+            lines.append(f'# TYPE {prefix}_stage_seconds histogram')
+        for stage, entry in sorted(snapshot['stages'].items()):
+            cumulative = 0
+            for limit, count in zip(BUCKETS + ('+Inf',), entry['buckets']):
+                cumulative += count
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{limit}"}} {cumulative}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {entry["seconds"]:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {entry["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """
+        Grava o formato do Prometheus em path e o JSON ao lado (mesmo nome, extensão .json).
+        A troca é atômica, para que um coletor nunca leia um arquivo pela metade.
+        """
+        for file_path, content in ((path, self.to_prometheus()),
+                                   (os.path.splitext(path)[0] + '.json', self.to_json())):
+            temporary_path = f'{file_path}.tmp'
+            with open(temporary_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(temporary_path, file_path)
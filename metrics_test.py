@@ -0,0 +1,66 @@
+import json
+import os
+import tempfile
+import unittest
+from metrics import BUCKETS, Metrics
+
+
+class TestMetrics(unittest.TestCase):
+    """
+    Testes para os contadores e histogramas de estágio.
+    """
+
+    def test_count_observe_and_snapshot(self):
+        metrics = Metrics()
+        metrics.count('images')
+        metrics.count('images', 2)
+        metrics.observe('decode', 0.002)
+        metrics.observe('decode', 20.0)
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['counters'], {'images': 3})
+        decode = snapshot['stages']['decode']
+        self.assertEqual(decode['count'], 2)
+        self.assertAlmostEqual(decode['seconds'], 20.002)
+        # 0.002s cai no balde de 0.0025s e 20s no balde +Inf
+        self.assertEqual(decode['buckets'][BUCKETS.index(0.0025)], 1)
+        self.assertEqual(decode['buckets'][-1], 1)
+
+    def test_drain_and_merge(self):
+        # O acumulado de um processo é zerado por drain() e somado no coordenador
+        worker = Metrics()
+        worker.count('faces_detected', 4)
+        with worker.time('detect'):
+            pass
+        total = Metrics()
+        total.count('faces_detected', 1)
+        total.merge(worker.drain())
+        total.merge(None)
+        self.assertEqual(worker.snapshot(), {'counters': {}, 'stages': {}})
+        self.assertEqual(total.snapshot()['counters'], {'faces_detected': 5})
+        self.assertEqual(total.snapshot()['stages']['detect']['count'], 1)
+
+    def test_prometheus_histogram_is_cumulative(self):
+        metrics = Metrics()
+        metrics.set('scanned', 7)
+        metrics.observe('embed', 0.0005)
+        metrics.observe('embed', 0.3)
+        lines = metrics.to_prometheus().splitlines()
+        self.assertIn('face_scanned_total 7', lines)
+        self.assertIn('face_stage_seconds_bucket{stage="embed",le="0.001"} 1', lines)
+        self.assertIn('face_stage_seconds_bucket{stage="embed",le="0.5"} 2', lines)
+        self.assertIn('face_stage_seconds_bucket{stage="embed",le="+Inf"} 2', lines)
+        self.assertIn('face_stage_seconds_count{stage="embed"} 2', lines)
+
+    def test_write(self):
+        metrics = Metrics()
+        metrics.count('matches', 2)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'face.prom')
+            metrics.write(path)
+            self.assertEqual(sorted(os.listdir(directory)), ['face.json', 'face.prom'])
+            with open(os.path.join(directory, 'face.json')) as f:
+                self.assertEqual(json.load(f)['counters'], {'matches': 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,211 @@
+"""
+Índice dos rostos de um acervo de fotos, calculado uma única vez e consultado
+sem decodificar nenhuma imagem.
+
+O diretório do índice guarda os descritores de todos os rostos em
+descriptors.f32 (float32, 128 por rosto, lido com np.memmap), uma tabela
+compacta em faces.bin com a foto, o retângulo e a pontuação do detector de
+cada rosto (mesma ordem dos descritores) e as fotos em photos.db. Os dois
+arquivos só crescem: fotos novas são acrescentadas ao fim, e fotos alteradas
+ou removidas saem de photos.db, deixando seus rostos para trás sem foto.
+"""
+import os
+import sqlite3
+import threading
+import uuid
+import numpy as np
+
+DESCRIPTORS_NAME = 'descriptors.f32'
+FACES_NAME = 'faces.bin'
+PHOTOS_NAME = 'photos.db'
+
+DIMENSIONS = 128
+
+# Uma linha por rosto, na mesma ordem de descriptors.f32.
+FACE_DTYPE = np.dtype([('photo', '<i8'), ('left', '<i4'), ('top', '<i4'),
+                       ('right', '<i4'), ('bottom', '<i4'), ('score', '<f4')])
+
+# Rostos comparados com a galeria de cada vez, limitando a memória da consulta.
+QUERY_CHUNK = 1 << 16
+
+
+class PhotoIndex:
+    """
+    Índice de rostos acrescentável (ver o início do módulo). model_version identifica o
+    modelo e as opções de detecção: acrescentar com outro valor levanta ValueError, e
+    None abre o índice existente só para consulta. Pode ser usado por várias threads.
+    """
+
+    def __init__(self, directory, model_version=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.lock = threading.RLock()
+        # Cada instância é uma varredura; fotos não vistas nela saem com remove_unseen.
+        self.scan_id = uuid.uuid4().hex
+        self.connection = sqlite3.connect(os.path.join(directory, PHOTOS_NAME), check_same_thread=False)
+        with self.connection:
+            # AUTOINCREMENT: o id de uma foto removida nunca é reaproveitado pelos rostos de outra.
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS Photos (
+                ID INTEGER PRIMARY KEY AUTOINCREMENT,
+                Path TEXT UNIQUE,
+                Size INTEGER,
+                MTime REAL,
+                FileHash TEXT,
+                Faces INTEGER,
+                ScanId TEXT
+            )''')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS Meta (Key TEXT PRIMARY KEY, Value TEXT)')
+            stored = self.connection.execute(
+                "SELECT Value FROM Meta WHERE Key = 'ModelVersion'").fetchone()
+            if model_version is not None and stored is None:
+                self.connection.execute(
+                    "INSERT INTO Meta VALUES ('ModelVersion', ?)", (model_version,))
+        if model_version is not None and stored is not None and stored[0] != model_version:
+            self.connection.close()
+            raise ValueError(f'O índice em {directory} foi criado com outro modelo ou outras '
+                             f'opções ({stored[0]}); use um novo diretório de índice.')
+        self.size = self._repair()
+        self.descriptor_file = open(os.path.join(directory, DESCRIPTORS_NAME), 'ab')
+        self.face_file = open(os.path.join(directory, FACES_NAME), 'ab')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        """Número de linhas de rosto, incluindo as de fotos já removidas."""
+        return self.size
+
+    def close(self):
+        with self.lock:
+            self.commit()
+            self.descriptor_file.close()
+            self.face_file.close()
+            self.connection.close()
+
+    def _repair(self):
+        """
+        Descarta o fim dos arquivos gravado por uma execução interrompida antes de
+        registrar suas fotos (ou pela metade) e retorna o número de rostos.
+        """
+        descriptors_path = os.path.join(self.directory, DESCRIPTORS_NAME)
+        faces_path = os.path.join(self.directory, FACES_NAME)
+        sizes = [os.path.getsize(path) if os.path.exists(path) else 0
+                 for path in (descriptors_path, faces_path)]
+        count = min(sizes[0] // (DIMENSIONS * 4), sizes[1] // FACE_DTYPE.itemsize)
+        if count:
+            row = self.connection.execute(
+                "SELECT seq FROM sqlite_sequence WHERE name = 'Photos'").fetchone()
+            last_photo = row[0] if row else 0
+            photos = np.memmap(faces_path, FACE_DTYPE, 'r', shape=(count,))['photo']
+            # Os ids crescem com a ordem de gravação: rostos de fotos não registradas estão no fim.
+            count = int(np.searchsorted(photos, last_photo, side='right'))
+            del photos
+        for path, item_size in ((descriptors_path, DIMENSIONS * 4), (faces_path, FACE_DTYPE.itemsize)):
+            if os.path.exists(path) and os.path.getsize(path) != count * item_size:
+                os.truncate(path, count * item_size)
+        return count
+
+    def needs_indexing(self, file_path):
+        """Indica se a foto é nova ou mudou desde que foi indexada; marca-a como vista."""
+        path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        with self.lock:
+            entry = self.connection.execute('SELECT Size, MTime FROM Photos WHERE Path = ?',
+                                            (path,)).fetchone()
+            if entry is None or tuple(entry) != (stat.st_size, stat.st_mtime):
+                return True
+            self.connection.execute('UPDATE Photos SET ScanId = ? WHERE Path = ?', (self.scan_id, path))
+            return False
+
+    def add(self, file_path, file_hash_value, descriptors, boxes, scores):
+        """Acrescenta os rostos de uma foto, substituindo os de uma versão anterior dela."""
+        descriptors = np.asarray(descriptors, dtype=np.float32).reshape(-1, DIMENSIONS)
+        boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+        path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        with self.lock:
+            self.connection.execute('DELETE FROM Photos WHERE Path = ?', (path,))
+            photo_id = self.connection.execute(
+                'INSERT INTO Photos (Path, Size, MTime, FileHash, Faces, ScanId) VALUES (?, ?, ?, ?, ?, ?)',
+                (path, stat.st_size, stat.st_mtime, file_hash_value, len(descriptors), self.scan_id)).lastrowid
+            faces = np.zeros(len(descriptors), dtype=FACE_DTYPE)
+            faces['photo'] = photo_id
+            for i, column in enumerate(('left', 'top', 'right', 'bottom')):
+                faces[column] = boxes[:, i]
+            faces['score'] = scores
+            self.descriptor_file.write(descriptors.tobytes())
+            self.face_file.write(faces.tobytes())
+            self.size += len(descriptors)
+
+    def remove_unseen(self, search_dir):
+        """Remove as fotos de search_dir que não apareceram nesta varredura."""
+        prefix = os.path.join(os.path.abspath(search_dir), '')
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM Photos WHERE substr(Path, 1, ?) = ? AND ScanId IS NOT ?',
+                                    (len(prefix), prefix, self.scan_id))
+
+    def commit(self):
+        """Grava os rostos no disco antes das fotos, para que uma foto registrada nunca fique sem eles."""
+        with self.lock:
+            for f in (self.descriptor_file, self.face_file):
+                f.flush()
+                os.fsync(f.fileno())
+            self.connection.commit()
+
+    def descriptors(self):
+        """Todos os descritores, como matriz (rostos, 128) mapeada do disco."""
+        with self.lock:
+            self.descriptor_file.flush()
+            if not self.size:
+                return np.zeros((0, DIMENSIONS), dtype=np.float32)
+            return np.memmap(os.path.join(self.directory, DESCRIPTORS_NAME), np.float32, 'r',
+                             shape=(self.size, DIMENSIONS))
+
+    def faces(self):
+        """A tabela de rostos (FACE_DTYPE), mapeada do disco."""
+        with self.lock:
+            self.face_file.flush()
+            if not self.size:
+                return np.zeros(0, dtype=FACE_DTYPE)
+            return np.memmap(os.path.join(self.directory, FACES_NAME), FACE_DTYPE, 'r', shape=(self.size,))
+
+    def photos(self):
+        """Dicionário id -> (caminho, hash do conteúdo) das fotos indexadas."""
+        with self.lock:
+            return {photo_id: (path, file_hash_value) for photo_id, path, file_hash_value in
+                    self.connection.execute('SELECT ID, Path, FileHash FROM Photos')}
+
+    def query(self, gallery, threshold):
+        """
+        Compara todos os rostos do índice com a galeria, em blocos vetorizados, e retorna
+        {pessoa: [(id da foto, distância, linha do rosto)]}, com a foto uma vez por pessoa
+        (o rosto mais próximo) e em ordem de distância. Como na busca, cada rosto conta
+        só para a pessoa mais próxima abaixo do limiar.
+        """
+        if not gallery.num_people:
+            return {}
+        photos = np.fromiter(self.photos(), dtype=np.int64)
+        descriptors = self.descriptors()
+        face_photos = self.faces()['photo']
+        best = {}
+        for start in range(0, len(face_photos), QUERY_CHUNK):
+            distances = gallery.distances(descriptors[start:start + QUERY_CHUNK])
+            nearest = np.argmin(distances, axis=1)
+            nearest_distances = distances[np.arange(len(nearest)), nearest]
+            chunk_photos = face_photos[start:start + QUERY_CHUNK]
+            for row in np.flatnonzero((nearest_distances < threshold) & np.isin(chunk_photos, photos)):
+                key = (int(nearest[row]), int(chunk_photos[row]))
+                distance = float(nearest_distances[row])
+                if key not in best or distance < best[key][0]:
+                    best[key] = (distance, start + int(row))
+
+        matches = {}
+        for (person_id, photo_id), (distance, row) in best.items():
+            matches.setdefault(gallery.names[person_id], []).append((photo_id, distance, row))
+        for person_matches in matches.values():
+            person_matches.sort(key=lambda match: match[1])
+        return matches
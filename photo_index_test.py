@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from face_gallery import FaceGallery
+from photo_index import DESCRIPTORS_NAME, FACES_NAME, PhotoIndex
+
+
+def descriptor(value):
+    d = np.zeros(128, dtype=np.float32)
+    d[value] = 1.0
+    return d
+
+
+class TestPhotoIndex(unittest.TestCase):
+    """
+    Testes para o índice de rostos do acervo de fotos.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.photos_dir = os.path.join(self.temp_dir, 'fotos')
+        os.makedirs(self.photos_dir)
+        self.index_dir = os.path.join(self.temp_dir, 'indice')
+        self.gallery = FaceGallery()
+        self.gallery.add('Ana', descriptor(0))
+        self.gallery.add('Bia', descriptor(1))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def photo(self, name, content=b'foto'):
+        path = os.path.join(self.photos_dir, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def add(self, index, path, values):
+        index.add(path, 'hash', [descriptor(value) for value in values],
+                  [[10 * i, 0, 10 * i + 50, 50] for i in range(len(values))], [1.0] * len(values))
+
+    def matched(self, index):
+        photos = index.photos()
+        return {person: [os.path.basename(photos[photo_id][0]) for photo_id, _, _ in matches]
+                for person, matches in index.query(self.gallery, 0.5).items()}
+
+    def test_query_matches_nearest_person(self):
+        # Cada foto aparece uma vez por pessoa, com o retângulo do rosto mais próximo
+        with PhotoIndex(self.index_dir, 'modelo') as index:
+            self.add(index, self.photo('a.jpg'), [0, 1, 0])
+            self.add(index, self.photo('b.jpg'), [1])
+            self.add(index, self.photo('c.jpg'), [5])
+            self.assertEqual(len(index), 5)
+            self.assertEqual(self.matched(index), {'Ana': ['a.jpg'], 'Bia': ['a.jpg', 'b.jpg']})
+            _, distance, row = index.query(self.gallery, 0.5)['Ana'][0]
+            self.assertEqual(distance, 0.0)
+            self.assertEqual(int(index.faces()[row]['left']), 0)
+
+    def test_append_and_replace(self):
+        # Fotos novas são acrescentadas e fotos alteradas substituem seus rostos
+        path = self.photo('a.jpg')
+        with PhotoIndex(self.index_dir, 'modelo') as index:
+            self.add(index, path, [0])
+            self.assertFalse(index.needs_indexing(path))
+        with open(path, 'ab') as f:
+            f.write(b'!')
+        with PhotoIndex(self.index_dir, 'modelo') as index:
+            self.assertTrue(index.needs_indexing(path))
+            self.add(index, path, [1])
+            self.add(index, self.photo('b.jpg'), [0])
+            self.assertEqual(len(index), 3)
+            self.assertEqual(self.matched(index), {'Ana': ['b.jpg'], 'Bia': ['a.jpg']})
+
+    def test_remove_unseen(self):
+        with PhotoIndex(self.index_dir, 'modelo') as index:
+            self.add(index, self.photo('a.jpg'), [0])
+            self.add(index, self.photo('b.jpg'), [0])
+        # Cada abertura do índice é uma nova varredura
+        with PhotoIndex(self.index_dir, 'modelo') as index:
+            index.needs_indexing(os.path.join(self.photos_dir, 'b.jpg'))
+            index.remove_unseen(self.photos_dir)
+            self.assertEqual(self.matched(index), {'Ana': ['b.jpg']})
+
+    def test_interrupted_append_is_discarded(self):
+        # Rostos gravados sem a foto registrada (ou pela metade) são descartados ao abrir
+        with PhotoIndex(self.index_dir, 'modelo') as index:
+            self.add(index, self.photo('a.jpg'), [0])
+        with open(os.path.join(self.index_dir, DESCRIPTORS_NAME), 'ab') as f:
+            f.write(descriptor(1).tobytes() + b'\0' * 7)
+        with open(os.path.join(self.index_dir, FACES_NAME), 'ab') as f:
+            f.write(np.int64(99).tobytes() + b'\0' * 20)
+        with PhotoIndex(self.index_dir, 'modelo') as index:
+            self.assertEqual(len(index), 1)
+            self.add(index, self.photo('b.jpg'), [1])
+            self.assertEqual(self.matched(index), {'Ana': ['a.jpg'], 'Bia': ['b.jpg']})
+
+    def test_other_model_is_rejected(self):
+        PhotoIndex(self.index_dir, 'modelo').close()
+        with self.assertRaises(ValueError):
+            PhotoIndex(self.index_dir, 'outro')
+        with PhotoIndex(self.index_dir) as index:
+            self.assertEqual(index.query(self.gallery, 0.5), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,21 +1,17 @@
-import hashlib
-from multiprocessing import Pool, cpu_count
 import os
-import shutil
-import dlib
-from tqdm import tqdm
-import numpy as np
+import queue
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import threading
-
-face_dict = {}
-image_hashes = set()
+from face_daemon import EngineClient
+from face_database import DATABASE_PATH
+from face_embedding import DEFAULT_BATCH_SIZE
+from search_output import COPY, OUTPUT_MODES
 
 
 class PhotoSearchGUI:
     def __init__(self):
-        """Inicialização do GUI e carregamento dos modelos de reconhecimento facial."""
+        """Inicialização do GUI. Os modelos ficam no motor de reconhecimento (ver face_engine)."""
         self.root = tk.Tk()
         self.root.title('Buscador de Fotos por Reconhecimento Facial')
 
@@ -23,38 +19,40 @@ class PhotoSearchGUI:
         self.persons_dir_var = tk.StringVar()
         self.search_dir_var = tk.StringVar()
         self.output_dir_var = tk.StringVar()
+        self.incremental_var = tk.BooleanVar(value=True)
+        self.dedup_var = tk.BooleanVar(value=True)
+        # Vídeos não entram na busca incremental: ficam de fora a menos que pedidos.
+        self.videos_var = tk.BooleanVar(value=False)
+        self.min_face_size_var = tk.IntVar(value=0)
+        self.batch_size_var = tk.IntVar(value=DEFAULT_BATCH_SIZE)
+        self.output_mode_var = tk.StringVar(value=COPY)
+        self.database_path = DATABASE_PATH
+        self.local_engine = None
+
+        # Erros das threads de busca são exibidos pela thread da interface.
+        self.errors = queue.Queue()
 
         self.create_widgets()
         self.arrange_widgets()
-
-        try:
-            self.facerec = dlib.face_recognition_model_v1(
-                os.path.join('dlib_face_recognition_resnet_model_v1.dat'))
-            self.detector = dlib.get_frontal_face_detector()
-            self.sp = dlib.shape_predictor(os.path.join(
-                os.getcwd(), 'shape_predictor_68_face_landmarks.dat'))
-
-        except Exception as e:
-            self.print_error(
-                'Erro ao carregar modelo de reconhecimento facial', str(e))
-
-    def image_hash(self, image):
-        """Calcula e retorna o hash MD5 de uma imagem."""
-        return hashlib.md5(image).hexdigest()
+        self.root.after(100, self.show_pending_errors)
+
+    def engine(self):
+        """Usa o serviço de face_daemon se estiver rodando; senão, um motor local
+        que mantém os modelos carregados entre uma busca e outra."""
+        client = EngineClient()
+        if client.available():
+            return client
+        if self.local_engine is None:
+            from face_engine import FaceEngine
+            self.local_engine = FaceEngine(self.database_path)
+        return self.local_engine
 
     def check_reference_images(self, input_dir):
-        """Verifica a qualidade das imagens de referência."""
-        for root, _, files in os.walk(input_dir):
-            for file in files:
-                if file.endswith(".jpg") or file.endswith(".jpeg") or file.endswith(".png"):
-                    input_file_path = os.path.join(root, file)
-                    img = dlib.load_rgb_image(input_file_path)
-                    dets = self.detector(img, 1)
-
-                    if len(dets) == 0:
-                        self.print_error(
-                            'Imagem de referência ruim', f"A imagem de referência '{file}' não possui um rosto detectável. Por favor, use uma imagem de melhor qualidade.")
-                        return False
+        """Verifica a qualidade das imagens de referência usando os resultados salvos no banco."""
+        for file in self.engine().run_job('check', persons_dir=input_dir):
+            self.print_error(
+                'Imagem de referência ruim', f"A imagem de referência '{file}' não possui um rosto detectável. Por favor, use uma imagem de melhor qualidade.")
+            return False
         return True
 
     def select_persons_dir(self):
@@ -105,9 +103,19 @@ class PhotoSearchGUI:
             self.print_error('Erro ao executar busca de fotos', str(e))
 
     def print_error(self, title, message):
-        """Exibe uma mensagem de erro via GUI e imprime no console."""
-        messagebox.showerror(title, message)
+        """Exibe uma mensagem de erro via GUI e imprime no console.
+        Fora da thread da interface, a mensagem espera por show_pending_errors."""
         print(f'{title}: {message}')
+        if threading.current_thread() is threading.main_thread():
+            messagebox.showerror(title, message)
+        else:
+            self.errors.put((title, message))
+
+    def show_pending_errors(self):
+        """Exibe, na thread da interface, os erros vindos das threads de busca."""
+        while not self.errors.empty():
+            messagebox.showerror(*self.errors.get())
+        self.root.after(100, self.show_pending_errors)
 
     def check_directories(self, persons_dir, search_dir, output_dir):
         """Verifica se os diretórios selecionados são válidos e diferentes entre si."""
@@ -140,53 +148,16 @@ class PhotoSearchGUI:
 
     def search_photos(self, persons_dir, search_dir, output_dir):
         # Procura por fotos nas imagens de referência e cria descritores faciais.
-        # Realiza a busca nas imagens do diretório de busca e salva no diretório de saída.
-
-        # verifica se a pasta de referência de pessoas existe
-        if not os.path.exists(persons_dir):
-            tk.messagebox.showerror(
-                "Directory not found", "The persons directory was not found.")
-            return
-
-        # verifica se a pasta de busca existe
-        if not os.path.exists(search_dir):
-            tk.messagebox.showerror(
-                "Directory not found", "The search directory was not found.")
-            return
-
-        # verifica se a pasta de saída existe, senão, a cria
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-
-        # lê todas as imagens de referência e cria os descritores faciais
-        for root, dirs, files in os.walk(persons_dir):
-            for file in files:
-                if file.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    file_path = os.path.join(root, file)
-                    img = dlib.load_rgb_image(file_path)
-                    dets = self.detector(img, 1)
-
-                    for det in dets:
-                        shape = self.sp(img, det)
-                        face_descriptor = self.facerec.compute_face_descriptor(
-                            img, shape)
-                        person_name = os.path.basename(file).split('.')[0]
-                        face_dict[person_name] = face_descriptor
-
-        threshold = self.threshold_var.get()
-
-        # Cria uma lista de todos os arquivos para processamento
-        all_files = []
-        for root, dirs, files in os.walk(search_dir):
-            for file in files:
-                if file.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    file_path = os.path.join(root, file)
-                    all_files.append(
-                        (file_path, persons_dir, output_dir, self.detector, self.sp, face_dict, threshold))
-
-        with Pool(cpu_count()) as p:
-            list(tqdm(p.imap(process_image_function, all_files),
-                 total=len(all_files), ncols=70, desc="Processing Images"))
+        # Realiza a busca nas imagens e vídeos do diretório de busca e salva no diretório de saída.
+        try:
+            return self.engine().run_job(
+                'search', persons_dir=persons_dir, search_dir=search_dir, output_dir=output_dir,
+                threshold=self.threshold_var.get(), min_face_size=self.min_face_size_var.get(),
+                batch_size=self.batch_size_var.get(), incremental=self.incremental_var.get(),
+                dedup=self.dedup_var.get(), output_mode=self.output_mode_var.get(),
+                video={} if self.videos_var.get() else None)
+        except Exception as e:
+            self.print_error('Erro ao buscar fotos', str(e))
 
     def create_widgets(self):
         """Cria os widgets (labels, botões, etc.) do GUI."""
@@ -215,6 +186,27 @@ class PhotoSearchGUI:
             self.root, textvariable=self.output_dir_var)
         self.output_dir_button = tk.Button(
             self.root, text='Selecionar', command=self.select_output_dir)
+        self.min_face_size_label = tk.Label(
+            self.root, text='Menor rosto procurado (px, 0 = resolução total):')
+        self.min_face_size_spinbox = tk.Spinbox(
+            self.root, from_=0, to=1000, increment=10, textvariable=self.min_face_size_var)
+
+        self.batch_size_label = tk.Label(
+            self.root, text='Rostos por lote de descritores:')
+        self.batch_size_spinbox = tk.Spinbox(
+            self.root, from_=1, to=256, textvariable=self.batch_size_var)
+
+        self.output_mode_label = tk.Label(
+            self.root, text='Modo de saída:')
+        self.output_mode_menu = tk.OptionMenu(
+            self.root, self.output_mode_var, *OUTPUT_MODES)
+
+        self.dedup_check = tk.Checkbutton(
+            self.root, text='Pular fotos duplicadas (reaproveita o resultado da original)', variable=self.dedup_var)
+        self.incremental_check = tk.Checkbutton(
+            self.root, text='Busca incremental (pular fotos já processadas)', variable=self.incremental_var)
+        self.videos_check = tk.Checkbutton(
+            self.root, text='Incluir vídeos (processados de novo a cada busca)', variable=self.videos_var)
         self.run_button = tk.Button(
             self.root, text='Iniciar busca', command=self.run)
 
@@ -242,41 +234,35 @@ class PhotoSearchGUI:
         self.output_dir_button.grid(
             row=2, column=2, sticky='e', padx=5, pady=5)
 
-        self.run_button.grid(row=3, column=0, columnspan=3, pady=5)
-
-    def mainloop(self):
-        """Inicia o loop principal da janela."""
-        self.root.mainloop()
+        self.min_face_size_label.grid(
+            row=6, column=0, sticky='w', padx=5, pady=5)
+        self.min_face_size_spinbox.grid(
+            row=6, column=1, sticky='we', padx=5, pady=5)
 
+        self.batch_size_label.grid(
+            row=7, column=0, sticky='w', padx=5, pady=5)
+        self.batch_size_spinbox.grid(
+            row=7, column=1, sticky='we', padx=5, pady=5)
 
-def process_image_function(args):
-    """Processa uma imagem, detecta rostos e, se correspondem a algum rosto de referência, copia a imagem para o diretório de saída."""
-    file_path, persons_dir, output_dir, detector, sp, face_dict, threshold = args
+        self.output_mode_label.grid(
+            row=8, column=0, sticky='w', padx=5, pady=5)
+        self.output_mode_menu.grid(
+            row=8, column=1, sticky='we', padx=5, pady=5)
 
-    facerec = dlib.face_recognition_model_v1(
-        "dlib_face_recognition_resnet_model_v1.dat")
+        self.incremental_check.grid(
+            row=5, column=0, columnspan=3, sticky='w', padx=5, pady=5)
 
-    img = dlib.load_rgb_image(file_path)
-    dets = detector(img, 1)
-    if len(dets) == 0:
-        return
+        self.dedup_check.grid(
+            row=9, column=0, columnspan=3, sticky='w', padx=5, pady=5)
 
-    for det in dets:
-        shape = sp(img, det)
-        face_descriptor = facerec.compute_face_descriptor(img, shape)
+        self.videos_check.grid(
+            row=10, column=0, columnspan=3, sticky='w', padx=5, pady=5)
 
-        for person, reference_descriptor in face_dict.items():
-            dist = np.linalg.norm(
-                np.array(face_descriptor) - np.array(reference_descriptor))
-            if dist < threshold:
-                save_folder = os.path.join(output_dir, person)
-                if not os.path.exists(save_folder):
-                    os.makedirs(save_folder)
+        self.run_button.grid(row=3, column=0, columnspan=3, pady=5)
 
-                file_name = os.path.basename(file_path)
-                save_path = os.path.join(save_folder, file_name)
-                shutil.copyfile(file_path, save_path)
-                break
+    def mainloop(self):
+        """Inicia o loop principal da janela."""
+        self.root.mainloop()
 
 
 if __name__ == '__main__':
@@ -1,10 +1,17 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import os
+import queue
 import cv2
 import numpy as np
 import dlib
 import threading
+from multiprocessing import cpu_count
+from face_clustering import FaceClusters  # noqa: F401 (reexportado para quem importava daqui)
+from face_daemon import EngineClient
+from face_embedding import DEFAULT_BATCH_SIZE
+
+RECOGNITION_MODEL_PATH = 'dlib_face_recognition_resnet_model_v1.dat'
 
 
 class PhotoSeparatorGUI:
@@ -22,17 +29,38 @@ class PhotoSeparatorGUI:
         # Inicializa as variáveis de diretório
         self.input_dir_var = tk.StringVar()
         self.output_dir_var = tk.StringVar()
+        self.workers_var = tk.IntVar(value=cpu_count())
+        self.batch_var = tk.BooleanVar(value=False)
+        self.min_face_size_var = tk.IntVar(value=0)
+        self.batch_size_var = tk.IntVar(value=DEFAULT_BATCH_SIZE)
+        self.videos_var = tk.BooleanVar(value=False)
+
+        # Modelos carregados só quando usados; a separação roda no motor (ver face_engine).
+        self.facerec = None
+        self.local_engine = None
+
+        # Erros da thread de separação são exibidos pela thread da interface.
+        self.errors = queue.Queue()
 
         # Cria e organiza os widgets na janela
         self.create_widgets()
         self.arrange_widgets()
-
-        try:
-            self.facerec = dlib.face_recognition_model_v1(
-                os.path.join('dlib_face_recognition_resnet_model_v1.dat'))
-        except Exception as e:
-            self.print_error(
-                'Erro ao carregar modelo de reconhecimento facial', str(e))
+        self.root.after(100, self.show_pending_errors)
+
+    def engine(self, faces_dir, workers=None):
+        """Usa o serviço de face_daemon se estiver rodando com os mesmos processos e modelos;
+        senão, um motor local que mantém os modelos carregados entre uma separação e outra."""
+        workers = workers or cpu_count()
+        shape_predictor_path = os.path.join(faces_dir, 'shape_predictor_68_face_landmarks.dat')
+        client = EngineClient()
+        if client.available(workers, shape_predictor_path):
+            return client
+        if self.local_engine is None or self.local_engine.workers != workers:
+            from face_engine import FaceEngine
+            if self.local_engine is not None:
+                self.local_engine.close()
+            self.local_engine = FaceEngine(workers=workers, shape_predictor_path=shape_predictor_path)
+        return self.local_engine
 
     def select_input_dir(self):
         """Seleciona diretório de entrada"""
@@ -65,15 +93,26 @@ class PhotoSeparatorGUI:
 
         try:
             threading.Thread(target=self.separate_photos, args=(
-                input_dir, output_dir, faces_dir)).start()
+                input_dir, output_dir, faces_dir, self.workers_var.get(), self.batch_var.get(),
+                self.min_face_size_var.get(), self.batch_size_var.get(), self.videos_var.get())).start()
             print('Finalizou a separação corretamente.')
         except Exception as e:
             self.print_error('Erro ao executar separação de fotos', str(e))
 
     def print_error(self, title, message):
-        """Imprime uma mensagem de erro."""
-        messagebox.showerror(title, message)
+        """Imprime uma mensagem de erro.
+        Fora da thread da interface, a mensagem espera por show_pending_errors."""
         print(f'{title}: {message}')
+        if threading.current_thread() is threading.main_thread():
+            messagebox.showerror(title, message)
+        else:
+            self.errors.put((title, message))
+
+    def show_pending_errors(self):
+        """Exibe, na thread da interface, os erros vindos da thread de separação."""
+        while not self.errors.empty():
+            messagebox.showerror(*self.errors.get())
+        self.root.after(100, self.show_pending_errors)
 
     def check_directories(self, input_dir, output_dir, faces_dir):
         """Verifica se os diretórios foram selecionados, se são distintos e se são válidos."""
@@ -105,76 +144,32 @@ class PhotoSeparatorGUI:
             self.print_error('Erro ao verificar os diretórios', str(e))
             return False
 
-    def separate_photos(self, input_dir, output_dir, faces_dir):
-        """Separa as fotos de cada rosto em pastas diferentes utilizando a IA."""
+    def separate_photos(self, input_dir, output_dir, faces_dir, workers=None, batch=False, min_face_size=0,
+                        batch_size=DEFAULT_BATCH_SIZE, videos=False):
+        """Separa as fotos de cada rosto em pastas diferentes utilizando a IA (ver FaceEngine.separate)."""
         try:
-            detector = dlib.get_frontal_face_detector()
-            sp = dlib.shape_predictor(os.path.join(
-                faces_dir, 'shape_predictor_68_face_landmarks.dat'))
-
-            face_dict = {}
-            folder_counter = 0
-
-            for root, dirs, files in os.walk(input_dir):
-                for file in files:
-                    if file.endswith(".jpg") or file.endswith(".jpeg") or file.endswith(".png"):
-                        input_file_path = os.path.join(root, file)
-                        img = dlib.load_rgb_image(input_file_path)
-                        dets = detector(img, 1)
-
-                        if len(dets) > 0:
-                            full_detections = dlib.full_object_detections()
-
-                            for k, d in enumerate(dets):
-                                shape = sp(img, d)
-                                full_detection = dlib.full_object_detection(
-                                    d, shape.parts())
-                                full_detections.append(full_detection)
-
-                            for detection in full_detections:
-                                face_chip_150 = dlib.get_face_chip(
-                                    img, detection, size=150, padding=0.25)
-
-                                found_similar_face = False
-                                for folder_name, reference_face in face_dict.items():
-                                    if self.compare_faces(reference_face, face_chip_150):
-                                        found_similar_face = True
-                                        break
-
-                                if not found_similar_face:
-                                    folder_counter += 1
-                                    folder_name = f'Person_{folder_counter}'
-                                    face_dict[folder_name] = face_chip_150
-
-                                person_folder_path = os.path.join(
-                                    output_dir, folder_name)
-                                if not os.path.exists(person_folder_path):
-                                    os.makedirs(person_folder_path)
-
-                                output_file_path = os.path.join(
-                                    person_folder_path, f"{os.path.splitext(file)[0]}_face_{detection.rect.left()}_{detection.rect.top()}{os.path.splitext(file)[1]}")
-                                dlib.save_image(
-                                    face_chip_150, output_file_path)
-                                print('\033[1;49;32m' +
-                                      f'Face found in {file}!!' + '\033[m')
-                        else:
-                            print('\033[1;49;31m' +
-                                  f"No face detected in {file}" + '\033[m')
+            return self.engine(faces_dir, workers).run_job(
+                'separate', input_dir=input_dir, output_dir=output_dir, batch=batch,
+                min_face_size=min_face_size, batch_size=batch_size, video={} if videos else None)
         except Exception as e:
             self.print_error('Erro ao separar fotos', str(e))
 
+    def compute_descriptor(self, face_chip):
+        """Calcula o descritor de 128 dimensões de um recorte de rosto alinhado."""
+        if self.facerec is None:
+            self.facerec = dlib.face_recognition_model_v1(
+                RECOGNITION_MODEL_PATH)
+        descriptor = self.facerec.compute_face_descriptor(
+            cv2.resize(face_chip, (150, 150)))
+        return np.asarray(descriptor, dtype=np.float32)
+
     def compare_faces(self, face1, face2, threshold=0.6):
         """Compara duas faces usando o modelo de reconhecimento facial."""
         try:
-            resized_face1 = cv2.resize(face1, (150, 150))
-            resized_face2 = cv2.resize(face2, (150, 150))
-            face1_descriptor = self.facerec.compute_face_descriptor(
-                resized_face1)
-            face2_descriptor = self.facerec.compute_face_descriptor(
-                resized_face2)
-
-            distance = np.linalg.norm(
-                np.array(face1_descriptor) - np.array(face2_descriptor))
+            face1_descriptor = self.compute_descriptor(face1)
+            face2_descriptor = self.compute_descriptor(face2)
+
+            distance = np.linalg.norm(face1_descriptor - face2_descriptor)
             return distance < threshold
         except Exception as e:
             self.print_error('Erro ao comparar faces', str(e))
@@ -195,6 +190,27 @@ class PhotoSeparatorGUI:
         self.output_dir_button = tk.Button(
             self.root, text='Selecionar', command=self.select_output_dir)
 
+        self.workers_label = tk.Label(
+            self.root, text='Processos em paralelo:')
+        self.workers_spinbox = tk.Spinbox(
+            self.root, from_=1, to=cpu_count(), textvariable=self.workers_var, width=5)
+
+        self.min_face_size_label = tk.Label(
+            self.root, text='Menor rosto procurado (px, 0 = resolução total):')
+        self.min_face_size_spinbox = tk.Spinbox(
+            self.root, from_=0, to=1000, increment=10, textvariable=self.min_face_size_var, width=5)
+
+        self.batch_size_label = tk.Label(
+            self.root, text='Rostos por lote de descritores:')
+        self.batch_size_spinbox = tk.Spinbox(
+            self.root, from_=1, to=256, textvariable=self.batch_size_var, width=5)
+
+        self.batch_check = tk.Checkbutton(
+            self.root, text='Agrupar todas as fotos de uma vez (independe da ordem)', variable=self.batch_var)
+
+        self.videos_check = tk.Checkbutton(
+            self.root, text='Incluir vídeos', variable=self.videos_var)
+
         self.run_button = tk.Button(
             self.root, text='Executar', command=self.run)
 
@@ -211,6 +227,27 @@ class PhotoSeparatorGUI:
             row=1, column=1, padx=10, pady=10, sticky=tk.W + tk.E)
         self.output_dir_button.grid(row=1, column=2, padx=10, pady=10)
 
+        self.workers_label.grid(
+            row=2, column=0, padx=10, pady=10, sticky=tk.W)
+        self.workers_spinbox.grid(
+            row=2, column=1, padx=10, pady=10, sticky=tk.W)
+
+        self.min_face_size_label.grid(
+            row=5, column=0, padx=10, pady=10, sticky=tk.W)
+        self.min_face_size_spinbox.grid(
+            row=5, column=1, padx=10, pady=10, sticky=tk.W)
+
+        self.batch_size_label.grid(
+            row=6, column=0, padx=10, pady=10, sticky=tk.W)
+        self.batch_size_spinbox.grid(
+            row=6, column=1, padx=10, pady=10, sticky=tk.W)
+
+        self.batch_check.grid(
+            row=4, column=0, columnspan=3, padx=10, pady=10, sticky=tk.W)
+
+        self.videos_check.grid(
+            row=7, column=0, columnspan=3, padx=10, pady=10, sticky=tk.W)
+
         self.run_button.grid(row=3, column=1, padx=10, pady=10)
 
     def mainloop(self):
@@ -0,0 +1,141 @@
+import json
+import os
+import sqlite3
+import threading
+import uuid
+import numpy as np
+from face_database import MODEL_VERSION, file_hash
+
+MANIFEST_NAME = '.search-manifest.db'
+
+PENDING = 'pending'
+STALE = 'stale'
+UNCHANGED = 'unchanged'
+
+
+class SearchManifest:
+    """
+    Manifesto em disco das imagens já processadas pela busca.
+    Guarda caminho, tamanho, data de modificação, hash do conteúdo,
+    descritores dos rostos e as pessoas encontradas em cada imagem.
+    Pode ser usado por várias threads do pipeline de busca.
+    """
+
+    def __init__(self, path, model_version=MODEL_VERSION):
+        self.path = path
+        self.lock = threading.RLock()
+        # Cada instância é uma varredura; imagens não vistas nela saem com remove_unseen.
+        self.scan_id = uuid.uuid4().hex
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute('''CREATE TABLE IF NOT EXISTS Files (
+                Path TEXT PRIMARY KEY,
+                Size INTEGER,
+                MTime REAL,
+                FileHash TEXT,
+                Descriptors BLOB,
+                Matches TEXT,
+                MatchKey TEXT
+            )''')
+            columns = {row[1] for row in self.connection.execute(
+                'PRAGMA table_info(Files)')}
+            if 'ScanId' not in columns:
+                self.connection.execute(
+                    'ALTER TABLE Files ADD COLUMN ScanId TEXT')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS Meta (Key TEXT PRIMARY KEY, Value TEXT)')
+            stored = self.connection.execute(
+                "SELECT Value FROM Meta WHERE Key = 'ModelVersion'").fetchone()
+            if stored is None or stored[0] != model_version:
+                # Descritores de outro modelo não servem: recomeça do zero.
+                self.connection.execute('DELETE FROM Files')
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO Meta VALUES ('ModelVersion', ?)", (model_version,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        with self.lock:
+            self.connection.commit()
+            self.connection.close()
+
+    def classify(self, file_path, match_key):
+        """
+        Classifica uma imagem como PENDING (nova ou alterada, precisa ser processada),
+        STALE (inalterada, mas comparada com outra galeria ou limiar: recompara a partir
+        dos descritores salvos) ou UNCHANGED. Marca a imagem como vista nesta varredura.
+        """
+        path = os.path.abspath(file_path)
+        with self.lock:
+            entry = self.connection.execute('SELECT Size, MTime, FileHash, MatchKey FROM Files WHERE Path = ?',
+                                            (path,)).fetchone()
+            if entry is None:
+                return PENDING
+
+            size, mtime, stored_hash, stored_key = entry
+            stat = os.stat(file_path)
+            if (stat.st_size, stat.st_mtime) != (size, mtime):
+                # Só a data mudou? Confere o conteúdo antes de reprocessar.
+                if stat.st_size != size or file_hash(file_path) != stored_hash:
+                    return PENDING
+            self.connection.execute('UPDATE Files SET Size = ?, MTime = ?, ScanId = ? WHERE Path = ?',
+                                    (stat.st_size, stat.st_mtime, self.scan_id, path))
+            return UNCHANGED if stored_key == match_key else STALE
+
+    def remove_unseen(self):
+        """Remove do manifesto as imagens que não apareceram nesta varredura."""
+        with self.lock, self.connection:
+            self.connection.execute(
+                'DELETE FROM Files WHERE ScanId IS NOT ?', (self.scan_id,))
+
+    def descriptors(self, file_path):
+        """Retorna os descritores salvos de uma imagem como matriz float32 (rostos, 128)."""
+        with self.lock:
+            blob = self.connection.execute('SELECT Descriptors FROM Files WHERE Path = ?',
+                                           (os.path.abspath(file_path),)).fetchone()[0]
+        return np.frombuffer(blob, dtype=np.float32).reshape(-1, 128)
+
+    def stored_hash(self, file_path):
+        """Retorna o hash do conteúdo gravado de uma imagem, ou None se ela não está no manifesto."""
+        with self.lock:
+            row = self.connection.execute('SELECT FileHash FROM Files WHERE Path = ?',
+                                          (os.path.abspath(file_path),)).fetchone()
+        return row[0] if row else None
+
+    def matches(self, file_path):
+        """Retorna as pessoas encontradas anteriormente em uma imagem."""
+        with self.lock:
+            row = self.connection.execute('SELECT Matches FROM Files WHERE Path = ?',
+                                          (os.path.abspath(file_path),)).fetchone()
+        return json.loads(row[0]) if row and row[0] else []
+
+    def entries(self):
+        """Gera (caminho, hash do conteúdo, pessoas) de cada imagem do manifesto, em ordem de caminho."""
+        with self.lock:
+            rows = self.connection.execute('SELECT Path, FileHash, Matches FROM Files ORDER BY Path').fetchall()
+        for path, file_hash_value, matches in rows:
+            yield path, file_hash_value, json.loads(matches) if matches else []
+
+    def record(self, file_path, file_hash_value, descriptors, persons, match_key):
+        """Grava o resultado do processamento completo de uma imagem."""
+        stat = os.stat(file_path)
+        blob = np.asarray(descriptors, dtype=np.float32).reshape(-1, 128).tobytes()
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO Files VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                    (os.path.abspath(file_path), stat.st_size, stat.st_mtime,
+                                     file_hash_value, blob, json.dumps(sorted(persons)), match_key,
+                                     self.scan_id))
+
+    def update_matches(self, file_path, persons, match_key):
+        """Atualiza apenas as pessoas encontradas após uma recomparação."""
+        with self.lock:
+            self.connection.execute('UPDATE Files SET Matches = ?, MatchKey = ? WHERE Path = ?',
+                                    (json.dumps(sorted(persons)), match_key, os.path.abspath(file_path)))
+
+    def commit(self):
+        with self.lock:
+            self.connection.commit()
@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from search_manifest import PENDING, STALE, UNCHANGED, SearchManifest
+
+
+class TestSearchManifest(unittest.TestCase):
+    """
+    Testes para o manifesto da busca incremental.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.files = []
+        for name in ['a.jpg', 'b.jpg', 'c.jpg']:
+            path = os.path.join(self.temp_dir, name)
+            with open(path, 'wb') as f:
+                f.write(name.encode())
+            self.files.append(path)
+        self.manifest = SearchManifest(
+            os.path.join(self.temp_dir, 'manifest.db'))
+        for path in self.files:
+            self.manifest.record(path, 'hash', np.zeros((1, 128)), ['Ana'], 'key')
+
+    def tearDown(self):
+        self.manifest.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_unchanged_files_are_skipped(self):
+        # Nada a processar quando arquivos, galeria e limiar não mudaram
+        self.assertEqual([self.manifest.classify(path, 'key') for path in self.files], [UNCHANGED] * 3)
+
+    def test_new_changed_and_removed_files(self):
+        # Arquivos alterados ou novos são processados e os que não foram vistos saem do manifesto
+        with open(self.files[0], 'ab') as f:
+            f.write(b'!')
+        new_file = os.path.join(self.temp_dir, 'd.jpg')
+        open(new_file, 'wb').close()
+
+        # Cada busca abre o manifesto de novo, começando uma nova varredura
+        self.manifest.close()
+        self.manifest = SearchManifest(os.path.join(self.temp_dir, 'manifest.db'))
+        states = [self.manifest.classify(path, 'key') for path in (self.files[0], self.files[1], new_file)]
+        self.assertEqual(states, [PENDING, UNCHANGED, PENDING])
+        self.manifest.record(new_file, 'hash', np.zeros((0, 128)), [], 'key')
+        self.manifest.remove_unseen()
+        self.assertEqual(self.manifest.matches(self.files[1]), ['Ana'])
+        self.assertEqual(self.manifest.matches(new_file), [])
+        self.assertIsNone(self.manifest.stored_hash(self.files[2]))
+
+    def test_new_key_rematches(self):
+        # Outra galeria ou limiar só exige recomparar os descritores salvos
+        self.assertEqual([self.manifest.classify(path, 'other') for path in self.files], [STALE] * 3)
+        self.assertEqual(self.manifest.descriptors(self.files[0]).shape, (1, 128))
+
+
+if __name__ == '__main__':
+    unittest.main()
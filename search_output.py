@@ -0,0 +1,214 @@
+import csv
+import errno
+import os
+import shutil
+import threading
+from face_database import file_hash
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+COPY = 'copy'
+HARDLINK = 'hardlink'
+SYMLINK = 'symlink'
+REFLINK = 'reflink'
+MANIFEST_ONLY = 'manifest'
+
+OUTPUT_MODES = (COPY, HARDLINK, SYMLINK, REFLINK, MANIFEST_ONLY)
+
+# Índice gravado no diretório de saída pelo modo MANIFEST_ONLY.
+INDEX_NAME = 'matches.csv'
+
+# ioctl FICLONE do Linux (btrfs, XFS, ...): clona o arquivo compartilhando os blocos.
+FICLONE = 0x40049409
+
+# Erros que indicam que o sistema de arquivos não suporta o link; cai para cópia.
+_UNSUPPORTED = (errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EPERM)
+
+
+def reflink(source, destination):
+    """Cria destination como clone copy-on-write de source. Lança OSError se não suportado."""
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, 'reflink não suportado nesta plataforma')
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.remove(destination)
+            raise
+
+
+class SearchOutput:
+    """
+    Coloca as imagens encontradas nas pastas de cada pessoa do diretório de saída.
+
+    Uma foto com várias pessoas aparece uma vez na pasta de cada uma; nos modos
+    HARDLINK, SYMLINK e REFLINK essas entradas não ocupam espaço extra. O modo
+    MANIFEST_ONLY não cria arquivos, só grava (pessoa, caminho, hash) em INDEX_NAME.
+    Destinos que já existem com o mesmo conteúdo são pulados; um arquivo diferente
+    com o mesmo nome recebe o início do hash no nome em vez de ser sobrescrito.
+    """
+
+    def __init__(self, output_dir, mode=COPY):
+        if mode not in OUTPUT_MODES:
+            raise ValueError(f'Modo de saída desconhecido: {mode}')
+        self.output_dir = output_dir
+        self.mode = mode
+        self.lock = threading.Lock()
+        self.counts = {'placed': 0, 'identical': 0, 'fallback': 0, 'removed': 0}
+        self.index_file = None
+        if mode == MANIFEST_ONLY:
+            index_path = os.path.join(output_dir, INDEX_NAME)
+            self.indexed = set()
+            if os.path.exists(index_path):
+                with open(index_path, newline='', encoding='utf-8') as f:
+                    self.indexed = {(row['person'], row['file_path'])
+                                    for row in csv.DictReader(f)}
+            new_file = not self.indexed and not os.path.exists(index_path)
+            self.index_file = open(index_path, 'a', newline='', encoding='utf-8')
+            self.index_writer = csv.writer(self.index_file)
+            if new_file:
+                self.index_writer.writerow(['person', 'file_path', 'file_hash'])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def flush(self):
+        """Grava no disco as linhas pendentes do índice (modo MANIFEST_ONLY)."""
+        with self.lock:
+            if self.index_file is not None:
+                self.index_file.flush()
+                os.fsync(self.index_file.fileno())
+
+    def close(self):
+        if self.index_file is not None:
+            self.index_file.close()
+            self.index_file = None
+
+    def rewrite_index(self, entries):
+        """
+        Substitui o índice (modo MANIFEST_ONLY) pelas correspondências de entries, tuplas
+        (caminho, hash, pessoas) como as de SearchManifest.entries. O índice só recebe linhas
+        novas durante a busca; isto descarta as de pessoas que uma recomparação deixou de
+        encontrar e as de imagens que sumiram.
+        """
+        with self.lock:
+            index_path = os.path.join(self.output_dir, INDEX_NAME)
+            temporary_path = f'{index_path}.tmp'
+            indexed = set()
+            with open(temporary_path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['person', 'file_path', 'file_hash'])
+                for file_path, file_hash_value, persons in entries:
+                    for person in sorted(persons):
+                        writer.writerow([person, file_path, file_hash_value])
+                        indexed.add((person, file_path))
+            if self.index_file is not None:
+                self.index_file.close()
+            os.replace(temporary_path, index_path)
+            self.indexed = indexed
+            self.index_file = open(index_path, 'a', newline='', encoding='utf-8')
+            self.index_writer = csv.writer(self.index_file)
+
+    def place(self, file_path, persons, file_hash_value=None):
+        """Coloca a imagem na pasta de cada pessoa encontrada nela."""
+        for person in sorted(persons):
+            if self.mode == MANIFEST_ONLY:
+                self._index(person, file_path, file_hash_value)
+                continue
+
+            save_folder = os.path.join(self.output_dir, person)
+            os.makedirs(save_folder, exist_ok=True)
+            save_path = os.path.join(save_folder, os.path.basename(file_path))
+            if os.path.lexists(save_path):
+                if file_hash_value is None:
+                    file_hash_value = file_hash(file_path)
+                if self._same_file(file_path, save_path, file_hash_value):
+                    self.count('identical')
+                    continue
+                # Outro arquivo com o mesmo nome (de outra subpasta da busca).
+                name, extension = os.path.splitext(save_path)
+                save_path = f'{name}_{file_hash_value[:8]}{extension}'
+                if os.path.lexists(save_path):
+                    self.count('identical')
+                    continue
+            self._link(file_path, save_path)
+            self.count('placed')
+
+    def remove(self, file_path, persons, file_hash_value=None):
+        """
+        Retira a imagem das pastas das pessoas que deixaram de ser encontradas nela (ex.: depois
+        de uma recomparação com outra galeria). Só apaga entradas com o nome dado por place e com
+        o conteúdo file_hash_value (por padrão o atual; o antigo quando a imagem mudou depois de
+        colocada); outros arquivos dessas pastas ficam.
+        """
+        for person in sorted(persons):
+            if self.mode == MANIFEST_ONLY:
+                with self.lock:
+                    self.indexed.discard((person, os.path.abspath(file_path)))
+                continue
+
+            save_path = os.path.join(self.output_dir, person, os.path.basename(file_path))
+            if not os.path.lexists(save_path):
+                continue
+            if file_hash_value is None:
+                file_hash_value = file_hash(file_path)
+            name, extension = os.path.splitext(save_path)
+            for candidate in (save_path, f'{name}_{file_hash_value[:8]}{extension}'):
+                if os.path.lexists(candidate) and self._placed(file_path, candidate, file_hash_value):
+                    os.remove(candidate)
+                    self.count('removed')
+                    break
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.counts[key] += amount
+
+    def _index(self, person, file_path, file_hash_value):
+        path = os.path.abspath(file_path)
+        with self.lock:
+            if (person, path) in self.indexed:
+                self.counts['identical'] += 1
+                return
+            self.indexed.add((person, path))
+            self.index_writer.writerow(
+                [person, path, file_hash_value or file_hash(file_path)])
+            self.counts['placed'] += 1
+
+    def _same_file(self, source, destination, source_hash):
+        if os.path.islink(destination):
+            return os.path.realpath(destination) == os.path.realpath(source)
+        if os.path.samefile(source, destination):
+            return True
+        return (os.path.getsize(source) == os.path.getsize(destination)
+                and file_hash(destination) == source_hash)
+
+    def _placed(self, source, destination, placed_hash):
+        # Como _same_file, mas sem comparar tamanhos: a origem pode ter mudado depois de colocada.
+        if os.path.islink(destination):
+            return os.path.realpath(destination) == os.path.realpath(source)
+        return os.path.samefile(source, destination) or file_hash(destination) == placed_hash
+
+    def _link(self, source, destination):
+        try:
+            if self.mode == HARDLINK:
+                os.link(source, destination)
+                return
+            if self.mode == SYMLINK:
+                os.symlink(os.path.abspath(source), destination)
+                return
+            if self.mode == REFLINK:
+                reflink(source, destination)
+                return
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+            # Sistema de arquivos sem suporte ao link pedido: copia.
+            self.count('fallback')
+        shutil.copyfile(source, destination)
@@ -0,0 +1,97 @@
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+from search_output import COPY, HARDLINK, INDEX_NAME, MANIFEST_ONLY, REFLINK, SYMLINK, SearchOutput
+
+
+class TestSearchOutput(unittest.TestCase):
+    """
+    Testes para os modos de saída da busca.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.temp_dir, 'saida')
+        os.makedirs(os.path.join(self.temp_dir, 'sub'))
+        os.makedirs(self.output_dir)
+        self.photo = self.write('foto.jpg', b'conteudo')
+        self.other = self.write(os.path.join('sub', 'foto.jpg'), b'outro conteudo')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, name, data):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def saved(self, person, name='foto.jpg'):
+        return os.path.join(self.output_dir, person, name)
+
+    def test_multi_person_photo_goes_to_each_folder(self):
+        # A mesma foto vai uma vez para a pasta de cada pessoa
+        output = SearchOutput(self.output_dir, COPY)
+        output.place(self.photo, ['Ana', 'Bruno'])
+        for person in ('Ana', 'Bruno'):
+            with open(self.saved(person), 'rb') as f:
+                self.assertEqual(f.read(), b'conteudo')
+        self.assertEqual(output.counts['placed'], 2)
+
+    def test_identical_destination_is_skipped(self):
+        # Rodar de novo não copia nada; um arquivo diferente com o mesmo nome não é sobrescrito
+        SearchOutput(self.output_dir, COPY).place(self.photo, ['Ana'])
+        output = SearchOutput(self.output_dir, COPY)
+        output.place(self.photo, ['Ana'])
+        self.assertEqual(output.counts, {'placed': 0, 'identical': 1, 'fallback': 0, 'removed': 0})
+
+        output.place(self.other, ['Ana'])
+        self.assertEqual(len(os.listdir(os.path.join(self.output_dir, 'Ana'))), 2)
+        with open(self.saved('Ana'), 'rb') as f:
+            self.assertEqual(f.read(), b'conteudo')
+
+    def test_remove_only_deletes_this_photo(self):
+        # Retirar a foto de uma pasta não apaga outra foto com o mesmo nome
+        output = SearchOutput(self.output_dir, COPY)
+        output.place(self.photo, ['Ana', 'Bruno'])
+        output.place(self.other, ['Ana'])
+        output.remove(self.other, ['Ana', 'Bruno'])
+        self.assertEqual(os.listdir(os.path.join(self.output_dir, 'Ana')), ['foto.jpg'])
+        output.remove(self.photo, ['Ana'])
+        self.assertEqual(os.listdir(os.path.join(self.output_dir, 'Ana')), [])
+        self.assertTrue(os.path.exists(self.saved('Bruno')))
+        self.assertEqual(output.counts['removed'], 2)
+
+    def test_links(self):
+        SearchOutput(self.output_dir, HARDLINK).place(self.photo, ['Ana'])
+        self.assertTrue(os.path.samefile(self.photo, self.saved('Ana')))
+        SearchOutput(self.output_dir, SYMLINK).place(self.photo, ['Bruno'])
+        self.assertTrue(os.path.islink(self.saved('Bruno')))
+        self.assertEqual(os.path.realpath(self.saved('Bruno')), os.path.realpath(self.photo))
+
+    def test_reflink_falls_back_to_copy(self):
+        # Sem suporte a reflink o conteúdo ainda chega ao destino
+        output = SearchOutput(self.output_dir, REFLINK)
+        output.place(self.photo, ['Ana'])
+        with open(self.saved('Ana'), 'rb') as f:
+            self.assertEqual(f.read(), b'conteudo')
+        self.assertEqual(output.counts['placed'], 1)
+
+    def test_manifest_only_writes_index(self):
+        # O modo manifesto não cria arquivos e não repete entradas entre execuções
+        with SearchOutput(self.output_dir, MANIFEST_ONLY) as output:
+            output.place(self.photo, ['Ana', 'Bruno'], 'abc')
+        with SearchOutput(self.output_dir, MANIFEST_ONLY) as output:
+            output.place(self.photo, ['Ana'], 'abc')
+            output.place(self.other, ['Ana'])
+        self.assertEqual(os.listdir(self.output_dir), [INDEX_NAME])
+        with open(os.path.join(self.output_dir, INDEX_NAME), newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([row['person'] for row in rows], ['Ana', 'Bruno', 'Ana'])
+        self.assertEqual(rows[0]['file_hash'], 'abc')
+
+
+if __name__ == '__main__':
+    unittest.main()
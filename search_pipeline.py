@@ -0,0 +1,355 @@
+import hashlib
+import os
+import queue
+import threading
+from collections import Counter, OrderedDict
+import numpy as np
+from image_loader import oriented_size
+from metrics import Metrics
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Marcador de fim de fluxo entre os estágios.
+_DONE = object()
+
+# Resultados de canônicas guardados para as duplicatas que ainda chegarem; além disso, a
+# duplicata de uma canônica esquecida é processada como uma imagem nova.
+RETAINED_RESULTS = 4096
+
+# Campos do resultado que só dizem respeito ao processamento da própria imagem.
+_WORKER_FIELDS = ('pid', 'load_time', 'elapsed', 'metrics')
+
+# Intervalo (s) em que os estágios bloqueados numa fila verificam se run() foi abandonado.
+_STOP_POLL = 0.1
+
+
+def scan_images(search_dir, extensions=IMAGE_EXTENSIONS):
+    """Percorre o diretório de busca sob demanda, em ordem, gerando o caminho de cada imagem."""
+    for root, dirs, files in os.walk(search_dir):
+        dirs.sort()
+        for file in sorted(files):
+            if file.lower().endswith(extensions):
+                yield os.path.join(root, file)
+
+
+def read_file(file_path, hash_file=True):
+    """Lê o arquivo uma única vez e retorna (conteúdo, hash SHA-1 do conteúdo ou None sem hash_file)."""
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    return data, hashlib.sha1(data).hexdigest() if hash_file else None
+
+
+def duplicate_result(result, file_path, file_hash_value, canonical, size=None, canonical_size=None):
+    """
+    Resultado de uma duplicata: o mesmo da imagem canônica, sem tempo de processamento.
+    Os retângulos dos rostos são levados do tamanho (largura, altura) da canônica para o da
+    duplicata, que pode ser uma cópia redimensionada.
+    """
+    duplicate = dict(result, file_path=file_path, file_hash=file_hash_value,
+                     elapsed=0.0, duplicate_of=canonical)
+    if 'boxes' in result and size is not None and canonical_size is not None and size != canonical_size:
+        scale_x, scale_y = size[0] / canonical_size[0], size[1] / canonical_size[1]
+        duplicate['boxes'] = np.round(np.asarray(result['boxes']) * [scale_x, scale_y, scale_x, scale_y]
+                                      ).astype(np.int32)
+    return duplicate
+
+
+def prefiltered_result(file_path, file_hash_value):
+    """Resultado de uma imagem reprovada pelo pré-filtro: nenhum rosto, sem decodificação nem detecção."""
+    return {'file_path': file_path, 'file_hash': file_hash_value, 'elapsed': 0.0, 'prefiltered': True,
+            'descriptors': np.zeros((0, 128), dtype=np.float32), 'boxes': np.zeros((0, 4), dtype=np.int32),
+            'scores': np.zeros(0, dtype=np.float32)}
+
+
+class SearchPipeline:
+    """
+    Pipeline de busca em fluxo, com estágios ligados por filas limitadas:
+    varredura de diretório (gerador) -> leitura (threads: conteúdo, hash, duplicatas,
+    pré-filtro) -> decodificação, detecção e descritores (processos do pool) ->
+    gravação (quem consome run()). Os processos recebem o arquivo ainda comprimido,
+    então as tarefas em andamento ocupam pouca memória; ela fica constante e os
+    primeiros resultados saem em segundos.
+    """
+
+    def __init__(self, pool_factory, process_function, workers, read_threads=4, queue_size=32,
+                 images_per_task=8, select=None, dedup=None, shared_pool=False, metrics=None,
+                 prefilter=None, retained_results=RETAINED_RESULTS, hash_files=True):
+        # O pool só é criado quando a primeira tarefa chega, evitando carregar
+        # os modelos quando todas as imagens são puladas.
+        self.pool_factory = pool_factory
+        self.pool = None
+        # shared_pool=True: o pool pertence a quem chamou e continua aberto depois de run().
+        self.shared_pool = shared_pool
+        # process_function recebe tuplas (caminho, hash, conteúdo) e retorna um resultado por
+        # imagem; um resultado com 'error' (ex.: arquivo corrompido) sai como erro daquela imagem.
+        self.process_function = process_function
+        self.workers = workers
+        self.read_threads = read_threads
+        self.images_per_task = images_per_task
+        # dedup (DuplicateIndex) faz duplicatas reaproveitarem o resultado da imagem
+        # canônica, sem decodificação nem detecção. Só os retained_results resultados de
+        # canônicas usados mais recentemente ficam guardados (ver _claim_canonical).
+        self.dedup = dedup
+        # Sem hash_files, os resultados saem com file_hash None (quem consome não precisa dele);
+        # a deduplicação sempre calcula o hash.
+        self.hash_files = hash_files or dedup is not None
+        self.retained_results = retained_results
+        self.retained = OrderedDict()
+        # Canônicas lidas cujo resultado ainda não saiu (com o tamanho de cada uma) e
+        # duplicatas à espera de cada canônica. retained guarda pares (resultado, tamanho).
+        self.unfinished = {}
+        self.pinned = Counter()
+        self.retained_lock = threading.Lock()
+        # prefilter (FacePrefilter) faz imagens sem rosto provável saírem sem decodificação
+        # completa nem detecção, como resultados sem descritores (ver prefiltered_result).
+        self.prefilter = prefilter
+        # select(caminho) -> 'process' para processar, None para pular ou outro
+        # rótulo para repassar o caminho direto ao estágio de gravação.
+        self.select = select or (lambda file_path: 'process')
+        # Tempos de leitura, deduplicação e pré-filtro, medidos nas threads deste processo.
+        self.metrics = metrics if metrics is not None else Metrics()
+
+        self.path_queue = queue.Queue(queue_size)
+        self.data_queue = queue.Queue(queue_size)
+        self.output_queue = queue.Queue(queue_size)
+        self.in_flight = threading.BoundedSemaphore(2 * workers)
+        # Sinaliza aos estágios que quem consumia run() parou antes do fim.
+        self.stopped = threading.Event()
+        self.counts = {'scanned': 0, 'skipped': 0, 'read': 0, 'embedded': 0,
+                       'duplicates': 0, 'prefiltered': 0, 'errors': 0}
+        self.counts_lock = threading.Lock()
+
+    def count(self, key, amount=1):
+        """Incrementa um contador de progresso de forma segura entre threads."""
+        with self.counts_lock:
+            self.counts[key] += amount
+
+    def _put(self, target, item):
+        """Coloca item na fila, desistindo se run() for abandonado; retorna se colocou."""
+        while not self.stopped.is_set():
+            try:
+                target.put(item, timeout=_STOP_POLL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self, source):
+        """Próximo item da fila, ou _DONE se run() for abandonado."""
+        while not self.stopped.is_set():
+            try:
+                return source.get(timeout=_STOP_POLL)
+            except queue.Empty:
+                pass
+        return _DONE
+
+    def run(self, file_paths):
+        """
+        Executa o pipeline sobre um iterável de caminhos. Gera tuplas
+        ('process', resultado), (rótulo, caminho) para os caminhos repassados
+        por select, ou ('error', caminho, mensagem). Com dedup, duplicatas saem
+        como ('process', resultado) com uma cópia do resultado da canônica,
+        trocando file_path e file_hash, acrescentando duplicate_of e levando os
+        retângulos para o tamanho da duplicata (ver duplicate_result).
+        Se o consumo parar antes do fim, os estágios param e as tarefas pendentes
+        são descartadas sem travar o pool.
+        """
+        threads = [threading.Thread(target=self._scan, args=(file_paths,), daemon=True),
+                   threading.Thread(target=self._dispatch, daemon=True)]
+        threads += [threading.Thread(target=self._read, daemon=True)
+                    for _ in range(self.read_threads)]
+        for thread in threads:
+            thread.start()
+
+        # Duplicatas que chegaram antes do resultado da sua canônica.
+        waiting = {}
+        finished = False
+        try:
+            while True:
+                item = self.output_queue.get()
+                if item is _DONE:
+                    finished = True
+                    break
+                if item[0] == 'duplicate':
+                    _, file_path, file_hash_value, canonical, size = item
+                    with self.retained_lock:
+                        retained = self.retained.get(canonical)
+                        if retained is not None:
+                            self.retained.move_to_end(canonical)
+                            self._unpin(canonical)
+                    if retained is not None:
+                        yield 'process', duplicate_result(retained[0], file_path, file_hash_value, canonical,
+                                                          size, retained[1])
+                    else:
+                        waiting.setdefault(canonical, []).append((file_path, file_hash_value, size))
+                    continue
+
+                yield item
+                if self.dedup is None or item[1] is None:
+                    continue
+                if item[0] == 'process':
+                    # Depois do yield: o resultado guardado já traz o que o consumidor acrescentou (ex.: persons).
+                    canonical = item[1]['file_path']
+                    result = {key: value for key, value in item[1].items() if key not in _WORKER_FIELDS}
+                    pending = waiting.pop(canonical, [])
+                    with self.retained_lock:
+                        canonical_size = self.unfinished.pop(canonical, None)
+                        if canonical_size is not None:
+                            self.retained[canonical] = (result, canonical_size)
+                        for _ in pending:
+                            self._unpin(canonical)
+                        self._evict()
+                    for file_path, file_hash_value, size in pending:
+                        yield 'process', duplicate_result(result, file_path, file_hash_value, canonical,
+                                                          size, canonical_size)
+                elif item[0] == 'error':
+                    pending = waiting.pop(item[1], [])
+                    with self.retained_lock:
+                        self.unfinished.pop(item[1], None)
+                        for _ in pending:
+                            self._unpin(item[1])
+                    for file_path, _, _ in pending:
+                        self.count('errors')
+                        yield 'error', file_path, f'duplicata de {item[1]}: {item[2]}'
+        finally:
+            if not finished:
+                # Os callbacks do pool deixam de esperar pela fila de saída, que ninguém mais lê.
+                self.stopped.set()
+            if self.pool is not None and not self.shared_pool:
+                if finished:
+                    self.pool.close()
+                else:
+                    self.pool.terminate()
+                self.pool.join()
+
+    def _claim_canonical(self, file_path, canonical, size):
+        """
+        Decide se a duplicata file_path pode reaproveitar o resultado de canonical: só se ele
+        ainda vai sair ou continua guardado. Nesse caso o segura até a duplicata ser atendida.
+        Com canonical None, file_path é uma canônica nova, de tamanho size. Retorna a canônica
+        a usar ou None.
+        """
+        with self.retained_lock:
+            if canonical is None:
+                self.unfinished[file_path] = size
+            elif canonical in self.unfinished or canonical in self.retained:
+                self.pinned[canonical] += 1
+                return canonical
+        return None
+
+    def _unpin(self, canonical):
+        """Libera canonical de uma duplicata atendida (chamado com retained_lock)."""
+        self.pinned[canonical] -= 1
+        if not self.pinned[canonical]:
+            del self.pinned[canonical]
+
+    def _evict(self):
+        """Esquece os resultados usados há mais tempo sem duplicatas à espera (chamado com retained_lock)."""
+        excess = len(self.retained) - self.retained_results
+        for canonical in list(self.retained):
+            if excess <= 0:
+                break
+            if canonical not in self.pinned:
+                del self.retained[canonical]
+                excess -= 1
+
+    def _scan(self, file_paths):
+        try:
+            for file_path in file_paths:
+                if self.stopped.is_set():
+                    return
+                self.count('scanned')
+                tag = self.select(file_path)
+                if tag is None:
+                    self.count('skipped')
+                elif tag == 'process':
+                    self._put(self.path_queue, file_path)
+                else:
+                    self._put(self.output_queue, (tag, file_path))
+        except Exception as e:
+            self.count('errors')
+            self._put(self.output_queue, ('error', None, str(e)))
+        finally:
+            for _ in range(self.read_threads):
+                self._put(self.path_queue, _DONE)
+
+    def _read(self):
+        while True:
+            file_path = self._get(self.path_queue)
+            if file_path is _DONE:
+                self._put(self.data_queue, _DONE)
+                return
+            try:
+                with self.metrics.time('read'):
+                    data, file_hash_value = read_file(file_path, self.hash_files)
+                # Sem o tamanho no cabeçalho, não há como levar os retângulos da canônica
+                # para a duplicata: a imagem é processada normalmente.
+                size = oriented_size(data) if self.dedup is not None else None
+                if size is not None:
+                    with self.metrics.time('dedup'):
+                        canonical = self._claim_canonical(
+                            file_path, self.dedup.canonical(file_path, file_hash_value, data), size)
+                    if canonical is not None:
+                        self.count('duplicates')
+                        self._put(self.output_queue, ('duplicate', file_path, file_hash_value, canonical, size))
+                        continue
+                if self.prefilter is not None:
+                    with self.metrics.time('prefilter'):
+                        has_face = self.prefilter.has_face(data)
+                    if not has_face:
+                        self.count('prefiltered')
+                        self._put(self.output_queue, ('process', prefiltered_result(file_path, file_hash_value)))
+                        continue
+            except Exception as e:
+                self.count('errors')
+                self._put(self.output_queue, ('error', file_path, str(e)))
+                continue
+            self.count('read')
+            self._put(self.data_queue, (file_path, file_hash_value, data))
+
+    def _dispatch(self):
+        finished = 0
+        batch = []
+        while finished < self.read_threads:
+            item = self._get(self.data_queue)
+            if self.stopped.is_set():
+                return
+            if item is _DONE:
+                finished += 1
+            else:
+                batch.append(item)
+            if batch and (len(batch) == self.images_per_task or finished == self.read_threads):
+                self._submit(batch)
+                batch = []
+
+        # Espera as tarefas em andamento antes de encerrar o fluxo.
+        for _ in range(2 * self.workers):
+            self.in_flight.acquire()
+        self._put(self.output_queue, _DONE)
+
+    def _submit(self, batch):
+        while not self.in_flight.acquire(timeout=_STOP_POLL):
+            if self.stopped.is_set():
+                return
+        if self.pool is None:
+            self.pool = self.pool_factory()
+
+        def on_done(results):
+            for result in results:
+                if 'error' in result:
+                    self.metrics.merge(result.pop('metrics', None))
+                    self.count('errors')
+                    self._put(self.output_queue, ('error', result['file_path'], result['error']))
+                else:
+                    self.count('embedded')
+                    self._put(self.output_queue, ('process', result))
+            self.in_flight.release()
+
+        def on_error(error):
+            self.count('errors', len(batch))
+            for file_path, *_ in batch:
+                self._put(self.output_queue, ('error', file_path, str(error)))
+            self.in_flight.release()
+
+        self.pool.apply_async(self.process_function, (batch,),
+                              callback=on_done, error_callback=on_error)
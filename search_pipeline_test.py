@@ -0,0 +1,216 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from multiprocessing.pool import ThreadPool
+import cv2
+import numpy as np
+from image_dedup import DuplicateIndex
+from image_loader import load_image
+from search_pipeline import SearchPipeline, scan_images
+
+
+def image_results(images):
+    # Função de processamento falsa no formato de resultado usado pela busca: decodifica
+    # o conteúdo recebido e devolve o formato de cada imagem
+    results = []
+    for file_path, file_hash_value, data in images:
+        try:
+            shape = load_image(file_path, data)[0].shape
+        except ValueError as e:
+            results.append({'file_path': file_path, 'file_hash': file_hash_value, 'error': str(e)})
+            continue
+        results.append({'file_path': file_path, 'file_hash': file_hash_value, 'shape': shape})
+    return results
+
+
+class TestSearchPipeline(unittest.TestCase):
+    """
+    Testes para o pipeline de busca em fluxo.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.temp_dir, 'sub'))
+        self.files = []
+        for i, name in enumerate(['a.png', 'b.png', os.path.join('sub', 'c.png'), 'd.jpg', 'e.png']):
+            path = os.path.join(self.temp_dir, name)
+            cv2.imwrite(path, np.full((10 + i, 12, 3), i, dtype=np.uint8))
+            self.files.append(path)
+        with open(os.path.join(self.temp_dir, 'broken.jpg'), 'wb') as f:
+            f.write(b'not an image')
+        open(os.path.join(self.temp_dir, 'notes.txt'), 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def run_pipeline(self, select=None):
+        pipeline = SearchPipeline(lambda: ThreadPool(2), image_results, workers=2,
+                                  read_threads=2, queue_size=2, images_per_task=2, select=select)
+        return pipeline, list(pipeline.run(scan_images(self.temp_dir)))
+
+    def test_scan_images_is_lazy_and_filtered(self):
+        # A varredura é um gerador e só devolve imagens
+        paths = scan_images(self.temp_dir)
+        self.assertEqual(next(paths), os.path.join(self.temp_dir, 'a.png'))
+        self.assertEqual(len(list(paths)), 5)
+
+    def test_all_images_flow_through(self):
+        # Todas as imagens chegam ao fim e arquivos corrompidos viram erros
+        pipeline, items = self.run_pipeline()
+        processed = {item[1]['file_path']: item[1]['shape'] for item in items if item[0] == 'process'}
+        errors = [item[1] for item in items if item[0] == 'error']
+        self.assertEqual(sorted(processed), sorted(self.files))
+        self.assertEqual(processed[self.files[4]], (14, 12, 3))
+        self.assertEqual(errors, [os.path.join(self.temp_dir, 'broken.jpg')])
+        self.assertEqual(pipeline.counts['embedded'], 5)
+        self.assertEqual(pipeline.counts['errors'], 1)
+        self.assertTrue(all(item[1]['file_hash'] for item in items if item[0] == 'process'))
+
+    def test_hashing_can_be_skipped(self):
+        pipeline = SearchPipeline(lambda: ThreadPool(2), image_results, workers=2, hash_files=False)
+        hashes = [item[1]['file_hash'] for item in pipeline.run(scan_images(self.temp_dir)) if item[0] == 'process']
+        self.assertEqual(hashes, [None] * 5)
+
+    def test_abandoned_run_does_not_block(self):
+        # Parar de consumir no meio libera o pool do pipeline e não trava um pool compartilhado
+        # cujos callbacks estavam esperando espaço na fila de saída
+        def slow_results(images):
+            time.sleep(0.01)
+            return image_results(images)
+
+        shared = ThreadPool(2)
+        try:
+            for pool_factory, shared_pool in ((lambda: ThreadPool(2), False), (lambda: shared, True)):
+                pipeline = SearchPipeline(pool_factory, slow_results, workers=2, read_threads=2,
+                                          queue_size=1, images_per_task=1, shared_pool=shared_pool)
+                items = pipeline.run(scan_images(self.temp_dir))
+                next(items)
+                time.sleep(0.1)
+                closer = threading.Thread(target=items.close)
+                closer.start()
+                closer.join(5)
+                self.assertFalse(closer.is_alive())
+            # O pool compartilhado continua atendendo tarefas
+            self.assertEqual(shared.apply_async(len, ([1, 2],)).get(5), 2)
+        finally:
+            shared.terminate()
+
+    def test_select_skips_and_forwards(self):
+        # select pode pular um arquivo ou repassá-lo direto para a gravação
+        def select(file_path):
+            name = os.path.basename(file_path)
+            return {'a.png': None, 'b.png': 'rematch'}.get(name, 'process')
+
+        pipeline, items = self.run_pipeline(select)
+        self.assertIn(('rematch', self.files[1]), items)
+        self.assertEqual(pipeline.counts['skipped'], 1)
+        self.assertEqual(pipeline.counts['embedded'], 3)
+
+    def test_duplicates_reuse_canonical_result(self):
+        # Cópias exatas e redimensionadas não são processadas e herdam o resultado da original
+        dedup_dir = os.path.join(self.temp_dir, 'dedup')
+        os.makedirs(dedup_dir)
+        rng = np.random.default_rng(0)
+        photo = cv2.resize(rng.integers(0, 256, (8, 8, 3), dtype=np.uint8), (400, 300))
+        other = cv2.resize(rng.integers(0, 256, (8, 8, 3), dtype=np.uint8), (400, 300))
+        cv2.imwrite(os.path.join(dedup_dir, 'a.jpg'), photo)
+        shutil.copyfile(os.path.join(dedup_dir, 'a.jpg'), os.path.join(dedup_dir, 'b.jpg'))
+        cv2.imwrite(os.path.join(dedup_dir, 'c.jpg'), cv2.resize(photo, (200, 150)))
+        cv2.imwrite(os.path.join(dedup_dir, 'd.jpg'), other)
+
+        pipeline = SearchPipeline(lambda: ThreadPool(2), image_results, workers=2,
+                                  read_threads=1, dedup=DuplicateIndex())
+        results = {os.path.basename(item[1]['file_path']): item[1]
+                   for item in pipeline.run(scan_images(dedup_dir))}
+        self.assertEqual(sorted(results), ['a.jpg', 'b.jpg', 'c.jpg', 'd.jpg'])
+        self.assertEqual(pipeline.counts['embedded'], 2)
+        self.assertEqual(pipeline.counts['duplicates'], 2)
+        self.assertEqual(results['c.jpg']['shape'], results['a.jpg']['shape'])
+        self.assertEqual(results['b.jpg']['duplicate_of'], results['a.jpg']['file_path'])
+        self.assertNotIn('duplicate_of', results['d.jpg'])
+
+    def test_resized_duplicates_get_scaled_boxes(self):
+        # Uma cópia redimensionada herda os rostos da original nas suas próprias coordenadas
+        def box_results(images):
+            return [dict(result, boxes=np.array([[40, 30, 200, 150]], dtype=np.int32))
+                    for result in image_results(images)]
+
+        dedup_dir = os.path.join(self.temp_dir, 'dedup')
+        os.makedirs(dedup_dir)
+        photo = cv2.resize(np.random.default_rng(0).integers(0, 256, (8, 8, 3), dtype=np.uint8), (400, 300))
+        cv2.imwrite(os.path.join(dedup_dir, 'a.jpg'), photo)
+        shutil.copyfile(os.path.join(dedup_dir, 'a.jpg'), os.path.join(dedup_dir, 'b.jpg'))
+        cv2.imwrite(os.path.join(dedup_dir, 'c.jpg'), cv2.resize(photo, (200, 150)))
+
+        pipeline = SearchPipeline(lambda: ThreadPool(1), box_results, workers=1,
+                                  read_threads=1, dedup=DuplicateIndex())
+        boxes = {os.path.basename(item[1]['file_path']): item[1]['boxes'].tolist()
+                 for item in pipeline.run(scan_images(dedup_dir))}
+        self.assertEqual(pipeline.counts['duplicates'], 2)
+        self.assertEqual(boxes, {'a.jpg': [[40, 30, 200, 150]], 'b.jpg': [[40, 30, 200, 150]],
+                                 'c.jpg': [[20, 15, 100, 75]]})
+
+    def test_forgotten_canonical_duplicates_are_processed(self):
+        # Com um só resultado guardado, a cópia de uma canônica já esquecida é processada
+        # de novo em vez de esperar por um resultado que não volta
+        dedup_dir = os.path.join(self.temp_dir, 'dedup')
+        os.makedirs(dedup_dir)
+        rng = np.random.default_rng(1)
+        for name in ('a.jpg', 'b.jpg'):
+            cv2.imwrite(os.path.join(dedup_dir, name),
+                        cv2.resize(rng.integers(0, 256, (8, 8, 3), dtype=np.uint8), (400, 300)))
+        shutil.copyfile(os.path.join(dedup_dir, 'a.jpg'), os.path.join(dedup_dir, 'c.jpg'))
+        shutil.copyfile(os.path.join(dedup_dir, 'b.jpg'), os.path.join(dedup_dir, 'd.jpg'))
+        seen = threading.Semaphore(0)
+
+        def file_paths():
+            # As cópias só são lidas depois que as duas originais já saíram
+            yield os.path.join(dedup_dir, 'a.jpg')
+            yield os.path.join(dedup_dir, 'b.jpg')
+            seen.acquire()
+            seen.acquire()
+            yield os.path.join(dedup_dir, 'c.jpg')
+            yield os.path.join(dedup_dir, 'd.jpg')
+
+        pipeline = SearchPipeline(lambda: ThreadPool(1), image_results, workers=1, read_threads=1,
+                                  images_per_task=1, dedup=DuplicateIndex(), retained_results=1)
+        results = {}
+        for item in pipeline.run(file_paths()):
+            results[os.path.basename(item[1]['file_path'])] = item[1]
+            seen.release()
+        self.assertEqual(sorted(results), ['a.jpg', 'b.jpg', 'c.jpg', 'd.jpg'])
+        self.assertNotIn('duplicate_of', results['c.jpg'])
+        self.assertEqual(results['d.jpg']['duplicate_of'], results['b.jpg']['file_path'])
+        self.assertEqual(len(pipeline.retained), 1)
+        self.assertEqual(pipeline.counts['embedded'], 3)
+
+    def test_prefilter_skips_images_without_faces(self):
+        # Imagens reprovadas pelo pré-filtro saem sem rostos e não chegam ao processamento
+        class Prefilter:
+            def __init__(self, rejected):
+                self.rejected = rejected
+
+            def has_face(self, data):
+                return data not in self.rejected
+
+        rejected = set()
+        for path in (self.files[0], self.files[3]):
+            with open(path, 'rb') as f:
+                rejected.add(f.read())
+        pipeline = SearchPipeline(lambda: ThreadPool(2), image_results, workers=2,
+                                  read_threads=2, prefilter=Prefilter(rejected))
+        results = {item[1]['file_path']: item[1] for item in pipeline.run(scan_images(self.temp_dir))
+                   if item[0] == 'process'}
+        self.assertEqual(sorted(results), sorted(self.files))
+        self.assertEqual(pipeline.counts['prefiltered'], 2)
+        self.assertEqual(pipeline.counts['embedded'], 3)
+        self.assertTrue(results[self.files[3]]['prefiltered'])
+        self.assertEqual(results[self.files[3]]['descriptors'].shape, (0, 128))
+        self.assertNotIn('prefiltered', results[self.files[1]])
+
+
+if __name__ == '__main__':
+    unittest.main()
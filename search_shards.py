@@ -0,0 +1,181 @@
+"""
+Busca dividida em partes (shards) para rodar em várias máquinas que montam o
+mesmo diretório de busca.
+
+Cada arquivo pertence à parte i de N pelo hash do seu caminho relativo ao
+diretório de busca, então todas as máquinas chegam à mesma divisão sem
+combinar nada entre si. Cada parte grava seu resultado parcial em
+shards_dir/shard-<i>-of-<N>: o manifesto da busca (descritores e pessoas de
+cada imagem), as correspondências em matches.csv, os erros em errors.csv e,
+só ao terminar, shard.json. Uma parte interrompida continua de onde parou ao
+ser executada de novo (ver SearchManifest). merge_shards junta as partes
+concluídas nas pastas de cada pessoa do diretório de saída e pode ser repetido
+até todas estarem prontas.
+"""
+import csv
+import hashlib
+import json
+import os
+import time
+from search_output import COPY, INDEX_NAME, MANIFEST_ONLY, SearchOutput
+from search_pipeline import scan_images
+
+# Gravado ao fim de cada parte; sem ele a parte está incompleta.
+SHARD_SUMMARY_NAME = 'shard.json'
+ERRORS_NAME = 'errors.csv'
+# Partes já juntadas no diretório de saída, para que merge_shards possa ser repetido.
+MERGED_NAME = '.merged-shards.json'
+# Correspondências colocadas pelas junções, para retirá-las se as partes forem recomparadas.
+MERGED_MATCHES_NAME = '.merged-matches.csv'
+
+
+def shard_of(relative_path, shards):
+    """Parte (0 a shards - 1) de um caminho relativo, igual em qualquer máquina ou sistema."""
+    key = relative_path.replace(os.sep, '/').encode('utf-8')
+    return int.from_bytes(hashlib.sha1(key).digest()[:8], 'big') % shards
+
+
+def shard_files(search_dir, shard, shards):
+    """Gera, em ordem, as imagens do diretório de busca que pertencem à parte shard."""
+    if not 0 <= shard < shards:
+        raise ValueError(f'Parte {shard} fora do intervalo 0 a {shards - 1}')
+    for file_path in scan_images(search_dir):
+        if shard_of(os.path.relpath(file_path, search_dir), shards) == shard:
+            yield file_path
+
+
+def shard_dir(shards_dir, shard, shards):
+    return os.path.join(shards_dir, f'shard-{shard:03d}-of-{shards:03d}')
+
+
+def write_summary(path, summary):
+    """Grava shard.json de forma atômica; sua existência marca a parte como concluída."""
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+    os.replace(temporary_path, path)
+
+
+def read_summary(directory):
+    try:
+        with open(os.path.join(directory, SHARD_SUMMARY_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def merge_shards(shards_dir, output_dir, shards, output_mode=COPY, search_dir=None, report=print):
+    """
+    Coloca as imagens encontradas pelas partes concluídas nas pastas de cada pessoa de
+    output_dir e junta os erros em output_dir/errors.csv. search_dir é o diretório de
+    busca como montado nesta máquina (por padrão, o que cada parte registrou).
+    Partes incompletas ficam de fora e são listadas em 'missing'; basta executá-las
+    de novo e repetir a junção, que pula as partes já juntadas. Se as partes foram
+    recomparadas com outra galeria ou limiar depois da última junção, ela recomeça:
+    as correspondências juntadas antes saem de output_dir.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    merged_path = os.path.join(output_dir, MERGED_NAME)
+    matches_path = os.path.join(output_dir, MERGED_MATCHES_NAME)
+    merged = {}
+    if os.path.exists(merged_path):
+        with open(merged_path, encoding='utf-8') as f:
+            merged = json.load(f)
+
+    summaries = {}
+    missing = []
+    for shard in range(shards):
+        directory = shard_dir(shards_dir, shard, shards)
+        summary = read_summary(directory)
+        if summary is None:
+            missing.append(shard)
+        else:
+            summaries[shard] = (directory, summary)
+
+    match_keys = {summary['match_key'] for _, summary in summaries.values()}
+    if len(match_keys) > 1:
+        raise ValueError('As partes foram comparadas com galerias ou limiares diferentes; '
+                         'execute de novo as partes desatualizadas.')
+
+    counts = {'merged': 0, 'already_merged': 0, 'matches': 0, 'errors': 0}
+    with SearchOutput(output_dir, output_mode) as output:
+        if match_keys and any(entry['match_key'] not in match_keys for entry in merged.values()):
+            report('As partes foram recomparadas desde a última junção; as correspondências antigas saem')
+            remove_merged_matches(output, matches_path, report)
+            merged = {}
+            write_summary(merged_path, merged)
+
+        new_log = not os.path.exists(matches_path)
+        matches_file = open(matches_path, 'a', newline='', encoding='utf-8')
+        matches_writer = csv.writer(matches_file)
+        if new_log:
+            matches_writer.writerow(['person', 'file_path', 'file_hash'])
+        try:
+            for shard, (directory, summary) in sorted(summaries.items()):
+                name = os.path.basename(directory)
+                if merged.get(name, {}).get('finished') == summary['finished']:
+                    counts['already_merged'] += 1
+                    continue
+
+                shard_search_dir = summary['search_dir']
+                with open(os.path.join(directory, INDEX_NAME), newline='', encoding='utf-8') as f:
+                    for row in csv.DictReader(f):
+                        file_path = os.path.join(search_dir or shard_search_dir,
+                                                 os.path.relpath(row['file_path'], shard_search_dir))
+                        try:
+                            output.place(file_path, [row['person']], row['file_hash'] or None)
+                            matches_writer.writerow([row['person'], file_path, row['file_hash']])
+                            counts['matches'] += 1
+                        except OSError as e:
+                            report(f'Erro ao colocar {file_path}: {e}')
+                            counts['errors'] += 1
+                # As correspondências vão para o disco antes de a parte constar como juntada.
+                matches_file.flush()
+                os.fsync(matches_file.fileno())
+                merged[name] = {'finished': summary['finished'], 'match_key': summary['match_key']}
+                write_summary(merged_path, merged)
+                counts['merged'] += 1
+                report(f'Parte {shard + 1} de {shards} juntada ({summary["counts"]["scanned"]} imagens)')
+        finally:
+            matches_file.close()
+        output_counts = dict(output.counts)
+
+    errors = 0
+    with open(os.path.join(output_dir, ERRORS_NAME), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['shard', 'file_path', 'error'])
+        for shard, (directory, _) in sorted(summaries.items()):
+            with open(os.path.join(directory, ERRORS_NAME), newline='', encoding='utf-8') as errors_file:
+                for row in csv.DictReader(errors_file):
+                    writer.writerow([shard, row['file_path'], row['error']])
+                    errors += 1
+
+    if missing:
+        report(f'Partes incompletas (execute-as de novo e repita a junção): '
+               f'{", ".join(str(shard) for shard in missing)}')
+    report(f'{counts["merged"]} partes juntadas, {counts["already_merged"]} já juntadas antes, '
+           f'{counts["matches"]} correspondências, {errors} erros nas partes')
+    return dict(counts, shard_errors=errors, missing=missing, output=output_counts)
+
+
+def remove_merged_matches(output, matches_path, report=print):
+    """Retira de output as correspondências gravadas em matches_path pelas junções anteriores."""
+    if output.mode == MANIFEST_ONLY:
+        output.rewrite_index([])
+    elif os.path.exists(matches_path):
+        with open(matches_path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                try:
+                    output.remove(row['file_path'], [row['person']], row['file_hash'] or None)
+                except OSError as e:
+                    report(f'Erro ao retirar {row["file_path"]}: {e}')
+    else:
+        report('Junção anterior sem registro das correspondências; retire as antigas à mão '
+               'ou junte em outro diretório de saída')
+    if os.path.exists(matches_path):
+        os.remove(matches_path)
+
+
+def shard_summary(shard, shards, search_dir, match_key, counts):
+    return {'shard': shard, 'shards': shards, 'search_dir': os.path.abspath(search_dir),
+            'match_key': match_key, 'counts': counts, 'finished': time.time()}
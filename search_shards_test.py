@@ -0,0 +1,92 @@
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+from search_output import INDEX_NAME
+from search_shards import (ERRORS_NAME, SHARD_SUMMARY_NAME, merge_shards, shard_dir, shard_files,
+                           shard_of, shard_summary, write_summary)
+
+
+class TestSearchShards(unittest.TestCase):
+    """
+    Testes para a divisão da busca em partes e a junção dos resultados.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.search_dir = os.path.join(self.temp_dir, 'busca')
+        for folder in ['2022', '2023']:
+            os.makedirs(os.path.join(self.search_dir, folder))
+            for i in range(10):
+                with open(os.path.join(self.search_dir, folder, f'{i}.jpg'), 'wb') as f:
+                    f.write(f'{folder}/{i}'.encode())
+        self.shards_dir = os.path.join(self.temp_dir, 'partes')
+        self.output_dir = os.path.join(self.temp_dir, 'saida')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_shard(self, shard, shards, matches, errors=(), match_key='key'):
+        """Simula uma parte concluída com as correspondências (pessoa, caminho) dadas."""
+        directory = shard_dir(self.shards_dir, shard, shards)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, INDEX_NAME), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['person', 'file_path', 'file_hash'])
+            for person, file_path in matches:
+                writer.writerow([person, os.path.join(self.search_dir, file_path), None])
+        with open(os.path.join(directory, ERRORS_NAME), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['file_path', 'error'])
+            writer.writerows(errors)
+        write_summary(os.path.join(directory, SHARD_SUMMARY_NAME),
+                      shard_summary(shard, shards, self.search_dir, match_key, {'scanned': len(matches)}))
+
+    def test_shard_of_is_stable(self):
+        # O mesmo caminho relativo cai sempre na mesma parte, com qualquer separador
+        self.assertEqual(shard_of('2023/0.jpg', 4), shard_of(os.path.join('2023', '0.jpg'), 4))
+        self.assertEqual(shard_of('2023/0.jpg', 4), shard_of('2023/0.jpg', 4))
+        self.assertEqual(shard_of('2023/0.jpg', 1), 0)
+
+    def test_shards_partition_the_files(self):
+        # Cada imagem pertence a exatamente uma parte
+        parts = [list(shard_files(self.search_dir, shard, 3)) for shard in range(3)]
+        files = [file_path for part in parts for file_path in part]
+        self.assertEqual(len(files), 20)
+        self.assertEqual(len(set(files)), 20)
+        self.assertTrue(all(parts))
+        with self.assertRaises(ValueError):
+            list(shard_files(self.search_dir, 3, 3))
+
+    def test_merge_resumes_after_missing_shard(self):
+        # Partes incompletas ficam de fora e entram ao repetir a junção
+        self.write_shard(0, 2, [('Ana', '2022/1.jpg'), ('Bia', '2022/1.jpg')],
+                         errors=[(os.path.join(self.search_dir, '2022/2.jpg'), 'arquivo corrompido')])
+        result = merge_shards(self.shards_dir, self.output_dir, 2, report=lambda message: None)
+        self.assertEqual(result['missing'], [1])
+        self.assertEqual(result['shard_errors'], 1)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.output_dir, 'Ana'))), ['1.jpg'])
+
+        self.write_shard(1, 2, [('Ana', '2023/5.jpg')])
+        result = merge_shards(self.shards_dir, self.output_dir, 2, report=lambda message: None)
+        self.assertEqual((result['merged'], result['already_merged'], result['missing']), (1, 1, []))
+        self.assertEqual(sorted(os.listdir(os.path.join(self.output_dir, 'Ana'))), ['1.jpg', '5.jpg'])
+
+    def test_merge_maps_search_dir(self):
+        # O diretório de busca pode estar montado em outro caminho na máquina que junta
+        self.write_shard(0, 1, [('Ana', '2022/1.jpg')])
+        moved_dir = os.path.join(self.temp_dir, 'montado')
+        os.rename(self.search_dir, moved_dir)
+        merge_shards(self.shards_dir, self.output_dir, 1, search_dir=moved_dir, report=lambda message: None)
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, 'Ana', '1.jpg')))
+
+    def test_merge_rejects_different_galleries(self):
+        self.write_shard(0, 2, [], match_key='a')
+        self.write_shard(1, 2, [], match_key='b')
+        with self.assertRaises(ValueError):
+            merge_shards(self.shards_dir, self.output_dir, 2, report=lambda message: None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -48,5 +48,6 @@ class TestPhotoSeparatorGUI(unittest.TestCase):
             self.app.select_output_dir()
             self.assertEqual(self.app.output_dir_var.get(), self.temp_output_dir)
 
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,169 @@
+"""
+Entrada de vídeo: quadros amostrados com o cv2.VideoCapture e rostos acompanhados
+entre os quadros, para que cada rosto seja embutido poucas vezes e não a cada quadro.
+
+A cada quadro amostrado os rostos detectados são associados às trilhas abertas
+pela sobreposição (interseção sobre união) com o último retângulo de cada uma;
+o que sobra abre uma trilha nova, e trilhas sem rosto por mais de max_misses
+quadros são encerradas. Cada trilha pede descritores no primeiro quadro e
+depois a cada embed_interval segundos, até max_embeddings.
+"""
+import csv
+import cv2
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv', '.m4v', '.webm')
+
+# Gravado no diretório de saída da busca: trechos de cada pessoa em cada vídeo.
+VIDEO_MATCHES_NAME = 'videos.csv'
+
+# Usado quando o arquivo não informa a taxa de quadros.
+DEFAULT_FPS = 25.0
+
+# Padrões da amostragem (s entre quadros), dos descritores por trilha e do intervalo (s) entre eles.
+DEFAULT_SAMPLE_INTERVAL = 0.5
+DEFAULT_MAX_EMBEDDINGS = 3
+DEFAULT_EMBED_INTERVAL = 2.0
+
+# Quadros amostrados seguidos sem o rosto antes de encerrar sua trilha.
+MAX_MISSES = 2
+
+
+def sample_frames(file_path, interval=DEFAULT_SAMPLE_INTERVAL):
+    """
+    Gera (instante em segundos, quadro RGB) a cada interval segundos do vídeo. Os
+    quadros intermediários só são avançados (grab), sem conversão de cores.
+    """
+    capture = cv2.VideoCapture(file_path)
+    if not capture.isOpened():
+        raise OSError(f'Não foi possível abrir o vídeo {file_path}')
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    if not 0 < fps < 1000:
+        fps = DEFAULT_FPS
+    step = max(1, round(interval * fps))
+    index = 0
+    try:
+        while True:
+            if index % step == 0:
+                ok, frame = capture.read()
+                if not ok:
+                    return
+                yield index / fps, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            elif not capture.grab():
+                return
+            index += 1
+    finally:
+        capture.release()
+
+
+def overlap(a, b):
+    """Interseção sobre união de dois dlib.rectangle."""
+    intersection = a.intersect(b).area()
+    return intersection / float(a.area() + b.area() - intersection)
+
+
+class FaceTrack:
+    """Um rosto acompanhado entre quadros: intervalo em que aparece e descritores calculados."""
+
+    def __init__(self, timestamp, rect, frame):
+        self.start = self.end = timestamp
+        self.rect = rect
+        self.last_frame = frame
+        self.embedded = []
+        self.descriptors = []
+        # Retângulo, pontuação e recorte do melhor rosto embutido (maior pontuação do detector).
+        self.best = None
+
+    def wants_embedding(self, timestamp, embed_interval, max_embeddings):
+        if len(self.embedded) >= max_embeddings:
+            return False
+        return not self.embedded or timestamp - self.embedded[-1] >= embed_interval
+
+    def mark_embedded(self, timestamp):
+        """Registra um descritor pedido neste instante (calculado depois, em lote)."""
+        self.embedded.append(timestamp)
+
+    def add(self, descriptor, rect, score, chip=None):
+        self.descriptors.append(descriptor)
+        if self.best is None or score > self.best[1]:
+            self.best = (rect, score, chip)
+
+
+class FaceTracker:
+    """
+    Associa as detecções de cada quadro amostrado às trilhas abertas (ver o início
+    do módulo). min_overlap é a menor sobreposição para continuar uma trilha.
+    """
+
+    def __init__(self, min_overlap=0.3, max_misses=MAX_MISSES):
+        self.min_overlap = min_overlap
+        self.max_misses = max_misses
+        self.frame = 0
+        self.active = []
+        self.finished = []
+
+    def update(self, timestamp, rects):
+        """Registra as detecções de um quadro e retorna a trilha de cada uma, na mesma ordem."""
+        self.frame += 1
+        still_active = []
+        for track in self.active:
+            if self.frame - track.last_frame > self.max_misses + 1:
+                self.finished.append(track)
+            else:
+                still_active.append(track)
+        self.active = still_active
+
+        # Associação gulosa, das maiores sobreposições para as menores.
+        pairs = sorted(((overlap(track.rect, rect), t, r) for t, track in enumerate(self.active)
+                        for r, rect in enumerate(rects)), key=lambda pair: -pair[0])
+        assigned = [None] * len(rects)
+        used = set()
+        for value, t, r in pairs:
+            if value < self.min_overlap:
+                break
+            if t in used or assigned[r] is not None:
+                continue
+            used.add(t)
+            assigned[r] = self.active[t]
+
+        for r, rect in enumerate(rects):
+            track = assigned[r]
+            if track is None:
+                track = assigned[r] = FaceTrack(timestamp, rect, self.frame)
+                self.active.append(track)
+            track.rect = rect
+            track.end = timestamp
+            track.last_frame = self.frame
+        return assigned
+
+    def tracks(self):
+        """Todas as trilhas, abertas ou encerradas, em ordem de início."""
+        return sorted(self.finished + self.active, key=lambda track: track.start)
+
+
+def merge_ranges(ranges, gap):
+    """Junta intervalos (início, fim, distância) separados por até gap segundos, mantendo a menor distância."""
+    merged = []
+    for start, end, distance in sorted(ranges):
+        if merged and start <= merged[-1][1] + gap:
+            last_start, last_end, last_distance = merged[-1]
+            merged[-1] = (last_start, max(last_end, end), min(last_distance, distance))
+        else:
+            merged.append((start, end, distance))
+    return merged
+
+
+def format_time(seconds):
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(int(minutes), 60)
+    return f'{hours}:{minutes:02d}:{seconds:04.1f}' if hours else f'{minutes}:{seconds:04.1f}'
+
+
+def write_video_matches(path, matches):
+    """Grava {pessoa: [{file_path, start, end, distance}]} em CSV, uma linha por trecho."""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['person', 'file_path', 'start', 'end', 'distance'])
+        for person, clips in sorted(matches.items()):
+            for clip in clips:
+                writer.writerow([person, clip['file_path'], f'{clip["start"]:.2f}', f'{clip["end"]:.2f}',
+                                 f'{clip["distance"]:.4f}'])
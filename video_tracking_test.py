@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import unittest
+import cv2
+import dlib
+import numpy as np
+from video_tracking import FaceTracker, merge_ranges, sample_frames
+
+
+def box(left, top, size=100):
+    return dlib.rectangle(left, top, left + size, top + size)
+
+
+class TestFaceTracker(unittest.TestCase):
+    """
+    Testes para o acompanhamento de rostos entre quadros de vídeo.
+    """
+
+    def test_moving_face_keeps_its_track(self):
+        # Um rosto que se desloca pouco entre quadros continua na mesma trilha
+        tracker = FaceTracker()
+        first = tracker.update(0.0, [box(0, 0), box(500, 0)])
+        second = tracker.update(0.5, [box(510, 5), box(10, 5)])
+        self.assertIs(second[0], first[1])
+        self.assertIs(second[1], first[0])
+        self.assertEqual(len(tracker.tracks()), 2)
+        self.assertEqual((first[0].start, first[0].end), (0.0, 0.5))
+
+    def test_track_ends_after_misses(self):
+        # Depois de max_misses quadros sem o rosto, ele volta como uma trilha nova
+        tracker = FaceTracker(max_misses=1)
+        first = tracker.update(0.0, [box(0, 0)])[0]
+        tracker.update(0.5, [])
+        self.assertIs(tracker.update(1.0, [box(0, 0)])[0], first)
+        tracker.update(1.5, [])
+        tracker.update(2.0, [])
+        self.assertIsNot(tracker.update(2.5, [box(0, 0)])[0], first)
+        self.assertEqual(len(tracker.tracks()), 2)
+
+    def test_embeddings_are_limited_per_track(self):
+        track = FaceTracker().update(0.0, [box(0, 0)])[0]
+        self.assertTrue(track.wants_embedding(0.0, 2.0, 2))
+        track.mark_embedded(0.0)
+        self.assertFalse(track.wants_embedding(1.0, 2.0, 2))
+        self.assertTrue(track.wants_embedding(2.0, 2.0, 2))
+        track.mark_embedded(2.0)
+        self.assertFalse(track.wants_embedding(10.0, 2.0, 2))
+
+    def test_merge_ranges(self):
+        self.assertEqual(merge_ranges([(5.0, 6.0, 0.4), (0.0, 2.0, 0.3), (2.5, 3.0, 0.2)], 1.0),
+                         [(0.0, 3.0, 0.2), (5.0, 6.0, 0.4)])
+
+
+class TestSampleFrames(unittest.TestCase):
+    """
+    Testes para a amostragem de quadros de vídeo.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_frames_are_sampled_with_timestamps(self):
+        path = os.path.join(self.temp_dir, 'clip.avi')
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+        if not writer.isOpened():
+            self.skipTest('OpenCV sem gravação de vídeo')
+        for i in range(20):
+            writer.write(np.full((48, 64, 3), (0, 0, 10 * i), dtype=np.uint8))
+        writer.release()
+
+        frames = list(sample_frames(path, interval=0.5))
+        self.assertEqual([timestamp for timestamp, _ in frames], [0.0, 0.5, 1.0, 1.5])
+        # Quadros em RGB: o vermelho gravado em BGR fica no primeiro canal
+        self.assertAlmostEqual(int(frames[1][1][24, 32, 0]), 50, delta=3)
+
+    def test_missing_video_raises(self):
+        with self.assertRaises(OSError):
+            next(sample_frames(os.path.join(self.temp_dir, 'missing.mp4')))
+
+
+if __name__ == '__main__':
+    unittest.main()